@@ -0,0 +1,95 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from download_paths import clean_save_rows, parse_save_paths_soup
+from pcgw_extract import extract_save_rows
+
+
+def synthetic_page(rows=4, filler_sections=40, locations=None, section=True):
+    """
+    This function builds a page shaped like a PCGamingWiki article: a long head and body, the save game data
+    table somewhere in the middle, and many more sections and tables after it.
+
+    Parameters:
+    rows (int, optional): The number of save location rows.
+    filler_sections (int, optional): The number of sections before and after the save table.
+    locations (list, optional): The HTML of the location cells. Defaults to rows generated Documents paths.
+    section (bool, optional): Whether the page has a save game data section at all.
+
+    Returns:
+    bytes: The HTML of the page.
+    """
+    filler = ''.join(
+        f'<h3><span class="mw-headline" id="Section_{i}">Section {i}</span></h3>'
+        f'<p>{"Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20}</p>'
+        f'<table class="wikitable"><tr><th>Key</th><td>Value {i}</td></tr></table>'
+        for i in range(filler_sections)
+    )
+    if locations is None:
+        locations = [
+            f'<abbr title="">%USERPROFILE%</abbr>\\Documents\\Game {i}\\<abbr>&lt;user-id&gt;</abbr>\\Saves'
+            for i in range(rows)
+        ]
+    save_rows = ''.join(
+        '<tr class="template-infotable-body table-gamedata-body-row">'
+        f'<th scope="row" class="table-gamedata-body-system">{"Windows" if i % 2 else "Steam"}</th>'
+        f'<td class="table-gamedata-body-location">{location}<sup class="reference">[{i}]</sup></td></tr>'
+        for i, location in enumerate(locations)
+    )
+    section_id = 'Save_game_data_location' if section else 'Save_game_cloud_syncing'
+    return (
+        f'<html><head><title>Game</title>{"<script>var x = 1;</script>" * 50}</head><body>{filler}'
+        f'<h3><span class="mw-headline" id="{section_id}">Save game data location</span></h3>'
+        f'<div><table class="template-infotable table-gamedata"><tbody>{save_rows}</tbody></table></div>'
+        f'{filler}{filler}</body></html>'
+    ).encode('utf-8')
+
+def measure(function, content, repeat):
+    """
+    This function times a parser over a page and measures its peak memory.
+
+    Returns:
+    tuple: The seconds per call, the peak allocated bytes of one call and the result.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(content)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the streaming and BeautifulSoup save path extractors.")
+    parser.add_argument('pages', nargs='*', help="PCGamingWiki pages saved from the browser, e.g. pages/*.html. Defaults to a synthetic page.")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = {}
+    for pattern in args.pages:
+        for path in glob.glob(pattern):
+            with open(path, 'rb') as file:
+                pages[os.path.basename(path)] = file.read()
+    if not pages:
+        pages['synthetic'] = synthetic_page()
+
+    for name, content in pages.items():
+        soup_time, soup_peak, soup_rows = measure(parse_save_paths_soup, content, args.repeat)
+        stream_time, stream_peak, stream_rows = measure(extract_save_rows, content, args.repeat)
+        same = clean_save_rows(soup_rows or []) == clean_save_rows(stream_rows or [])
+        print(f"{name} ({len(content)} bytes)")
+        print(f"  bs4:       {soup_time * 1000:8.2f} ms  peak {soup_peak / 1024:8.1f} KiB")
+        print(f"  streaming: {stream_time * 1000:8.2f} ms  peak {stream_peak / 1024:8.1f} KiB")
+        print(f"  speedup {soup_time / stream_time:.1f}x, memory {soup_peak / max(stream_peak, 1):.1f}x, same result: {same}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench_pcgw_extract import synthetic_page
+
+
+class FakeAPIServer:
+    """
+    A local HTTP server standing in for the PCGamingWiki appid.php pages and the Steam store appdetails API.
+
+    Every response is delayed by latency seconds (plus up to jitter), and error_rate of the requests are
+    answered with 503, so retries and throttling behave like against the real servers. Pages point their
+    save location at %save_root%/<user-id>/<appid>, which the benchmarks set to the synthetic save folder.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, no_save_rate=0.1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.no_save_rate = no_save_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.pages = {}
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    def page(self, appid):
+        """
+        This function builds, once per appid, the page served for it. Some appids get a page without a save
+        game data section, like games PCGamingWiki has no save location for.
+        """
+        if appid not in self.pages:
+            if int(appid) % 100 < self.no_save_rate * 100:
+                self.pages[appid] = synthetic_page(section=False)
+            else:
+                self.pages[appid] = synthetic_page(locations=[
+                    f'<abbr>%save_root%</abbr>/<abbr>&lt;user-id&gt;</abbr>/{appid}',
+                    f'<abbr>%save_root%</abbr>/<abbr>&lt;user-id&gt;</abbr>/{appid}/slot0/save0.sav',
+                ])
+        return self.pages[appid]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    delay = server.latency + server.rng.random() * server.jitter
+                    failed = server.rng.random() < server.error_rate
+                time.sleep(delay)
+                if failed:
+                    self.send_error(503)
+                    return
+
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path.endswith('appid.php'):
+                    appid = query.get('appid', ['0'])[0]
+                    body, content_type = server.page(appid), 'text/html; charset=utf-8'
+                elif url.path.rstrip('/').endswith('appdetails'):
+                    appid = query.get('appids', ['0'])[0]
+                    body = json.dumps({appid: {'success': True, 'data': {'name': f'Synthetic Game {appid}'}}}).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', f'"{appid}"')
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from fake_server import FakeAPIServer
+from synth import generate_install
+
+from backup_paths import backup_save_files, group_save_paths
+from download_paths import dump_to_json
+from dump_game_names import request_steam
+from get_installed_games import get_installed_games, get_steam_library_folders
+from pipeline import STREAM_STAGES, PipelineRun
+from records import FINAL_PATHS_NAME, SAVE_PATHS_NAME, read_save_paths, records_file
+from scan_paths import check_paths, dump_results_to_file, scan_save_paths
+
+
+def measure(name, function, items, unit, trace_memory=True):
+    """
+    This function runs a scenario once and reports its wall time, throughput and peak traced memory.
+    Anything the scenario prints is swallowed so the report stays readable.
+
+    Parameters:
+    name (str): The name of the scenario.
+    function (callable): The scenario.
+    items (int or callable): The number of items processed, or a function returning it from the result.
+    unit (str): What the items are.
+    trace_memory (bool, optional): Measure the peak memory with tracemalloc, which slows the scenario down.
+
+    Returns:
+    object: The result of the scenario.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    if trace_memory:
+        tracemalloc.stop()
+
+    count = items(result) if callable(items) else items
+    memory = f"  peak {peak / 1024 / 1024:8.1f} MiB" if trace_memory else ""
+    print(f"{name:<32} {elapsed:8.3f} s  {count / elapsed if elapsed else 0:10.1f} {unit}/s{memory}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the pipeline stages against a synthetic Steam install and a local API stand-in.")
+    parser.add_argument('--libraries', type=int, default=3)
+    parser.add_argument('--games', type=int, default=600)
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--small-files', type=int, default=20)
+    parser.add_argument('--huge-games', type=int, default=2)
+    parser.add_argument('--huge-size', type=int, default=64 * 1024 * 1024)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds every fake API response is delayed.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of fake API responses that fail with 503.")
+    parser.add_argument('--no-memory', action='store_true', help="Do not trace memory, for undisturbed timings.")
+    parser.add_argument('--keep', metavar='DIR', help="Generate into DIR and keep it instead of a temporary folder.")
+    args = parser.parse_args()
+    trace = not args.no_memory
+
+    root = args.keep or tempfile.mkdtemp(prefix='steam_bench_')
+    previous_cwd = os.getcwd()
+    try:
+        start = time.perf_counter()
+        users = tuple(str(11111111 * (index + 1)) for index in range(args.users))
+        install = generate_install(root, libraries=args.libraries, games=args.games, users=users,
+                                   small_files=args.small_files, huge_games=args.huge_games, huge_size=args.huge_size)
+        print(f"generated {args.games} games in {args.libraries} libraries in {time.perf_counter() - start:.1f} s at {root}")
+
+        os.chdir(root)
+        backup_dir = os.path.join(root, 'backup')
+        os.environ.update({
+            'custom_steam_path': install['steam_path'],
+            'custom_ubisoft_path': os.path.join(root, 'Ubisoft'),
+            'path_to_game': '/steamapps/common',
+            'save_root': install['saves_path'],
+            'pcgw_cache_file': os.path.join(root, 'pcgamingwiki_cache.json'),
+            'manifest_index_file': os.path.join(root, 'manifest_index.json'),
+            'http_backoff': '0.01',
+        })
+
+        with FakeAPIServer(latency=args.latency, error_rate=args.error_rate) as server:
+            os.environ['pcgamingwiki_api_url'] = f'{server.base_url}/api/appid.php'
+            os.environ['steam_appdetails_url'] = f'{server.base_url}/api/appdetails/'
+
+            library_paths = get_steam_library_folders(install['steam_path'])
+            games = measure('get_installed_games (cold)', lambda: get_installed_games(library_paths), args.games, 'manifests', trace)
+            measure('get_installed_games (warm)', lambda: get_installed_games(library_paths), args.games, 'manifests', trace)
+
+            measure('dump_to_json (cold cache)', lambda: asyncio.run(dump_to_json(games)), args.games, 'games', trace)
+            measure('dump_to_json (warm cache)', lambda: asyncio.run(dump_to_json(games)), args.games, 'games', trace)
+
+            records = read_save_paths(records_file(SAVE_PATHS_NAME))
+            candidates = len(records) * len(users)
+            measure('check_paths', lambda: check_paths(list(users), records_file(SAVE_PATHS_NAME)), candidates, 'paths', trace)
+            _, final_paths = scan_save_paths(list(users), records)
+            dump_results_to_file(final_paths, records_file(FINAL_PATHS_NAME))
+
+            saves = group_save_paths(final_paths)
+            total_bytes = sum(
+                os.path.getsize(os.path.join(directory, name))
+                for paths in saves.values() for path in paths for directory, _, names in os.walk(path) for name in names
+            )
+
+            def backup_all():
+                return [backup_save_files(game_id, paths, backup_dir) for game_id, paths in saves.items()]
+
+            measure('backup_save_files (full)', backup_all, total_bytes / 1024 / 1024, 'MiB', trace)
+            measure('backup_save_files (unchanged)', backup_all, len(saves), 'games', trace)
+
+            appids = list(saves)
+            measure('request_steam', lambda: asyncio.run(request_steam(appids)), len(appids), 'appids', trace)
+
+            def pipeline(stream):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.environ['pcgw_cache_file'])
+                settings = {
+                    'steam_path': install['steam_path'],
+                    'ubisoft_path': os.environ['custom_ubisoft_path'],
+                    'path_to_game': os.environ['path_to_game'],
+                    'user_ids': list(users),
+                    'backup_dir': os.path.join(root, 'backup_stream' if stream else 'backup_staged'),
+                }
+                return PipelineRun(settings, profile_stages=(), stream=stream).run(STREAM_STAGES)
+
+            measure('pipeline (staged, cold)', lambda: pipeline(False), args.games, 'games', trace)
+            measure('pipeline (stream, cold)', lambda: pipeline(True), args.games, 'games', trace)
+            print(f"fake API served {server.requests} requests")
+    finally:
+        os.chdir(previous_cwd)
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
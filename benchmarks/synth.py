@@ -0,0 +1,117 @@
+import os
+import random
+
+FIRST_APPID = 100000
+
+
+def write_library_folders(steam_path, library_paths):
+    """
+    This function writes a libraryfolders.vdf listing the given libraries, in the current Steam format.
+
+    Parameters:
+    steam_path (str): The synthetic Steam installation directory.
+    library_paths (list): The library folders.
+    """
+    blocks = ''.join(
+        f'\t"{index}"\n\t{{\n\t\t"path"\t\t"{path.replace(os.sep, "/")}"\n\t\t"label"\t\t""\n'
+        f'\t\t"apps"\n\t\t{{\n\t\t}}\n\t}}\n'
+        for index, path in enumerate(library_paths)
+    )
+    os.makedirs(os.path.join(steam_path, 'steamapps'), exist_ok=True)
+    with open(os.path.join(steam_path, 'steamapps', 'libraryfolders.vdf'), 'w', encoding='utf-8') as file:
+        file.write(f'"libraryfolders"\n{{\n{blocks}}}\n')
+
+def write_app_manifest(steamapps_path, appid, last_updated):
+    """
+    This function writes an appmanifest_<appid>.acf shaped like the ones Steam writes.
+
+    Parameters:
+    steamapps_path (str): The steamapps folder of a library.
+    appid (int): The appid of the game.
+    last_updated (int): The LastUpdated timestamp of the game.
+    """
+    with open(os.path.join(steamapps_path, f'appmanifest_{appid}.acf'), 'w', encoding='utf-8') as file:
+        file.write(
+            '"AppState"\n{\n'
+            f'\t"appid"\t\t"{appid}"\n\t"universe"\t\t"1"\n\t"LauncherPath"\t\t"C:\\\\Steam\\\\steam.exe"\n'
+            f'\t"name"\t\t"Synthetic Game {appid}"\n\t"StateFlags"\t\t"4"\n\t"installdir"\t\t"Game{appid}"\n'
+            f'\t"LastUpdated"\t\t"{last_updated}"\n\t"LastOwner"\t\t"76561190000000000"\n'
+            '\t"InstalledDepots"\n\t{\n'
+            f'\t\t"{appid + 1}"\n\t\t{{\n\t\t\t"manifest"\t\t"1234567890"\n\t\t\t"size"\t\t"1000000"\n\t\t}}\n'
+            '\t}\n\t"UserConfig"\n\t{\n\t\t"language"\t\t"english"\n\t}\n}\n'
+        )
+
+def write_save_tree(save_path, small_files, small_size, huge_files, huge_size, rng):
+    """
+    This function fills a save folder with many small files spread over a few subfolders and a few huge ones.
+    Huge files are written in 1 MiB blocks so generating them needs little memory.
+    """
+    for index in range(small_files):
+        directory = os.path.join(save_path, f'slot{index % 4}')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'save{index}.sav'), 'wb') as file:
+            file.write(rng.randbytes(small_size))
+    os.makedirs(save_path, exist_ok=True)
+    block = rng.randbytes(1024 * 1024)
+    for index in range(huge_files):
+        with open(os.path.join(save_path, f'world{index}.dat'), 'wb') as file:
+            remaining = huge_size
+            while remaining > 0:
+                file.write(block[:remaining])
+                remaining -= len(block)
+
+def generate_install(root, libraries=2, games=1000, users=('11111111',), games_with_saves=None,
+                     small_files=20, small_size=4096, huge_games=2, huge_files=1, huge_size=64 * 1024 * 1024,
+                     seed=0):
+    """
+    This function generates a synthetic Steam install: a Steam folder, several libraries sharing the games
+    between them, an appmanifest per game and save trees under root/saves/<user id>/<appid>.
+
+    Parameters:
+    root (str): The folder to generate into.
+    libraries (int, optional): The number of libraries. The first one is the Steam folder itself.
+    games (int, optional): The number of installed games.
+    users (tuple, optional): The user ids that own save folders.
+    games_with_saves (int, optional): How many games get a save folder. Defaults to all of them.
+    small_files (int, optional): The number of small files per save folder.
+    small_size (int, optional): The size of each small file.
+    huge_games (int, optional): How many save folders also get huge files.
+    huge_files (int, optional): The number of huge files in those folders.
+    huge_size (int, optional): The size of each huge file.
+    seed (int, optional): The random seed, so runs are reproducible.
+
+    Returns:
+    dict: The steam_path, library_paths, saves_path, appids and users of the install.
+    """
+    rng = random.Random(seed)
+    steam_path = os.path.join(root, 'Steam')
+    library_paths = [steam_path] + [os.path.join(root, f'Library{index}') for index in range(1, libraries)]
+    for library_path in library_paths:
+        os.makedirs(os.path.join(library_path, 'steamapps'), exist_ok=True)
+    write_library_folders(steam_path, library_paths)
+
+    appids = [FIRST_APPID + index * 10 for index in range(games)]
+    for index, appid in enumerate(appids):
+        steamapps_path = os.path.join(library_paths[index % libraries], 'steamapps')
+        write_app_manifest(steamapps_path, appid, 1600000000 + rng.randrange(100000000))
+
+    saves_path = os.path.join(root, 'saves')
+    games_with_saves = games if games_with_saves is None else games_with_saves
+    for index, appid in enumerate(appids[:games_with_saves]):
+        for user_id in users:
+            write_save_tree(
+                os.path.join(saves_path, user_id, str(appid)),
+                small_files,
+                small_size,
+                huge_files if index < huge_games else 0,
+                huge_size,
+                rng,
+            )
+
+    return {
+        'steam_path': steam_path,
+        'library_paths': library_paths,
+        'saves_path': saves_path,
+        'appids': [str(appid) for appid in appids],
+        'users': list(users),
+    }
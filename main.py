@@ -1,7 +1,14 @@
+import argparse
 import os
 import subprocess
+import sys
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from metrics import metrics, write_reports
+from pipeline import STAGES, PipelineRun
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -15,7 +22,7 @@ def execute_script(script_name):
     Returns:
     bool: True if the script executed successfully, False otherwise.
     """
-    result = subprocess.run(['python', script_name], capture_output=True, text=True)
+    result = subprocess.run([sys.executable, script_name], capture_output=True, text=True)
     term_size = os.get_terminal_size()
     line = '='*term_size.columns
     if result.returncode != 0:
@@ -27,19 +34,55 @@ def execute_script(script_name):
         logging.info(f"Output of {script_name}:\n {result.stdout.strip()}")
         return True
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Back up Steam game saves.")
+    parser.add_argument('--stages', nargs='*', choices=STAGES, default=STAGES,
+                        help="The stages to run, in pipeline order. Defaults to all of them.")
+    parser.add_argument('--persist-json', action='store_true',
+                        help="Also write steam_paths.json and steam_paths_final.json between stages.")
+    parser.add_argument('--debug', action='store_true', help="Print the existence of every scanned path.")
+    parser.add_argument('--stream', action='store_true', default=None,
+                        help="Back up every game as soon as its save paths are found instead of stage by stage. Defaults to the pipeline_stream setting.")
+    parser.add_argument('--watch', action='store_true',
+                        help="After the stages, keep running and back up every game whose save files change.")
+    parser.add_argument('--profile', nargs='+', choices=STAGES + ['all'], metavar='STAGE',
+                        help="Profile these stages with cProfile, 'all' for every stage. Defaults to the profile_stages setting.")
+    parser.add_argument('--fleet', metavar='HOSTS_FILE',
+                        help="Run the stages for every host profile in HOSTS_FILE, see src/fleet.py.")
+    parser.add_argument('--subprocess', action='store_true',
+                        help="Run every stage as its own script like before, exchanging data through JSON files.")
+    return parser.parse_args()
+
 def main():
-    scripts = ['src/download_paths.py', 'src/scan_paths.py', 'src/backup_paths.py', 'src/dump_game_names.py']
-    success_count = 0
-    failure_count = 0
+    args = parse_args()
+
+    if args.fleet:
+        from fleet import read_host_profiles, run_fleet
+        report = run_fleet(read_host_profiles(args.fleet), args.stages)
+        sys.exit(1 if report['summary']['failed'] else 0)
+
+    run = None
+    if args.subprocess:
+        outcomes = {stage: execute_script(f'src/{stage}.py') for stage in STAGES if stage in args.stages}
+    else:
+        run = PipelineRun(persist_json=args.persist_json, debug=args.debug, profile_stages=args.profile,
+                          stream=args.stream)
+        outcomes = run.run(args.stages)
+
+    success_count = sum(outcomes.values())
+    failure_count = len(outcomes) - success_count
+
+    logging.info(f"Successful operations: {success_count}/{len(outcomes)}")
+    logging.info(f"Failed operations: {failure_count}/{len(outcomes)}")
 
-    for script in scripts:
-        if execute_script(script):
-            success_count += 1
-        else:
-            failure_count += 1
+    for stage, outcome in outcomes.items():
+        metrics.set('stage_success', int(outcome), stage=stage)
+    write_reports()
 
-    logging.info(f"Successful operations: {success_count}/{len(scripts)}")
-    logging.info(f"Failed operations: {failure_count}/{len(scripts)}")
+    if args.watch:
+        from watch_saves import watch
+        run = run or PipelineRun()
+        watch(run.get_final_paths(), run.settings['backup_dir'])
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
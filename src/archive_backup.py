@@ -0,0 +1,106 @@
+import contextlib
+import io
+import json
+import os
+import tarfile
+
+from global_funcs import root_kinds, scan_game_files
+
+ARCHIVE_MANIFEST = '.backup_manifest.json'
+COMPRESSIONS = {'gz': 'compresslevel', 'bz2': 'compresslevel', 'xz': 'preset'}
+
+
+def archive_path(backup_dir, game_id, compression='gz'):
+    """
+    This function returns where the archive of a game is written.
+
+    Parameters:
+    backup_dir (str): The directory where backups are stored.
+    game_id (str): The identification number for the game.
+    compression (str, optional): 'gz', 'bz2' or 'xz'. Defaults to 'gz'.
+
+    Returns:
+    str: The path of the archive.
+    """
+    return os.path.join(backup_dir, f'{game_id}.tar.{compression}')
+
+def read_archive_manifest(path):
+    """
+    This function reads the manifest stored as the first member of an archive. Only the start of the
+    archive is decompressed.
+
+    Parameters:
+    path (str): The path of the archive.
+
+    Returns:
+    dict: The manifest, or None if the archive does not exist or has no manifest.
+    """
+    try:
+        with tarfile.open(path, 'r|*') as tar:
+            member = tar.next()
+            if member is None or member.name != ARCHIVE_MANIFEST:
+                return None
+            return json.load(tar.extractfile(member))
+    except (OSError, tarfile.TarError, ValueError):
+        return None
+
+def archive_save_files(game_id, save_paths, backup_dir, compression='gz', level=None):
+    """
+    This function writes the save files of a game into one compressed tar archive.
+    The archive starts with a manifest of every file's root, size and mtime and of the kind of every root, followed by the files, which
+    are streamed from disk in blocks so they are never loaded whole. The archive is skipped when the
+    manifest of the existing archive matches the files on disk, and otherwise replaced atomically.
+
+    Parameters:
+    game_id (str): The identification number for the game.
+    save_paths (list): A collection of save paths.
+    backup_dir (str): The directory where backups are stored.
+    compression (str, optional): 'gz', 'bz2' or 'xz'. Defaults to 'gz'.
+    level (int, optional): The compression level, or the preset for xz.
+
+    Returns:
+    dict: The number of files archived and unchanged, and the size of the archive in bytes.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown archive compression: {compression}")
+    path = archive_path(backup_dir, game_id, compression)
+    summary = {'copied': 0, 'bytes': 0, 'unchanged': 0, 'deleted': 0}
+
+    files = {}
+    scanned = scan_game_files(save_paths)
+    for rel_path, (save_path, root_rel_path, size, mtime_ns, full_path) in scanned.items():
+        files[rel_path] = {'root': save_path, 'rel': root_rel_path, 'size': size, 'mtime_ns': mtime_ns, 'full_path': full_path}
+    manifest = {
+        'appid': game_id,
+        'files': {rel_path: {key: entry[key] for key in ('root', 'rel', 'size', 'mtime_ns')} for rel_path, entry in files.items()},
+        'roots': root_kinds(scanned),
+    }
+
+    old_manifest = read_archive_manifest(path)
+    if old_manifest and old_manifest['files'] == manifest['files'] and old_manifest.get('roots') == manifest['roots']:
+        summary['unchanged'] = len(files)
+        print(f"{game_id} unchanged, archive kept")
+        return summary
+    if old_manifest:
+        summary['deleted'] = len(old_manifest['files'].keys() - files.keys())
+
+    options = {COMPRESSIONS[compression]: level} if level is not None else {}
+    os.makedirs(backup_dir, exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    try:
+        with tarfile.open(tmp_path, f'w:{compression}', **options) as tar:
+            data = json.dumps(manifest).encode('utf-8')
+            info = tarfile.TarInfo(ARCHIVE_MANIFEST)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+            for rel_path, entry in files.items():
+                tar.add(entry['full_path'], arcname=rel_path, recursive=False)
+                summary['copied'] += 1
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    summary['bytes'] = os.path.getsize(path)
+    print(f"archived {summary['copied']} files of {game_id} to {path} ({summary['bytes']} bytes)")
+    return summary
@@ -1,36 +1,316 @@
-import os, shutil
+import json, logging, os, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
-from global_funcs import read_paths_from_file, read_appids_from_file
+from global_funcs import hash_file, root_kinds, scan_game_files
+from copy_engine import CopyEngine, copy_file
+from metrics import metrics, timed
+from records import FINAL_PATHS_NAME, SavePathTable, iter_save_paths, records_file
 load_dotenv()
 
-def backup_save_files(game_id, save_paths, backup_dir):
+MANIFEST_DIR = '.manifests'
+
+def manifest_path(backup_dir, game_id):
+    """
+    This function returns where the backup manifest of a game is kept.
+
+    Parameters:
+    backup_dir (str): The directory where backups are stored.
+    game_id (str): The identification number for the game.
+
+    Returns:
+    str: The path of the manifest file.
+    """
+    return os.path.join(backup_dir, MANIFEST_DIR, f'{game_id}.json')
+
+def load_manifest(backup_dir, game_id):
+    """
+    This function reads the backup manifest of a game. A missing or corrupt manifest is treated as empty,
+    which makes the next backup a full one.
+
+    Parameters:
+    backup_dir (str): The directory where backups are stored.
+    game_id (str): The identification number for the game.
+
+    Returns:
+    dict: The manifest with its 'files', 'roots' and 'deleted' entries.
+    """
+    try:
+        with open(manifest_path(backup_dir, game_id), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {'appid': game_id, 'files': {}, 'deleted': {}}
+
+def save_manifest(backup_dir, game_id, manifest):
+    """
+    This function writes the backup manifest of a game atomically.
+
+    Parameters:
+    backup_dir (str): The directory where backups are stored.
+    game_id (str): The identification number for the game.
+    manifest (dict): The manifest to write.
+    """
+    path = manifest_path(backup_dir, game_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, path)
+
+def backup_save_files(game_id, save_paths, backup_dir, incremental=True, use_hash=False, engine=None):
     """
     This function accepts a game id, a set of save paths, and a backup directory as parameters.
-    It goes through the save locations, finds the path in the backup folder, and makes the folder if it is not there. Next, it duplicates the storage location to the destination folder within the backup directory while displaying a notification.
-    
+    It copies the save files of the game into a folder named after the game id inside the backup directory.
+
+    When the game has several save paths, each one is copied into its own subfolder named after the path.
+
+    In incremental mode the files are compared against the game's manifest of (relative path, size, mtime
+    and optionally content hash). Only new or changed files are copied, files that disappeared are recorded
+    as deleted and a game without changes is skipped after a single directory walk. With use_hash, a file
+    whose mtime changed but whose contents hash the same is not copied again.
+    Without incremental mode the whole save location is copied over the existing backup.
+    Files are copied by the given copy engine, or one after another when there is none.
+
     Input parameters:
-    
+
     game_id (str): The identification number for the game.
-    
+
     save_paths (list): A collection of save paths.
-    
-    backup_dir (string): The directory where backups are stored. 
-    """
-    for save_path in save_paths:
-        resolved_path = os.path.join(backup_dir, save_path)
-        
-        if not os.path.exists(backup_dir):
-            os.makedirs(resolved_path)
-        file_name = f"{game_id}"
-        target_dir = os.path.join(backup_dir, file_name)
-        shutil.copytree(save_path, target_dir)
-        print(f"copied to {target_dir}")
+
+    backup_dir (string): The directory where backups are stored.
+
+    incremental (bool, optional): Only copy what changed since the last backup. Defaults to True.
+
+    use_hash (bool, optional): Record and compare content hashes. Defaults to False.
+
+    engine (CopyEngine, optional): The engine to copy the files with.
+
+    Returns:
+    dict: The number of files copied, unchanged and deleted, and the number of bytes copied.
+    """
+    target_dir = os.path.join(backup_dir, f"{game_id}")
+    summary = {'copied': 0, 'bytes': 0, 'unchanged': 0, 'deleted': 0}
+
+    manifest = load_manifest(backup_dir, game_id)
+    old_files = manifest['files']
+    new_files = {}
+    changed = []
+    touched = False
+
+    files = scan_game_files(save_paths)
+    roots = root_kinds(files)
+    for rel_path, (save_path, root_rel_path, size, mtime_ns, full_path) in files.items():
+        entry = {'root': save_path, 'rel': root_rel_path, 'size': size, 'mtime_ns': mtime_ns, 'hash': None}
+        old = old_files.get(rel_path)
+        if incremental and old and old['size'] == size and old['mtime_ns'] == mtime_ns:
+            entry['hash'] = old.get('hash')
+            summary['unchanged'] += 1
+        else:
+            if use_hash:
+                entry['hash'] = hash_file(full_path)
+            if incremental and old and use_hash and old.get('hash') == entry['hash']:
+                summary['unchanged'] += 1
+                touched = True
+            else:
+                changed.append((rel_path, full_path, size))
+        new_files[rel_path] = entry
+
+    deleted = [rel_path for rel_path in old_files if rel_path not in new_files]
+
+    if not changed and not deleted and not touched and manifest.get('roots') == roots:
+        print(f"{game_id} unchanged, skipped")
+        return summary
+
+    pairs = [(full_path, os.path.join(target_dir, *rel_path.split('/'))) for rel_path, full_path, _ in changed]
+    if engine:
+        summary['bytes'] = engine.copy_files(pairs)
+    else:
+        for source, destination in pairs:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            summary['bytes'] += copy_file(source, destination)
+    summary['copied'] = len(pairs)
+
+    now = time.time()
+    for rel_path in deleted:
+        manifest['deleted'][rel_path] = now
+    for rel_path in new_files:
+        manifest['deleted'].pop(rel_path, None)
+    summary['deleted'] = len(deleted)
+
+    manifest['files'] = new_files
+    manifest['roots'] = roots
+    manifest['updated_at'] = now
+    save_manifest(backup_dir, game_id, manifest)
+    print(f"copied {summary['copied']} changed files ({summary['bytes']} bytes) to {target_dir}, {summary['deleted']} deleted")
+    return summary
+
+def group_save_paths(records):
+    """
+    This function groups save path records by game, keeping the order in which the games first appear.
+
+    Parameters:
+    records (iterable): SavePath records, e.g. a SavePathTable or the records of iter_save_paths.
+
+    Returns:
+    dict: A dictionary mapping each appid to its list of save paths.
+    """
+    if isinstance(records, SavePathTable):
+        return {appid: records.paths_of(appid) for appid in records.unique_appids()}
+    games = {}
+    for record in records:
+        games.setdefault(record.appid, []).append(record.path)
+    return games
+
+class BackupRunner:
+    """
+    Backs up games one at a time as they are submitted, on the pool that suits the backup mode.
+
+    In 'copy' mode games are backed up on a pool of backup_game_workers threads that hand their files to a
+    shared CopyEngine. In 'snapshot' mode games are added to the snapshot store on the same kind of pool and
+    the retention policy is applied when the runner is closed. In 'archive' mode games are compressed on a
+    process pool of archive_workers processes. backup_games submits a whole run at once, while the streaming
+    pipeline submits every game as soon as its save paths are known. The settings are read from environ,
+    the environment unless the settings of another host are given.
+    """
+
+    def __init__(self, backup_dir, incremental=None, use_hash=None, mode=None, environ=None):
+        environ = os.environ if environ is None else environ
+        if incremental is None:
+            incremental = environ.get("backup_incremental", "1") != "0"
+        if use_hash is None:
+            use_hash = environ.get("backup_hash", "0") == "1"
+        self.backup_dir = backup_dir
+        self.incremental = incremental
+        self.use_hash = use_hash
+        self.environ = environ
+        self.mode = mode or environ.get("backup_mode") or "copy"
+        self.workers = int(environ.get("backup_game_workers") or 4)
+        self.engine = None
+
+        if self.mode == "copy":
+            self.engine = CopyEngine.from_env()
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='game')
+        elif self.mode == "snapshot":
+            self.chunk_size = int(environ.get("snapshot_chunk_size") or 4 * 1024 * 1024)
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='game')
+        elif self.mode == "archive":
+            level = environ.get("archive_level")
+            self.compression = environ.get("archive_compression") or "gz"
+            self.level = int(level) if level else None
+            self.workers = int(environ.get("archive_workers") or 0) or os.cpu_count() or 1
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            raise ValueError(f"Unknown backup mode: {self.mode}")
+
+    def submit(self, game_id, save_paths):
+        """
+        This function starts the backup of one game.
+
+        Parameters:
+        game_id (str): The identification number for the game.
+        save_paths (list): The save paths of the game.
+
+        Returns:
+        concurrent.futures.Future: The future of the backup, to pass to result.
+        """
+        if self.mode == "snapshot":
+            from snapshot_store import snapshot_save_files
+            return self.pool.submit(timed, snapshot_save_files, game_id, save_paths, self.backup_dir, self.chunk_size)
+        if self.mode == "archive":
+            from archive_backup import archive_save_files
+            return self.pool.submit(timed, archive_save_files, game_id, save_paths, self.backup_dir,
+                                    self.compression, self.level)
+        return self.pool.submit(timed, backup_save_files, game_id, save_paths, self.backup_dir,
+                                self.incremental, self.use_hash, self.engine)
+
+    def result(self, game_id, future):
+        """
+        This function waits for the backup of one game and records its duration, files and bytes in the run metrics.
+
+        Parameters:
+        game_id (str): The identification number for the game.
+        future (concurrent.futures.Future): The future returned by submit.
+
+        Returns:
+        dict: The backup summary of the game.
+        """
+        summary, seconds = future.result()
+        metrics.record_backup(self.mode, game_id, summary, seconds)
+        return summary
+
+    def apply_retention(self):
+        """
+        This function removes the snapshots outside the retention policy set by snapshot_keep_last,
+        snapshot_keep_daily and snapshot_keep_weekly, and the blobs only they used. It does nothing outside
+        'snapshot' mode and is called by close, or by long running callers between backups.
+        """
+        if self.mode != "snapshot":
+            return
+        from snapshot_store import apply_retention
+        removed_snapshots, removed_blobs = apply_retention(
+            self.backup_dir,
+            keep_last=int(self.environ.get("snapshot_keep_last") or 10),
+            keep_daily=int(self.environ.get("snapshot_keep_daily") or 7),
+            keep_weekly=int(self.environ.get("snapshot_keep_weekly") or 4),
+        )
+        print(f"retention removed {removed_snapshots} snapshots and {removed_blobs} blobs")
+
+    def close(self):
+        self.pool.shutdown()
+        if self.engine is not None:
+            self.engine.close()
+            totals = self.engine.stats.totals()
+            print(f"copied {totals['files']} files ({totals['bytes']} bytes) with {len(self.engine.stats.workers)} workers")
+        self.apply_retention()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def backup_games(records, backup_dir, incremental=None, use_hash=None, mode=None, environ=None):
+    """
+    This function backs up the save folders of every record into the backup directory.
+    The save paths of a game are backed up together so they share one manifest. Up to backup_game_workers
+    games are backed up at once and their files are copied by a shared CopyEngine.
+
+    In 'copy' mode every game is a plain folder in the backup directory. In 'snapshot' mode every run adds
+    a snapshot to the deduplicated snapshot store instead, and snapshots outside the retention policy set by
+    snapshot_keep_last, snapshot_keep_daily and snapshot_keep_weekly are removed afterwards. In 'archive'
+    mode every game is written as one compressed tar archive, with games compressed in parallel processes.
+    The duration, files and bytes of every game are recorded in the run metrics.
+    A game whose backup fails, e.g. because a save folder cannot be read, keeps its previous backup and does
+    not stop the others. Every failure is logged and the first one is raised once all games are done.
+
+    Parameters:
+    records (iterable): SavePath records with resolved paths, read only once.
+    backup_dir (str): The directory where backups are stored.
+    incremental (bool, optional): Defaults to the backup_incremental environment variable, on unless set to 0.
+    use_hash (bool, optional): Defaults to the backup_hash environment variable, off unless set to 1.
+    mode (str, optional): 'copy', 'snapshot' or 'archive'. Defaults to the backup_mode environment variable, or 'copy'.
+    environ (dict, optional): The settings to read instead of the environment, e.g. those of another host.
+
+    Returns:
+    dict: A dictionary mapping each appid to its backup summary.
+    """
+    games = group_save_paths(records)
+    summaries = {}
+    failures = {}
+    with BackupRunner(backup_dir, incremental, use_hash, mode, environ) as runner:
+        futures = {game_id: runner.submit(game_id, save_paths) for game_id, save_paths in games.items()}
+        for game_id, future in futures.items():
+            try:
+                summaries[game_id] = runner.result(game_id, future)
+            except Exception as e:
+                failures[game_id] = e
+    for game_id, error in failures.items():
+        logging.error(f"Backup of {game_id} failed: {error!r}")
+    if failures:
+        raise next(iter(failures.values()))
+    return summaries
 
 def main():
-    save_paths = read_paths_from_file('steam_paths_final.json')
-    appids = read_appids_from_file('steam_paths_final.json')
-    for game_id, save_path in zip(appids, save_paths):
-        backup_save_files(game_id, [save_path], os.environ.get("backup_dir"))
+    backup_games(iter_save_paths(records_file(FINAL_PATHS_NAME)), os.environ.get("backup_dir"))
 
 
 if __name__ == '__main__':
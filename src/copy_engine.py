@@ -0,0 +1,187 @@
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+FAST_COPY_THRESHOLD = 8 * 1024 * 1024
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+
+class Throttle:
+    """
+    A token bucket shared by all copy workers that limits the total number of bytes copied per second.
+    """
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.tokens = bytes_per_second
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, count):
+        """
+        This function blocks until count bytes may be copied.
+
+        Parameters:
+        count (int): The number of bytes about to be copied.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= count
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class CopyStats:
+    """
+    Thread-safe counters of the files and bytes every copy worker copied.
+    """
+
+    def __init__(self):
+        self.workers = {}
+        self.lock = threading.Lock()
+
+    def add(self, count):
+        """
+        This function records one copied file of count bytes for the calling worker thread.
+
+        Parameters:
+        count (int): The size of the copied file.
+        """
+        name = threading.current_thread().name
+        with self.lock:
+            worker = self.workers.setdefault(name, {'files': 0, 'bytes': 0})
+            worker['files'] += 1
+            worker['bytes'] += count
+
+    def totals(self):
+        """
+        This function sums the counters of all workers.
+
+        Returns:
+        dict: The total number of files and bytes copied.
+        """
+        with self.lock:
+            return {
+                'files': sum(worker['files'] for worker in self.workers.values()),
+                'bytes': sum(worker['bytes'] for worker in self.workers.values()),
+            }
+
+
+def _copy_with_kernel(src_file, dst_file, size, throttle):
+    """
+    This function copies a file with os.copy_file_range, or os.sendfile on Linux kernels without it,
+    so the data never passes through Python. It works in blocks so the throttle stays responsive.
+    """
+    src_fd, dst_fd = src_file.fileno(), dst_file.fileno()
+    offset = 0
+    while offset < size:
+        count = min(COPY_BLOCK_SIZE, size - offset)
+        if throttle:
+            throttle.consume(count)
+        if hasattr(os, 'copy_file_range'):
+            sent = os.copy_file_range(src_fd, dst_fd, count)
+        else:
+            sent = os.sendfile(dst_fd, src_fd, offset, count)
+        if sent == 0:
+            break
+        offset += sent
+
+def _copy_buffered(src_file, dst_file, throttle):
+    while chunk := src_file.read(BUFFER_SIZE):
+        if throttle:
+            throttle.consume(len(chunk))
+        dst_file.write(chunk)
+
+def copy_file(src, dst, throttle=None, stats=None):
+    """
+    This function copies a file including its timestamps, like shutil.copy2.
+    Files larger than FAST_COPY_THRESHOLD are copied in the kernel where the platform allows it, falling
+    back to a buffered copy if the file system refuses.
+
+    Parameters:
+    src (str): The file to copy.
+    dst (str): The destination file.
+    throttle (Throttle, optional): The throttle to draw bytes from.
+    stats (CopyStats, optional): The counters to record the copy in.
+
+    Returns:
+    int: The number of bytes copied.
+    """
+    size = os.path.getsize(src)
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        if size >= FAST_COPY_THRESHOLD and sys.platform.startswith('linux'):
+            try:
+                _copy_with_kernel(src_file, dst_file, size, throttle)
+            except OSError:
+                src_file.seek(0)
+                dst_file.seek(0)
+                dst_file.truncate()
+                _copy_buffered(src_file, dst_file, throttle)
+        elif throttle:
+            _copy_buffered(src_file, dst_file, throttle)
+        else:
+            shutil.copyfileobj(src_file, dst_file, BUFFER_SIZE)
+    shutil.copystat(src, dst)
+    if stats:
+        stats.add(size)
+    return size
+
+
+class CopyEngine:
+    """
+    Copies files on a pool of worker threads with a shared throttle and per-worker counters.
+
+    backup_paths uses one engine per run: games are backed up on their own pool of game_workers and hand
+    their files to the engine, so a game with a large save folder is copied by several workers at once.
+    """
+
+    def __init__(self, workers=8, bytes_per_second=0):
+        self.workers = workers
+        self.throttle = Throttle(bytes_per_second) if bytes_per_second else None
+        self.stats = CopyStats()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='copy')
+
+    @classmethod
+    def from_env(cls):
+        """
+        This function builds an engine from the backup_file_workers and backup_max_bytes_per_sec environment variables.
+
+        Returns:
+        CopyEngine: The engine.
+        """
+        return cls(
+            workers=int(os.environ.get("backup_file_workers") or 8),
+            bytes_per_second=int(os.environ.get("backup_max_bytes_per_sec") or 0),
+        )
+
+    def copy_files(self, pairs):
+        """
+        This function copies (source, destination) pairs in parallel, creating destination folders as needed,
+        and waits for all of them.
+
+        Parameters:
+        pairs (list): The (source, destination) paths to copy.
+
+        Returns:
+        int: The total number of bytes copied.
+        """
+        for directory in {os.path.dirname(dst) for _, dst in pairs}:
+            os.makedirs(directory, exist_ok=True)
+        futures = [self.pool.submit(copy_file, src, dst, self.throttle, self.stats) for src, dst in pairs]
+        return sum(future.result() for future in futures)
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,15 +1,24 @@
 import asyncio
-import json
 import os
 import re
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from get_installed_games import get_installed_games, get_steam_library_folders
 
-from global_funcs import  get_request, get_steam_path, get_ubisoft_path, remove_extension_and_filename
+from metrics import metrics
+from global_funcs import  get_request, get_steam_path, http_session, pcgamingwiki_url, get_ubisoft_path, remove_extension_and_filename
+from path_templates import compile_template
+from pcgw_extract import extract_save_rows
+from records import SAVE_PATHS_NAME, SavePathTable, records_file, write_save_paths
+from request_scheduler import RetryQueue, last_updated_of, prioritize
+from save_db import SaveLocationDB
+from save_path_cache import SavePathCache
 
 load_dotenv()
 
+BRACKETS_PATTERN = re.compile(r'\[.*?\]')
+SUFFIX_PATTERN = re.compile(r"\*$|loop_save")
+
 
 def split_path_by_placeholders(original_save_path):
     """
@@ -43,72 +52,326 @@ def clean_path(original_save_path):
     Returns:
     str: The cleaned path.
     """
-    clean_save_path = re.sub(r'\[.*?\]', '', original_save_path).strip()
+    clean_save_path = BRACKETS_PATTERN.sub('', original_save_path).strip()
     clean_save_path = remove_extension_and_filename(clean_save_path).strip()
-    clean_save_path = re.sub(r"\*$", '', clean_save_path).strip()
-    clean_save_path = re.sub(r"loop_save", '', clean_save_path).strip()
+    clean_save_path = SUFFIX_PATTERN.sub('', clean_save_path).strip()
     return clean_save_path
 
-async def get_pcgamingwiki_save_path(appid):
-    url = f"https://pcgamingwiki.com/api/appid.php?appid={appid}"
-    response = await get_request(url)
+def clean_save_rows(rows):
+    """
+    This function keeps the Steam and Windows rows of the save game data table and cleans their paths.
+
+    Parameters:
+    rows (list): The (system, location) text of every row.
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    Returns:
+    list: The cleaned save paths, or None if none are left.
+    """
+    save_paths = []
+    for platform, location in rows:
+        if not platform or platform.lower() not in ['steam', 'windows']:
+            continue
+        if location is not None:
+            original_save_path = split_path_by_placeholders(location)
+            clean_save_path = clean_path(original_save_path)
+            if clean_save_path:
+                save_paths.append(clean_save_path)
+
+    return save_paths if save_paths else None
+
+def parse_save_paths_soup(content):
+    """
+    This function extracts the save game data rows from a PCGamingWiki page with BeautifulSoup.
+    It builds a tree of the whole page and is kept as a fallback for the streaming extractor.
+
+    Parameters:
+    content (bytes): The raw HTML of the page.
+
+    Returns:
+    list: The (system, location) text of every row, or None if the page has no save game data section.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
     save_game_section = soup.find('span', id='Save_game_data_location')
     if not save_game_section:
         return None
 
     rows = save_game_section.find_next('table').find_all('tr', class_='template-infotable-body table-gamedata-body-row')
 
-    save_paths = []
+    save_rows = []
     for row in rows:
         platform = row.find('th', class_='table-gamedata-body-system')
-        if not platform or platform.text.strip().lower() not in ['steam', 'windows']:
-            continue
         save_path = row.find('td', class_='table-gamedata-body-location')
-        if save_path:
-            original_save_path = save_path.text.strip()
-            original_save_path = split_path_by_placeholders(original_save_path)
-            clean_save_path = clean_path(original_save_path)
-            if clean_save_path:
-                save_paths.append(clean_save_path)
+        save_rows.append((platform.text.strip() if platform else None, save_path.text.strip() if save_path else None))
+    return save_rows
 
-    return save_paths if save_paths else None
+def extract_rows(content):
+    """
+    This function extracts the (system, location) rows of the save game data table from a PCGamingWiki page.
+    The streaming extractor is used unless pcgw_parser=bs4 is set in the environment, and BeautifulSoup
+    takes over if the streaming extractor cannot handle the page.
+
+    Parameters:
+    content (bytes): The raw HTML of the page.
+
+    Returns:
+    list: The (system, location) text of every row, or None if the page has no save game data section.
+    """
+    if os.environ.get("pcgw_parser") != "bs4":
+        try:
+            return extract_save_rows(content)
+        except Exception as e:
+            print(f"Streaming extraction failed, falling back to BeautifulSoup: {e!r}")
+    return parse_save_paths_soup(content)
+
+def parse_save_paths(content):
+    """
+    This function extracts the Steam and Windows save paths from a PCGamingWiki page.
+
+    Parameters:
+    content (bytes): The raw HTML of the page.
+
+    Returns:
+    list: The cleaned save paths, or None if the page has no save game data section.
+    """
+    rows = extract_rows(content)
+    if not rows:
+        return None
+    return clean_save_rows(rows)
+
+async def get_pcgamingwiki_save_path(appid, cache=None, queue=None):
+    """
+    This function returns the save paths of a game, serving them from the cache when possible.
+    Fresh entries are returned without touching the network, stale entries are revalidated with a
+    conditional request and misses download and parse the page. If the request fails, a stale entry is
+    still better than nothing and is returned as is, and the appid is queued to be retried first next run.
+
+    Parameters:
+    appid (str): The appid of the game.
+    cache (SavePathCache, optional): The cache to read from and write to.
+    queue (RetryQueue, optional): The queue of failed lookups.
+
+    Returns:
+    list: The cleaned save paths, or None if none are known.
+    """
+    entry = None
+    headers = None
+    if cache is not None:
+        status, entry = cache.lookup(appid)
+        if status == 'hit':
+            return entry['paths']
+        headers = cache.conditional_headers(entry)
+
+    url = pcgamingwiki_url(appid)
+    response = await get_request(url, headers=headers)
+    if response is None:
+        if queue is not None:
+            queue.failed('pcgamingwiki', appid)
+        return entry['paths'] if entry else None
+    if queue is not None:
+        queue.succeeded('pcgamingwiki', appid)
+
+    if response.status_code == 304 and entry is not None:
+        cache.revalidate(appid)
+        return entry['paths']
+
+    save_paths = parse_save_paths(response.content)
+    if cache is not None:
+        cache.store(appid, save_paths, response.headers)
+    return save_paths
 
 def paths_to_json(data):
     """
-    This function takes a list of data and writes it to a JSON file named 'steam_paths.json'.
+    This function takes the save path records and writes them to 'steam_paths.json', or to 'steam_paths.jsonl' with records_format=jsonl.
     
     Parameters:
-    data (list): The data to be written to the JSON file.
+    data (SavePathTable): The records to be written.
     """
-    with open('steam_paths.json', 'w') as f:
-        print(data)
-        json.dump(data, f)
-        f.write('\n')
+    file_path = records_file(SAVE_PATHS_NAME)
+    print(f"Writing {len(data)} save paths to {file_path}")
+    write_save_paths(data, file_path)
 
 
-async def dump_to_json(installed_games):
-    steam_path = get_steam_path()
-    path_to_game = os.environ.get("path_to_game")
-    ubisoft_path = get_ubisoft_path()
+async def refresh_save_db(db, appids, max_age=None, queue=None):
+    """
+    This function looks up the appids whose entries in the save location database are missing or older than
+    max_age on PCGamingWiki and stores the cleaned paths of every platform. Stale appids are requested in
+    the order given. Appids whose request fails keep their old entry and are queued to be retried first
+    next run.
 
-    data = []
-    tasks = []
-    for game in installed_games:
-        tasks.append(get_pcgamingwiki_save_path(game['appid']))
+    Parameters:
+    db (SaveLocationDB): The database to refresh.
+    appids (list): The appids that should be up to date.
+    max_age (float, optional): The maximum age of an entry in seconds. Defaults to the save_db_max_age environment variable or 30 days.
+    queue (RetryQueue, optional): The queue of failed lookups.
 
-    results = await asyncio.gather(*tasks)
+    Returns:
+    int: The number of appids refreshed.
+    """
+    if max_age is None:
+        max_age = float(os.environ.get("save_db_max_age") or 30 * 24 * 60 * 60)
+    stale = db.stale_appids(appids, max_age)
+    metrics.record_cache('save_db', len(appids) - len(stale), len(stale))
+    if not stale:
+        return 0
+
+    async def fetch(appid):
+        response = await get_request(pcgamingwiki_url(appid))
+        if queue is not None:
+            if response is None:
+                queue.failed('pcgamingwiki', appid)
+            else:
+                queue.succeeded('pcgamingwiki', appid)
+        return None if response is None else response.content
+
+    async with http_session():
+        pages = await asyncio.gather(*[fetch(appid) for appid in stale])
+
+    entries = {}
+    for appid, content in zip(stale, pages):
+        if content is None:
+            continue
+        rows = []
+        for platform, location in extract_rows(content) or []:
+            if platform and location:
+                clean_save_path = clean_path(split_path_by_placeholders(location))
+                if clean_save_path:
+                    rows.append((platform, clean_save_path))
+        entries[appid] = rows or None
+    db.store_many(entries)
+    return len(entries)
 
-    for game, pcgamingwiki_paths in zip(installed_games, results):
+async def stream_save_paths(appids, last_updated=None, queue_size=None):
+    """
+    This function looks up the raw save paths of many games, each distinct appid once, and yields every
+    game as soon as its lookup finishes, so later stages can start on it while the others are in flight.
+    When the save_db environment variable names a save location database, the paths come from it with one
+    query after refreshing its stale entries, or without any network access when offline=1 is set.
+    Otherwise they come from PCGamingWiki through the save path cache, looked up by http_max_in_flight
+    workers that wait when queue_size results are not consumed yet, so memory stays flat.
+    Requests are sent in priority order: appids whose lookup failed on an earlier run first, then the most
+    recently updated games, so a rate limited run spends its budget where saves most likely changed.
+
+    Parameters:
+    appids (list): The appids to look up.
+    last_updated (dict, optional): A dictionary mapping appids to the LastUpdated timestamp of their appmanifest.
+    queue_size (int, optional): The number of results buffered for the consumer. Defaults to the stream_queue_size environment variable or 64.
+
+    Yields:
+    tuple: The appid and its save paths, or None if none are known, in the order the lookups finish.
+    """
+    queue = RetryQueue.from_env()
+    appids = prioritize(appids, last_updated, queue.pending('pcgamingwiki'))
+    db = SaveLocationDB.from_env()
+    if db is not None:
+        try:
+            if os.environ.get("offline") != "1":
+                await refresh_save_db(db, appids, queue=queue)
+                queue.save()
+            known = db.lookup_many(appids)
+        finally:
+            db.close()
+        for appid in appids:
+            yield appid, known.get(appid)
+        return
+
+    cache = SavePathCache.from_env()
+    queue_size = queue_size or int(os.environ.get("stream_queue_size") or 64)
+    workers = min(len(appids), int(os.environ.get("http_max_in_flight") or 16))
+    pending = iter(appids)
+    results = asyncio.Queue(maxsize=queue_size)
+
+    async def lookup():
+        try:
+            for appid in pending:
+                await results.put((appid, await get_pcgamingwiki_save_path(appid, cache, queue)))
+        except Exception as e:
+            await results.put((None, e))
+
+    async with http_session():
+        tasks = [asyncio.create_task(lookup()) for _ in range(workers)]
+        try:
+            for _ in appids:
+                appid, save_paths = await results.get()
+                if appid is None:
+                    raise save_paths
+                yield appid, save_paths
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            cache.save()
+            queue.save()
+    print(f"PCGamingWiki cache: {cache.stats}")
+    metrics.record_cache('pcgamingwiki', cache.stats['hits'], cache.stats['misses'] + cache.stats['stale'])
+    metrics.increment('cache_revalidated_total', cache.stats['revalidated'], cache='pcgamingwiki')
+
+async def lookup_save_paths(appids, last_updated=None):
+    """
+    This function looks up the raw save paths of many games with stream_save_paths and waits for all of them.
+
+    Parameters:
+    appids (list): The appids to look up.
+    last_updated (dict, optional): A dictionary mapping appids to the LastUpdated timestamp of their appmanifest.
+
+    Returns:
+    dict: A dictionary mapping each appid to its save paths, or None if none are known.
+    """
+    return {appid: save_paths async for appid, save_paths in stream_save_paths(appids, last_updated)}
+
+def render_save_paths(installed_games, known_paths, steam_path, ubisoft_path, path_to_game):
+    """
+    This function fills in the Steam, Ubisoft Connect and game folder placeholders of the save paths of
+    every installed game. The user id placeholder is turned into '{}' for scan_paths to fill in.
+
+    Parameters:
+    installed_games (list): Installed games as returned by get_installed_games.
+    known_paths (dict): A dictionary mapping appids to their raw save paths, as returned by lookup_save_paths.
+    steam_path (str): The Steam installation directory.
+    ubisoft_path (str): The Ubisoft Connect installation directory.
+    path_to_game (str): The game folder relative to the Steam installation directory.
+
+    Returns:
+    SavePathTable: The save path records.
+    """
+    data = SavePathTable()
+    context = {'Steam-folder': steam_path, 'Ubisoft-Connect-folder': ubisoft_path}
+    for game in installed_games:
+        pcgamingwiki_paths = known_paths.get(str(game['appid']))
         if pcgamingwiki_paths:
+            context['path-to-game'] = f'{steam_path}{path_to_game}\\\\{game["installdir"]}'
             for path in pcgamingwiki_paths:
-                formatted_path = path.replace('<user-id>', '{}').replace('<Steam-folder>', steam_path).replace('<Ubisoft-Connect-folder>', ubisoft_path).replace('<path-to-game>', f'{steam_path}{path_to_game}\\\\{game["installdir"]}')
-                data.append({
-                    'appid': game['appid'],
-                    'path': formatted_path
-                })
+                formatted_path = compile_template(path).render(context, expand_env=False)
+                data.append(game['appid'], formatted_path)
+
+    return data
+
+async def collect_save_paths(installed_games, steam_path, ubisoft_path, path_to_game, known_paths=None):
+    """
+    This function looks up the save paths of every installed game with lookup_save_paths and fills in
+    their placeholders with render_save_paths.
+
+    Parameters:
+    installed_games (list): Installed games as returned by get_installed_games.
+    steam_path (str): The Steam installation directory.
+    ubisoft_path (str): The Ubisoft Connect installation directory.
+    path_to_game (str): The game folder relative to the Steam installation directory.
+    known_paths (dict, optional): Save paths that were already looked up, e.g. once for a whole fleet. Games missing from it are looked up.
+
+    Returns:
+    SavePathTable: The save path records.
+    """
+    known_paths = dict(known_paths or {})
+    missing = [game['appid'] for game in installed_games if str(game['appid']) not in known_paths]
+    if missing:
+        known_paths.update(await lookup_save_paths(missing, last_updated_of(installed_games)))
+    return render_save_paths(installed_games, known_paths, steam_path, ubisoft_path, path_to_game)
+
+async def dump_to_json(installed_games):
+    steam_path = get_steam_path()
+    path_to_game = os.environ.get("path_to_game")
+    ubisoft_path = get_ubisoft_path()
 
+    data = await collect_save_paths(installed_games, steam_path, ubisoft_path, path_to_game)
     paths_to_json(data)
 
 def main():
@@ -1,18 +1,55 @@
 import os
-import httpx
+import json
 import asyncio
-from global_funcs import read_appids_from_file
+from global_funcs import get_request, get_steam_path, http_session, steam_appdetails_url
+from get_installed_games import get_installed_games, get_steam_library_folders
+from metrics import metrics
+from records import FINAL_PATHS_NAME, iter_save_paths, records_file
+from request_scheduler import RetryQueue, last_updated_of, prioritize
 from dotenv import load_dotenv
 
 load_dotenv()
 
-async def fetch_game_name(client, appid):
-    req_url = f"https://store.steampowered.com/api/appdetails/?appids={appid}"
-    response = await client.get(req_url)
-    if response.status_code != 200:
-        print(f"Error: {response.status_code} {response.reason}")
-        return None
-    return response.json()[appid]['data']['name']
+DEFAULT_NAME_CACHE_FILE = 'game_names.json'
+
+def extract_game_name(appid, payload):
+    """
+    This function takes the game name out of a Steam store appdetails response, checking every level of
+    the payload, as the store answers some appids with null or with a different shape.
+
+    Parameters:
+    appid (str): The appid that was requested.
+    payload: The decoded JSON response.
+
+    Returns:
+    tuple: The outcome, 'found', 'unknown' when the store does not know the appid or 'invalid' when the
+    payload is malformed, and the name, or None if none was found.
+    """
+    details = payload.get(str(appid)) if isinstance(payload, dict) else None
+    if not isinstance(details, dict):
+        return 'invalid', None
+    if not details.get('success'):
+        return 'unknown', None
+    data = details.get('data')
+    name = data.get('name') if isinstance(data, dict) else None
+    if not isinstance(name, str) or not name:
+        return 'invalid', None
+    return 'found', name
+
+async def fetch_game_name(appid, queue=None):
+    req_url = steam_appdetails_url(appid)
+    response = await get_request(req_url)
+    try:
+        result, name = extract_game_name(appid, response.json()) if response is not None else ('failed', None)
+    except ValueError:
+        result, name = 'invalid', None
+    metrics.increment('game_name_lookups_total', result=result)
+    if queue is not None:
+        if name is None:
+            queue.failed('game_names', appid)
+        else:
+            queue.succeeded('game_names', appid)
+    return name
 
 async def request_steam(appids):
     """
@@ -24,15 +61,88 @@ async def request_steam(appids):
     appids (list): A list of appids to request game names for.
     
     Returns:
-    list: A list of game names corresponding to the input appids.
+    list: A list of game names in the same order as the input appids, with None where the request failed.
     """
     game_names = []
-    async with httpx.AsyncClient() as client:
-        tasks = [fetch_game_name(client, appid) for appid in appids]
+    async with http_session():
+        tasks = [fetch_game_name(appid) for appid in appids]
         game_names = await asyncio.gather(*tasks)
-    return [name for name in game_names if name is not None]
+    return game_names
+
+def load_name_cache(file_path=DEFAULT_NAME_CACHE_FILE):
+    """
+    This function reads the persistent appid to name cache. A missing or corrupt file gives an empty cache.
+
+    Parameters:
+    file_path (str, optional): The cache file. Defaults to "game_names.json".
+
+    Returns:
+    dict: A dictionary mapping appids to game names.
+    """
+    try:
+        with open(file_path, 'r', encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_name_cache(names, file_path=DEFAULT_NAME_CACHE_FILE):
+    """
+    This function writes the appid to name cache back to disk atomically.
+
+    Parameters:
+    names (dict): A dictionary mapping appids to game names.
+    file_path (str, optional): The cache file. Defaults to "game_names.json".
+    """
+    tmp_path = f'{file_path}.tmp'
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        json.dump(names, f, ensure_ascii=False)
+    os.replace(tmp_path, file_path)
+
+async def resolve_game_names(appids, installed_games=None, cache_file=None):
+    """
+    This function resolves the names of the given appids with as few network calls as possible.
+    Names are taken from the appmanifest data first, then from the persistent name cache, and only the
+    remaining misses are requested from the Steam store in batches of name_batch_size, appids that failed
+    on an earlier run first, then the most recently updated games. Resolved names are written back to the
+    cache.
+
+    Parameters:
+    appids (list): The appids to resolve.
+    installed_games (list, optional): Installed games as returned by get_installed_games.
+    cache_file (str, optional): The name cache file. Defaults to the name_cache_file environment variable or "game_names.json".
+
+    Returns:
+    list: The game names in the same order as appids, with None for names that could not be resolved.
+    """
+    cache_file = cache_file or os.environ.get("name_cache_file") or DEFAULT_NAME_CACHE_FILE
+    batch_size = int(os.environ.get("name_batch_size") or 50)
+
+    cache = load_name_cache(cache_file)
+    known = dict(cache)
+    for game in installed_games or []:
+        if game.get('name'):
+            known[str(game['appid'])] = game['name']
+
+    unique_appids = dict.fromkeys(str(appid) for appid in appids)
+    misses = [appid for appid in unique_appids if appid not in known]
+    metrics.record_cache('game_names', len(unique_appids) - len(misses), len(misses))
+    if misses:
+        queue = RetryQueue.from_env()
+        misses = prioritize(misses, last_updated_of(installed_games or []), queue.pending('game_names'))
+        async with http_session():
+            for start in range(0, len(misses), batch_size):
+                batch = misses[start:start + batch_size]
+                names = await asyncio.gather(*[fetch_game_name(appid, queue) for appid in batch])
+                for appid, name in zip(batch, names):
+                    if name is not None:
+                        known[appid] = name
+        queue.save()
+
+    if known != cache:
+        save_name_cache(known, cache_file)
+    return [known.get(str(appid)) for appid in appids]
 
-def dump_to_txt(appids, names, filename="output.txt"):
+def dump_to_txt(appids, names, filename="output.txt", backup_dir=None):
     """
     This function takes a list of appids, a list of game names, and an optional filename as input.
     It opens a file in write mode with the specified filename and encoding.
@@ -42,15 +152,18 @@ def dump_to_txt(appids, names, filename="output.txt"):
     appids (list): A list of appids to dump.
     names (list): A list of game names corresponding to the input appids.
     filename (str, optional): The name of the file to write the output to. Defaults to "output.txt".
+    backup_dir (str, optional): The directory to write the file to. Defaults to the backup_dir environment variable.
     """
-    with open(f'{os.environ.get("backup_dir")}/{filename}', 'w', encoding="utf-8") as f:
+    backup_dir = backup_dir or os.environ.get("backup_dir")
+    with open(f'{backup_dir}/{filename}', 'w', encoding="utf-8") as f:
         for appid, name in zip(appids, names):
             print(f"Dumping {appid}={name}")
-            f.write(f"{appid}={name},\n")
+            f.write(f"{appid}={name or ''},\n")
 
 def main():
-    appids = read_appids_from_file("steam_paths_final.json")
-    names = asyncio.run(request_steam(appids))
+    appids = list(dict.fromkeys(record.appid for record in iter_save_paths(records_file(FINAL_PATHS_NAME))))
+    installed_games = get_installed_games(get_steam_library_folders(get_steam_path()))
+    names = asyncio.run(resolve_game_names(appids, installed_games))
     dump_to_txt(appids, names)
 
 if __name__ == '__main__':
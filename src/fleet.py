@@ -0,0 +1,245 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from download_paths import lookup_save_paths
+from metrics import metrics, write_atomic
+from pipeline import STAGES, PipelineRun, load_settings
+from request_scheduler import last_updated_of
+
+load_dotenv()
+
+DEFAULT_HOSTS_FILE = 'hosts.json'
+DEFAULT_FLEET_DIR = 'fleet'
+DEFAULT_FLEET_REPORT = 'fleet_report.json'
+HOST_FILE_SETTINGS = ('manifest_index_file',)
+
+
+def read_host_profiles(file_path):
+    """
+    This function reads the host profiles of a fleet from a JSON file holding a list of objects.
+    Every profile has a unique name, an optional path_map from the host's drives to where they are mounted
+    here, and any settings from the .env file, e.g. custom_steam_path, steam_user_id and backup_dir, plus
+    the host's own environment variables such as USERPROFILE or APPDATA for the save paths.
+
+    Parameters:
+    file_path (str): The path to the JSON file.
+
+    Returns:
+    list: The host profiles.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        profiles = json.load(file)
+    names = [profile.get('name') for profile in profiles]
+    if not all(names) or len(set(names)) != len(names):
+        raise ValueError(f"Every host profile in {file_path} needs a unique name")
+    return profiles
+
+def host_environ(profile):
+    """
+    This function builds the settings of a host: the environment of this process with the settings and
+    environment variables of the host profile on top. The environment itself is left untouched.
+    Files every host keeps for itself, like the manifest index, are named relative to the host's working
+    directory, see host_workdir, even if the environment gives an absolute path shared by all hosts, unless
+    the profile names its own.
+
+    Parameters:
+    profile (dict): The host profile.
+
+    Returns:
+    dict: The settings of the host.
+    """
+    environ = dict(os.environ)
+    environ.update({key: str(value) for key, value in profile.items() if key not in ('name', 'path_map')})
+    for key in HOST_FILE_SETTINGS:
+        if key not in profile and environ.get(key):
+            environ[key] = os.path.basename(environ[key])
+    return environ
+
+def host_settings(profile):
+    """
+    This function builds the pipeline settings of a host from its profile and its path_map.
+    The settings are passed to PipelineRun as they are, so the host's paths, user ids, backup settings
+    and records_format apply to its run only.
+
+    Parameters:
+    profile (dict): The host profile.
+
+    Returns:
+    dict: The settings, as returned by load_settings, with the path_map added.
+    """
+    settings = load_settings(host_environ(profile))
+    settings['path_map'] = profile.get('path_map') or {}
+    return settings
+
+@contextlib.contextmanager
+def host_workdir(profile, fleet_dir):
+    """
+    This function makes fleet_dir/<name> the working directory for the duration of the block, so the files
+    a run writes next to it (manifest index, name cache, steam_paths.json) are kept per host. The previous
+    working directory is restored afterwards, as pool processes run one host after another.
+
+    Parameters:
+    profile (dict): The host profile.
+    fleet_dir (str): The folder holding a working directory per host.
+    """
+    previous_cwd = os.getcwd()
+    workdir = os.path.join(os.path.abspath(fleet_dir), profile['name'])
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        os.chdir(workdir)
+        yield
+    finally:
+        os.chdir(previous_cwd)
+
+def discover_host(profile, fleet_dir):
+    """
+    This function finds the installed games of one host. It runs on a pool process.
+
+    Parameters:
+    profile (dict): The host profile.
+    fleet_dir (str): The folder holding a working directory per host.
+
+    Returns:
+    dict: The host name and its installed games, or the error that stopped the discovery.
+    """
+    start = time.perf_counter()
+    try:
+        with host_workdir(profile, fleet_dir):
+            run = PipelineRun(host_settings(profile))
+            games = run.get_installed_games()
+        return {'name': profile['name'], 'games': games, 'seconds': time.perf_counter() - start}
+    except Exception:
+        return {'name': profile['name'], 'error': traceback.format_exc(), 'seconds': time.perf_counter() - start}
+
+def run_host(profile, fleet_dir, games, known_paths, stages):
+    """
+    This function runs the pipeline stages for one host, with the installed games found by discover_host
+    and the save paths the coordinator looked up for the whole fleet. It runs on a pool process.
+
+    Parameters:
+    profile (dict): The host profile.
+    fleet_dir (str): The folder holding a working directory per host.
+    games (list): The installed games of the host.
+    known_paths (dict): A dictionary mapping the appids of the host to their raw save paths.
+    stages (list): The names of the stages to run.
+
+    Returns:
+    dict: The outcome and duration of every stage, the number of save paths, the backup totals and the
+    metrics of the host, or the error that stopped the run.
+    """
+    metrics.reset()
+    try:
+        with host_workdir(profile, fleet_dir):
+            run = PipelineRun(host_settings(profile), known_paths=known_paths)
+            run.installed_games = games
+            outcomes = run.run(stages)
+            backups = {}
+            for summary in run.backup_summaries.values():
+                for key, value in summary.items():
+                    backups[key] = backups.get(key, 0) + value
+        return {
+            'name': profile['name'],
+            'outcomes': outcomes,
+            'timings': run.timings,
+            'save_paths': len(run.save_paths or ()),
+            'existing_paths': len(run.final_paths or ()),
+            'backup': backups,
+            'metrics': metrics.report(),
+        }
+    except Exception:
+        return {'name': profile['name'], 'error': traceback.format_exc(), 'metrics': metrics.report()}
+
+def run_fleet(profiles, stages=None, fleet_dir=None, workers=None, report_file=None):
+    """
+    This function backs up every host of a fleet from this machine.
+    First the installed games of all hosts are discovered concurrently on a process pool. Then the save
+    paths of every distinct game are looked up once for the whole fleet, as most hosts own the same games,
+    and finally scanning and backup run for all hosts concurrently on the same pool. A host that fails is
+    reported and does not stop the others. Progress is logged as hosts finish and everything ends up in
+    one report.
+
+    Parameters:
+    profiles (list): The host profiles, as returned by read_host_profiles.
+    stages (list, optional): The names of the stages to run. Defaults to all stages.
+    fleet_dir (str, optional): The folder holding a working directory per host. Defaults to the fleet_dir environment variable or "fleet".
+    workers (int, optional): The number of processes. Defaults to the fleet_workers environment variable, or one per host up to the number of CPUs.
+    report_file (str, optional): The JSON report. Defaults to the fleet_report environment variable or "fleet_report.json".
+
+    Returns:
+    dict: The report, with the shared lookups and the result of every host.
+    """
+    stages = STAGES if stages is None else stages
+    fleet_dir = fleet_dir or os.environ.get("fleet_dir") or DEFAULT_FLEET_DIR
+    workers = workers or int(os.environ.get("fleet_workers") or 0) or min(len(profiles), os.cpu_count() or 1)
+    report_file = report_file or os.environ.get("fleet_report") or DEFAULT_FLEET_REPORT
+    report = {'started_at': time.time(), 'stages': list(stages), 'hosts': {}, 'lookups': {}}
+    by_name = {profile['name']: profile for profile in profiles}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        discovered = {}
+        futures = [pool.submit(discover_host, profile, fleet_dir) for profile in profiles]
+        for future in as_completed(futures):
+            result = future.result()
+            if 'error' in result:
+                report['hosts'][result['name']] = {'status': 'failed', 'stage': 'discovery', 'error': result['error']}
+                logging.error(f"{result['name']}: discovery failed\n{result['error']}")
+            else:
+                discovered[result['name']] = result['games']
+                logging.info(f"{result['name']}: {len(result['games'])} installed games found in {result['seconds']:.2f}s")
+
+        known_paths = {}
+        if 'download_paths' in stages and discovered:
+            installed = [game for games in discovered.values() for game in games]
+            appids = [game['appid'] for game in installed]
+            start = time.perf_counter()
+            known_paths = asyncio.run(lookup_save_paths(appids, last_updated_of(installed)))
+            report['lookups'] = {
+                'installed': len(appids),
+                'distinct': len(known_paths),
+                'with_save_paths': sum(1 for paths in known_paths.values() if paths),
+                'seconds': time.perf_counter() - start,
+            }
+            logging.info(f"Looked up {len(known_paths)} distinct games for {len(appids)} installs on {len(discovered)} hosts")
+
+        futures = []
+        for name, games in discovered.items():
+            host_paths = {str(game['appid']): known_paths.get(str(game['appid'])) for game in games
+                          if str(game['appid']) in known_paths}
+            futures.append(pool.submit(run_host, by_name[name], fleet_dir, games, host_paths, stages))
+        for finished, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            name = result.pop('name')
+            if 'error' in result:
+                result['status'] = 'failed'
+                logging.error(f"[{finished}/{len(futures)}] {name}: failed\n{result['error']}")
+            else:
+                result['status'] = 'ok' if all(result['outcomes'].values()) else 'partial'
+                logging.info(f"[{finished}/{len(futures)}] {name}: {result['status']}, "
+                             f"{result['existing_paths']} save paths, {result['backup'].get('copied', 0)} files copied")
+            report['hosts'][name] = result
+
+    report['finished_at'] = time.time()
+    statuses = [host['status'] for host in report['hosts'].values()]
+    report['summary'] = {status: statuses.count(status) for status in ('ok', 'partial', 'failed')}
+    write_atomic(report_file, json.dumps(report, indent=4))
+    logging.info(f"Fleet finished: {report['summary']}, report written to {report_file}")
+    return report
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    hosts_file = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("fleet_hosts") or DEFAULT_HOSTS_FILE
+    report = run_fleet(read_host_profiles(hosts_file))
+    sys.exit(1 if report['summary']['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,17 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+from manifest_index import ManifestIndex
+from vdf import extract_keys, parse
+
+MANIFEST_KEYS = ('appid', 'name', 'installdir', 'LastUpdated')
 
 
 def get_steam_library_folders(steam_path):
     """
     This function reads the 'libraryfolders.vdf' file from the Steam installation directory to extract the paths of all Steam library folders.
+    Both the current format, where every library is a block with a "path" key, and the old format, where
+    numbered keys hold the paths directly, are understood.
 
     Parameters:
     steam_path (str): The path to the Steam installation directory.
@@ -12,47 +20,76 @@ def get_steam_library_folders(steam_path):
     list: A list of paths to all Steam library folders.
     """
     library_folders_path = os.path.join(steam_path, 'steamapps', 'libraryfolders.vdf')
-    with open(library_folders_path, 'r') as file:
-        data = file.read()
+    with open(library_folders_path, 'r', encoding='utf-8') as file:
+        data = parse(file.read())
 
     # Extract library paths from the VDF file
     library_paths = []
-    for line in data.splitlines():
-        if 'path' in line:
-            path = line.split('"')[3]
-            library_paths.append(path)
+    for folders in data.values():
+        if not isinstance(folders, dict):
+            continue
+        for key, folder in folders.items():
+            if isinstance(folder, dict) and 'path' in folder:
+                library_paths.append(folder['path'])
+            elif isinstance(folder, str) and key.isdigit():
+                library_paths.append(folder)
 
     return library_paths
 
-def get_installed_games(library_paths):
+def read_app_manifest(appmanifest_path):
     """
-    This function goes through each Steam library path to find all installed games. It does this by looking for files that start with 'appmanifest_' and end with '.acf' in the 'steamapps' directory within each library path. These files contain information about the games, so the function reads them to extract the game's name, Steam ID, and installation directory. It stores this information in a list and returns it at the end.
-    
+    This function reads the appid, name, installation directory and LastUpdated timestamp from an
+    'appmanifest_*.acf' file. Parsing stops as soon as all four keys are found.
+
+    Parameters:
+    appmanifest_path (str): The path to the ACF file.
+
+    Returns:
+    dict: The game's information, empty if the file has none of the keys.
+    """
+    with open(appmanifest_path, 'r', encoding='utf-8', errors='replace') as file:
+        return extract_keys(file.read(), MANIFEST_KEYS)
+
+def find_app_manifests(library_paths):
+    """
+    This function lists the 'appmanifest_*.acf' files in the 'steamapps' directory of every library.
+
     Parameters:
     library_paths (list): A list of paths to the Steam library folders.
-    
+
     Returns:
-    list: A list of dictionaries, each containing information about an installed game.
+    list: The paths of the ACF files.
     """
-    games = []
+    manifests = []
     for path in library_paths:
         steamapps_path = os.path.join(path, 'steamapps')
         for file_name in os.listdir(steamapps_path):
             if file_name.startswith('appmanifest_') and file_name.endswith('.acf'):
-                appmanifest_path = os.path.join(steamapps_path, file_name)
-                with open(appmanifest_path, 'r') as file:
-                    data = file.read()
-
-                # Extract game name and Steam ID from the ACF file
-                game_info = {}
-                for line in data.splitlines():
-                    if 'appid' in line:
-                        game_info['appid'] = line.split('"')[3]
-                    if 'name' in line:
-                        game_info['name'] = line.split('"')[3]
-                    if 'installdir' in line:
-                        game_info['installdir'] = line.split('"')[3]
-                if game_info:
-                    games.append(game_info)
-
-    return games
\ No newline at end of file
+                manifests.append(os.path.join(steamapps_path, file_name))
+    return manifests
+
+def get_installed_games(library_paths, index=None):
+    """
+    This function goes through each Steam library path to find all installed games. It does this by looking for files that start with 'appmanifest_' and end with '.acf' in the 'steamapps' directory within each library path. These files contain information about the games, so the function reads them to extract the game's name, Steam ID, and installation directory. It stores this information in a list and returns it at the end.
+    The manifests are read concurrently on manifest_workers threads. With an index, only manifests that
+    changed since the last run are read and index.changes tells which games were added, updated or removed.
+    Set manifest_index=0 in the environment to always read every manifest.
+
+    Parameters:
+    library_paths (list): A list of paths to the Steam library folders.
+    index (ManifestIndex, optional): The index to use. Defaults to the one named by manifest_index_file.
+
+    Returns:
+    list: A list of dictionaries, each containing information about an installed game.
+    """
+    workers = int(os.environ.get("manifest_workers") or 8)
+    if index is None and os.environ.get("manifest_index", "1") != "0":
+        index = ManifestIndex.from_env()
+    if index is not None:
+        games = index.refresh(library_paths, read_app_manifest, workers)
+        index.save()
+        return games
+
+    manifests = find_app_manifests(library_paths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [game_info for game_info in pool.map(read_app_manifest, manifests) if game_info]
@@ -1,5 +1,15 @@
-import json, os, platform
+import asyncio, contextlib, hashlib, os, platform, time
+from urllib.parse import urlsplit
 import httpx
+from metrics import metrics
+from records import read_save_paths
+from request_scheduler import get_limiter, parse_retry_after
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_loop = None
+_semaphore = None
 
 
 def check_system_architecture():
@@ -28,6 +38,7 @@ def expand_environment_variables(path):
 def read_paths_from_file(file_path):
     """
     This function reads the paths from a JSON file.
+    The file is parsed once per process by read_save_paths, whatever reader asks for it first.
 
     Parameters:
     file_path (str): The path to the JSON file containing the paths.
@@ -35,15 +46,12 @@ def read_paths_from_file(file_path):
     Returns:
     list: A list of paths extracted from the JSON file.
     """
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-        paths = [d['path'] for d in data]
-
-    return paths
+    return list(read_save_paths(file_path).paths)
 
 def read_appids_from_file(file_path):
     """
     This function reads the appids from a JSON file and returns them as a list.
+    The file is parsed once per process by read_save_paths, whatever reader asks for it first.
 
     Parameters:
     file_path (str): The path to the JSON file containing the appids.
@@ -51,11 +59,7 @@ def read_appids_from_file(file_path):
     Returns:
     list: A list of appids extracted from the JSON file.
     """
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-        appids = [d['appid'] for d in data]
-
-    return appids
+    return list(read_save_paths(file_path).appids)
 
 def read_appids_paths_from_file(file_path):
     """
@@ -67,10 +71,7 @@ def read_appids_paths_from_file(file_path):
     Returns:
     dict: A dictionary where the keys are the expanded paths and the values are the corresponding appids.
     """
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-        appid_paths = {expand_environment_variables(d['path']): d['appid'] for d in data}
-    return appid_paths
+    return {expand_environment_variables(record.path): record.appid for record in read_save_paths(file_path)}
 
 def remove_extension_and_filename(path):
     """
@@ -109,52 +110,362 @@ def get_correct_path(path):
     else:
         return path
     
-def get_steam_path():
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    This function computes the SHA-256 digest of a file, reading it in chunks so large files are never loaded whole.
+
+    Parameters:
+    path (str): The file to hash.
+    chunk_size (int, optional): The number of bytes read at a time.
+
+    Returns:
+    str: The hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def scan_save_files(save_path):
+    """
+    This function lists the files below a save path with one os.scandir walk.
+    The stat results come from the directory entries, so on Windows no extra call is needed per file.
+
+    Parameters:
+    save_path (str): A save folder, or a single save file.
+
+    Returns:
+    dict: A dictionary mapping each file's path relative to save_path (with '/' separators) to a (size, mtime_ns, full path) tuple.
+    """
+    files = {}
+    if os.path.isfile(save_path):
+        stat = os.stat(save_path)
+        files[os.path.basename(save_path)] = (stat.st_size, stat.st_mtime_ns, save_path)
+        return files
+
+    stack = [('', save_path)]
+    while stack:
+        rel_dir, directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                rel_path = f'{rel_dir}{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((f'{rel_path}/', entry.path))
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[rel_path] = (stat.st_size, stat.st_mtime_ns, entry.path)
+    return files
+
+def root_label(save_path):
+    """
+    This function turns a save path into a folder name that stays the same between runs,
+    e.g. C:\\Users\\me\\Saved Games\\Game becomes C_Users_me_Saved Games_Game_<hash>.
+    The hash of the whole path keeps paths apart that read the same once their separators are replaced,
+    like C:\\a_b and C:\\a\\b.
+
+    Parameters:
+    save_path (str): A save folder, or a single save file.
+
+    Returns:
+    str: The folder name.
+    """
+    path = os.path.normpath(save_path)
+    label = path.replace(':', '').replace('\\', '_').replace('/', '_').strip('_')
+    digest = hashlib.sha256(path.encode('utf-8', 'surrogateescape')).hexdigest()[:8]
+    return f'{label}_{digest}' if label else digest
+
+def scan_game_files(save_paths):
+    """
+    This function lists the files below all save paths of a game.
+    Save paths inside another save path of the game are skipped, their files are already listed with it.
+    With one save path the keys are the paths relative to it, like scan_save_files. With several, every key
+    starts with the root_label of its save path, so equally named files of different users or folders do not
+    overwrite each other. A save path that cannot be read raises OSError instead of being left out, so a
+    drive that is briefly unavailable fails the game's backup rather than recording its files as deleted.
+
+    Parameters:
+    save_paths (list): A collection of save paths.
+
+    Returns:
+    dict: A dictionary mapping each file's key to a (save path, relative path, size, mtime_ns, full path) tuple.
+    """
+    normalized = {save_path: os.path.normcase(os.path.normpath(save_path)) for save_path in save_paths}
+    roots = []
+    for save_path, path in normalized.items():
+        inside = any(
+            other != save_path and (path == parent and other in roots or path.startswith(parent.rstrip(os.sep) + os.sep))
+            for other, parent in normalized.items()
+        )
+        if not inside:
+            roots.append(save_path)
+
+    files = {}
+    for save_path in roots:
+        scanned = scan_save_files(save_path)
+        prefix = f'{root_label(save_path)}/' if len(roots) > 1 else ''
+        for rel_path, (size, mtime_ns, full_path) in scanned.items():
+            files[f'{prefix}{rel_path}'] = (save_path, rel_path, size, mtime_ns, full_path)
+    return files
+
+def root_kinds(files):
+    """
+    This function tells for every save path of a game whether it is a single save file or a save folder,
+    so a restore knows whether to put a file at the save path itself or inside it.
+    scan_save_files lists a single save file under its own path, which tells the two apart.
+
+    Parameters:
+    files (dict): The files of a game, as returned by scan_game_files.
+
+    Returns:
+    dict: A dictionary mapping each save path with files to 'file' or 'dir'.
+    """
+    return {save_path: 'file' if full_path == save_path else 'dir'
+            for save_path, _, _, _, full_path in files.values()}
+
+def map_host_path(path, path_map):
+    """
+    This function rewrites a path of another machine to where its drive is mounted on this one,
+    e.g. D:\\SteamLibrary with {"D:\\": "/mnt/pc01/d"} becomes /mnt/pc01/d/SteamLibrary.
+    Prefixes are compared ignoring case and the kind of slashes, like Windows does.
+
+    Parameters:
+    path (str): The path as the other machine sees it.
+    path_map (dict): A dictionary mapping path prefixes of the other machine to local folders.
+
+    Returns:
+    str: The local path, or the path unchanged if no prefix matches.
+    """
+    unified = path.replace('/', '\\')
+    for prefix, target in (path_map or {}).items():
+        unified_prefix = prefix.replace('/', '\\')
+        if unified.lower().startswith(unified_prefix.lower()):
+            rest = unified[len(unified_prefix):].split('\\')
+            return os.path.join(target, *[part for part in rest if part])
+    return path
+
+def localize_path(path, path_map):
+    """
+    This function turns a save path of another machine into a path on this one: its drive is rewritten
+    with map_host_path and the Windows separators left by the save path templates, e.g. in
+    /mnt/pc01/c/Users/player\\Documents, are turned into the separators of this system.
+
+    Parameters:
+    path (str): The expanded save path as the other machine sees it.
+    path_map (dict): A dictionary mapping path prefixes of the other machine to local folders.
+
+    Returns:
+    str: The local path.
+    """
+    path = map_host_path(path, path_map)
+    if os.sep != '\\':
+        path = os.path.normpath(path.replace('\\', os.sep))
+    return path
+
+def get_steam_path(environ=None):
     """
     Determine the Steam installation path based on the system architecture and custom settings.
 
+    Parameters:
+    environ (dict, optional): The settings to read. Defaults to the environment.
+
     Returns:
     str: The path to the Steam installation directory.
     """
+    environ = os.environ if environ is None else environ
     plat = check_system_architecture()
-    custom_steam_path = os.environ.get("custom_steam_path")
+    custom_steam_path = environ.get("custom_steam_path")
     
     if custom_steam_path == "":
         if plat == "64bit":
-            steam_path = os.environ.get("steam_path64")
+            steam_path = environ.get("steam_path64")
         else:
-            steam_path = os.environ.get("steam_path32")
+            steam_path = environ.get("steam_path32")
     else:
         steam_path = custom_steam_path
 
     return steam_path
 
-def get_ubisoft_path():
+def get_ubisoft_path(environ=None):
     """
     Determine the Ubisoft Connect installation path based on the system architecture and custom settings.
 
+    Parameters:
+    environ (dict, optional): The settings to read. Defaults to the environment.
+
     Returns:
     str: The path to the Ubisoft Connect installation directory.
     """
+    environ = os.environ if environ is None else environ
     plat = check_system_architecture()
-    custom_ubisoft_path = os.environ.get("custom_ubisoft_path")
+    custom_ubisoft_path = environ.get("custom_ubisoft_path")
     
     if custom_ubisoft_path == "":
         if plat == "64bit":
-            ubisoft_path = os.environ.get("ubisoft_connect_path64")
+            ubisoft_path = environ.get("ubisoft_connect_path64")
         else:
-            ubisoft_path = os.environ.get("ubisoft_connect_path32")
+            ubisoft_path = environ.get("ubisoft_connect_path32")
     else:
         ubisoft_path = custom_ubisoft_path
 
     return ubisoft_path
 
-async def get_request(url):
+def pcgamingwiki_url(appid):
+    """
+    This function returns the PCGamingWiki page URL of an appid. The base URL can be changed with the
+    pcgamingwiki_api_url environment variable, e.g. to point the benchmarks at a local server.
+
+    Parameters:
+    appid (str): The appid of the game.
+
+    Returns:
+    str: The URL of the page.
+    """
+    base_url = os.environ.get("pcgamingwiki_api_url") or "https://pcgamingwiki.com/api/appid.php"
+    return f"{base_url}?appid={appid}"
+
+def steam_appdetails_url(appid):
+    """
+    This function returns the Steam store appdetails URL of an appid. The base URL can be changed with the
+    steam_appdetails_url environment variable.
+
+    Parameters:
+    appid (str): The appid of the game.
+
+    Returns:
+    str: The URL of the app details.
+    """
+    base_url = os.environ.get("steam_appdetails_url") or "https://store.steampowered.com/api/appdetails/"
+    return f"{base_url}?appids={appid}&filters=basic"
+
+def http2_available():
+    """
+    This function checks whether HTTP/2 was requested in the environment and the optional h2 package is installed.
+
+    Returns:
+    bool: True if the shared client should speak HTTP/2.
+    """
+    if os.environ.get("http_http2", "").lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def get_client():
+    """
+    This function returns the shared httpx client of the running event loop, creating it on first use.
+    All requests of a pipeline run go through this client so connections are pooled and kept alive
+    instead of paying a new TCP and TLS handshake for every URL. The number of requests in flight is
+    bounded by the http_max_in_flight environment variable.
+
+    Returns:
+    httpx.AsyncClient: The shared client.
+    """
+    global _client, _client_loop, _semaphore
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        max_in_flight = int(os.environ.get("http_max_in_flight") or 16)
+        _client = httpx.AsyncClient(
+            http2=http2_available(),
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+            timeout=httpx.Timeout(float(os.environ.get("http_timeout") or 15)),
+            follow_redirects=True,
+        )
+        _client_loop = loop
+        _semaphore = asyncio.Semaphore(max_in_flight)
+    return _client
+
+async def close_client():
+    """
+    This function closes the shared httpx client, if one is open.
+    """
+    global _client, _client_loop, _semaphore
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+    _semaphore = None
+
+@contextlib.asynccontextmanager
+async def http_session():
+    """
+    This function opens the shared httpx client for the duration of a pipeline run and closes it afterwards.
+
+    Yields:
+    httpx.AsyncClient: The shared client.
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, follow_redirects=True)
-            response.raise_for_status()
-    except httpx.RequestError as e:
-        print(f"Error fetching data for {url}: {e} {response.status_code} {response.reason_phrase}")
-        return None
-    return response
\ No newline at end of file
+        yield get_client()
+    finally:
+        await close_client()
+
+async def get_request(url, headers=None):
+    """
+    This function sends a GET request through the shared client.
+    Requests to a host are paced by its adaptive rate limiter. A throttled response, 429 or 503 with
+    Retry-After, slows the host down, waits as long as the server asked and is retried up to
+    http_throttle_retries times without using up the normal retries. Connection errors and other
+    retryable status codes (5xx) are retried up to http_retries times with exponential backoff starting
+    at http_backoff seconds. The concurrency slot is released while waiting so a backing-off request does
+    not hold up the others. The latency and status of every attempt and every retry are recorded per host
+    in the run metrics.
+
+    Parameters:
+    url (str): The URL to request.
+    headers (dict, optional): Extra request headers.
+
+    Returns:
+    httpx.Response: The response, or None if the request failed.
+    """
+    client = get_client()
+    retries = int(os.environ.get("http_retries") or 3)
+    throttle_retries = int(os.environ.get("http_throttle_retries") or 10)
+    backoff = float(os.environ.get("http_backoff") or 0.5)
+
+    host = urlsplit(url).hostname
+    limiter = get_limiter(host)
+    attempt = 0
+    throttled = 0
+
+    while True:
+        try:
+            sent_at = await limiter.acquire()
+            async with _semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url, headers=headers)
+                finally:
+                    metrics.observe('http_request_duration_seconds', time.perf_counter() - start, host=host)
+            metrics.increment('http_responses_total', host=host, status=response.status_code)
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if response.status_code == 429 or (response.status_code == 503 and retry_after is not None):
+                limiter.throttled(retry_after, sent_at)
+                if throttled < throttle_retries:
+                    throttled += 1
+                    metrics.increment('http_retries_total', host=host)
+                    continue
+            elif response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                metrics.increment('http_retries_total', host=host)
+                await asyncio.sleep(backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            if response.status_code != 304:
+                response.raise_for_status()
+            limiter.succeeded()
+            return response
+        except httpx.HTTPStatusError as e:
+            metrics.increment('http_failures_total', host=host)
+            print(f"Error fetching data for {url}: {e.response.status_code} {e.response.reason_phrase}")
+            return None
+        except httpx.RequestError as e:
+            metrics.increment('http_errors_total', host=host, error=type(e).__name__)
+            if attempt < retries:
+                metrics.increment('http_retries_total', host=host)
+                await asyncio.sleep(backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            metrics.increment('http_failures_total', host=host)
+            print(f"Error fetching data for {url}: {e!r}")
+            return None
@@ -0,0 +1,109 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+DEFAULT_INDEX_FILE = 'manifest_index.json'
+INDEX_VERSION = 2
+
+
+class ManifestIndex:
+    """
+    A persistent index of parsed appmanifest files keyed by path and validated by (size, mtime_ns).
+
+    Manifests whose size and modification time did not change since the last run are served from the index
+    without being opened, so discovering the installed games costs one directory listing per library.
+    After a refresh, changes holds the appids that were added, updated or removed since the last run.
+    """
+
+    def __init__(self, file_path=DEFAULT_INDEX_FILE):
+        self.file_path = file_path
+        self.entries = {}
+        self.changes = {'added': [], 'updated': [], 'removed': []}
+        self._dirty = False
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        This function builds an index from the manifest_index_file environment variable and loads it from disk.
+
+        Parameters:
+        environ (dict, optional): The settings to read, e.g. those of a fleet host. Defaults to the environment.
+
+        Returns:
+        ManifestIndex: The loaded index.
+        """
+        environ = os.environ if environ is None else environ
+        index = cls(environ.get('manifest_index_file') or DEFAULT_INDEX_FILE)
+        index.load()
+        return index
+
+    def load(self):
+        """
+        This function reads the index file if it exists. A missing or corrupt file, or one written by an
+        older version that read fewer manifest keys, leaves the index empty.
+        """
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            data = {}
+        self.entries = data.get('entries', {}) if isinstance(data, dict) and data.get('version') == INDEX_VERSION else {}
+
+    def save(self):
+        """
+        This function writes the index back to disk atomically if anything changed.
+        """
+        if not self._dirty:
+            return
+        tmp_path = f'{self.file_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': INDEX_VERSION, 'entries': self.entries}, file)
+        os.replace(tmp_path, self.file_path)
+        self._dirty = False
+
+    def refresh(self, library_paths, read_manifest, workers=8):
+        """
+        This function brings the index up to date with the manifests in the given libraries.
+        Only new and changed manifests are parsed, on a pool of worker threads, and manifests that no longer
+        exist are dropped.
+
+        Parameters:
+        library_paths (list): A list of paths to the Steam library folders.
+        read_manifest (callable): The function parsing one manifest file into a game dictionary.
+        workers (int, optional): The number of threads parsing manifests. Defaults to 8.
+
+        Returns:
+        list: A list of dictionaries, each containing information about an installed game.
+        """
+        seen = {}
+        for library_path in library_paths:
+            steamapps_path = os.path.join(library_path, 'steamapps')
+            with os.scandir(steamapps_path) as entries:
+                for entry in entries:
+                    if entry.name.startswith('appmanifest_') and entry.name.endswith('.acf') and entry.is_file():
+                        stat = entry.stat()
+                        seen[entry.path] = [stat.st_size, stat.st_mtime_ns]
+
+        stale = [path for path, signature in seen.items()
+                 if path not in self.entries or self.entries[path]['signature'] != signature]
+        metrics.record_cache('manifest_index', len(seen) - len(stale), len(stale))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parsed = dict(zip(stale, pool.map(read_manifest, stale)))
+
+        self.changes = {'added': [], 'updated': [], 'removed': []}
+        for path in stale:
+            game = parsed[path]
+            change = 'updated' if path in self.entries else 'added'
+            self.entries[path] = {'signature': seen[path], 'game': game}
+            if game.get('appid'):
+                self.changes[change].append(game['appid'])
+        for path in [path for path in self.entries if path not in seen]:
+            game = self.entries.pop(path)['game']
+            if game.get('appid'):
+                self.changes['removed'].append(game['appid'])
+
+        if stale or self.changes['removed']:
+            self._dirty = True
+        return [self.entries[path]['game'] for path in seen if self.entries[path]['game']]
@@ -0,0 +1,290 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import socket
+import threading
+import time
+import tracemalloc
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROMETHEUS_PREFIX = 'steamgames_'
+
+
+class Metrics:
+    """
+    Collects the counters, gauges and histograms of one run. Every metric is identified by its name and
+    labels, e.g. http_responses_total with host and status. All methods are thread safe, so stages running
+    on thread pools can record into the same instance.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        This function forgets everything recorded so far and restarts the run clock.
+        """
+        with self._lock:
+            self.started_at = time.time()
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        """
+        This function adds value to a counter.
+
+        Parameters:
+        name (str): The name of the counter, ending in _total.
+        value (float, optional): The amount to add. Defaults to 1.
+        **labels: The labels of the counter.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        This function sets a gauge to value.
+
+        Parameters:
+        name (str): The name of the gauge.
+        value (float): The new value.
+        **labels: The labels of the gauge.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        """
+        This function records a value, usually a duration in seconds, in a histogram.
+
+        Parameters:
+        name (str): The name of the histogram.
+        value (float): The observed value.
+        **labels: The labels of the histogram.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def record_cache(self, cache, hits, misses):
+        """
+        This function records how many lookups a cache answered and how many it could not, and its hit ratio.
+
+        Parameters:
+        cache (str): The name of the cache.
+        hits (int): The lookups answered from the cache.
+        misses (int): The lookups that needed the source, including stale entries.
+        """
+        self.increment('cache_hits_total', hits, cache=cache)
+        self.increment('cache_misses_total', misses, cache=cache)
+        if hits + misses:
+            self.set('cache_hit_ratio', hits / (hits + misses), cache=cache)
+
+    def record_backup(self, mode, game_id, summary, seconds):
+        """
+        This function records the backup of one game: how long it took and how many files and bytes it wrote.
+
+        Parameters:
+        mode (str): The backup mode, 'copy', 'snapshot' or 'archive'.
+        game_id (str): The identification number for the game.
+        summary (dict): The summary returned by the backup of the game.
+        seconds (float): The duration of the backup.
+        """
+        self.set('game_backup_seconds', seconds, appid=game_id, mode=mode)
+        for result in ('copied', 'unchanged', 'deleted'):
+            self.increment('backup_files_total', summary[result], mode=mode, result=result)
+        self.increment('backup_bytes_total', summary['bytes'], mode=mode)
+
+    def report(self):
+        """
+        This function returns everything recorded so far as a JSON serializable dictionary.
+
+        Returns:
+        dict: The host, start and end time, and the counters, gauges and histograms of the run.
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            gauges = [{'name': name, 'labels': dict(labels), 'value': value}
+                      for (name, labels), value in sorted(self.gauges.items())]
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram['count'],
+                    'sum': histogram['sum'],
+                    'buckets': dict(zip([str(bound) for bound in self.buckets], histogram['buckets'])),
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        return {
+            'host': socket.gethostname(),
+            'started_at': self.started_at,
+            'finished_at': time.time(),
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+        }
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """
+        This function renders everything recorded so far in the Prometheus text exposition format.
+
+        Parameters:
+        prefix (str, optional): Prepended to every metric name. Defaults to "steamgames_".
+
+        Returns:
+        str: The metrics, one sample per line.
+        """
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+            return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+        lines = []
+        typed = set()
+        with self._lock:
+            for kind, samples in (('counter', self.counters), ('gauge', self.gauges)):
+                for (name, labels), value in sorted(samples.items()):
+                    if name not in typed:
+                        typed.add(name)
+                        lines.append(f'# TYPE {prefix}{name} {kind}')
+                    lines.append(f'{prefix}{name}{labels_text(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {prefix}{name} histogram')
+                for bound, count in zip(self.buckets, histogram['buckets']):
+                    lines.append(f'{prefix}{name}_bucket{labels_text(labels, [("le", str(bound))])} {count}')
+                lines.append(f'{prefix}{name}_bucket{labels_text(labels, [("le", "+Inf")])} {histogram["count"]}')
+                lines.append(f'{prefix}{name}_sum{labels_text(labels)} {histogram["sum"]}')
+                lines.append(f'{prefix}{name}_count{labels_text(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def timed(function, *args):
+    """
+    This function calls function with args and measures how long it took. It is a module level function so
+    it can also run on a process pool, whose workers record into their own copy of the metrics.
+
+    Returns:
+    tuple: The result of the call and its duration in seconds.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def write_atomic(path, text):
+    """
+    This function writes a text file through a temporary file, so readers like the node_exporter textfile
+    collector never see it half written.
+
+    Parameters:
+    path (str): The file to write.
+    text (str): The contents.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+def write_reports(report_file=None, textfile=None):
+    """
+    This function writes the metrics of the run as a JSON report and as a Prometheus textfile.
+
+    Parameters:
+    report_file (str, optional): The JSON report. Defaults to the metrics_report environment variable or "run_report.json", empty to skip it.
+    textfile (str, optional): The Prometheus textfile, e.g. in the node_exporter textfile collector directory. Defaults to the metrics_textfile environment variable, skipped when empty.
+    """
+    report_file = os.environ.get("metrics_report", "run_report.json") if report_file is None else report_file
+    textfile = os.environ.get("metrics_textfile", "") if textfile is None else textfile
+    if report_file:
+        write_atomic(report_file, json.dumps(metrics.report(), indent=4))
+    if textfile:
+        write_atomic(textfile, metrics.to_prometheus())
+
+def profiled_stages():
+    """
+    This function reads which stages should be profiled from the profile_stages environment variable,
+    a comma separated list of stage names or "all".
+
+    Returns:
+    set: The names of the stages to profile.
+    """
+    return {stage.strip() for stage in os.environ.get("profile_stages", "").split(',') if stage.strip()}
+
+@contextlib.contextmanager
+def profile(name, output_dir=None, memory=None):
+    """
+    This function profiles the wrapped block with cProfile and, with memory, traces its allocations with
+    tracemalloc. It writes <name>.prof, which python -m pstats or snakeviz can open, a <name>.txt summary
+    of the slowest functions and, with memory, a <name>.memory.txt listing the biggest allocation sites.
+    cProfile only sees the calling thread, so code running on worker threads shows up as waiting.
+
+    Parameters:
+    name (str): The name of the profiled block, usually the stage.
+    output_dir (str, optional): Where the files are written. Defaults to the profile_dir environment variable or "profiles".
+    memory (bool, optional): Also trace memory. Defaults to the profile_memory environment variable, off unless set to 1.
+    """
+    output_dir = output_dir or os.environ.get("profile_dir") or "profiles"
+    memory = os.environ.get("profile_memory", "0") == "1" if memory is None else memory
+    os.makedirs(output_dir, exist_ok=True)
+
+    profiler = cProfile.Profile()
+    if memory:
+        tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(output_dir, f'{name}.prof'))
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(30)
+        write_atomic(os.path.join(output_dir, f'{name}.txt'), summary.getvalue())
+
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            metrics.set('profile_peak_memory_bytes', peak, stage=name)
+            top = snapshot.statistics('lineno')[:30]
+            write_atomic(
+                os.path.join(output_dir, f'{name}.memory.txt'),
+                f'peak {peak} bytes, {current} bytes still allocated\n' + ''.join(f'{stat}\n' for stat in top),
+            )
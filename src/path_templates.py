@@ -0,0 +1,165 @@
+import functools
+import os
+import re
+
+PLACEHOLDER_PATTERN = re.compile(
+    r'<([A-Za-z][A-Za-z0-9-]*)>|%([A-Za-z_][A-Za-z0-9_()]*)%|\$\{([^{}]+)\}|\$(\w+)|(\{\})')
+USER_PLACEHOLDERS = {'user-id'}
+
+
+class PathTemplate:
+    """
+    A save path parsed once into literal text and typed placeholders.
+
+    Placeholders are PCGamingWiki's <name> placeholders such as <Steam-folder> or <path-to-game>, Windows
+    %VARIABLE% environment variables, $VARIABLE and ${VARIABLE} environment variables as os.path.expandvars
+    expands them, and the user id, written <user-id> on PCGamingWiki and {} in the JSON files between the
+    stages. Everything else, including braces like {GUID} folder names, is literal.
+    """
+
+    __slots__ = ('raw', 'parts', 'has_user')
+
+    def __init__(self, raw):
+        self.raw = raw
+        parts = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(raw):
+            if match.start() > position:
+                parts.append(('literal', raw[position:match.start()]))
+            name, variable, braced, bare, user = match.groups()
+            if user or name in USER_PLACEHOLDERS:
+                parts.append(('user', None))
+            elif name:
+                parts.append(('named', name))
+            elif variable:
+                parts.append(('env', variable))
+            else:
+                parts.append(('dollar', (braced or bare, match.group())))
+            position = match.end()
+        if position < len(raw):
+            parts.append(('literal', raw[position:]))
+        self.parts = tuple(parts)
+        self.has_user = any(kind == 'user' for kind, _ in parts)
+
+    def bind(self, context=None, expand_env=True, environ=None):
+        """
+        This function fills in every placeholder except the user id.
+        Named placeholders missing from the context and unknown environment variables are kept as written.
+
+        Parameters:
+        context (dict, optional): Values of the named placeholders, e.g. {'Steam-folder': steam_path}.
+        expand_env (bool, optional): Expand %VARIABLE%, $VARIABLE and ${VARIABLE} placeholders from the environment. Defaults to True.
+        environ (dict, optional): The environment variables, e.g. those of another host. Defaults to the environment.
+
+        Returns:
+        tuple: The text around the user id placeholders, to be joined with a user id.
+        """
+        context = context or {}
+        segments = []
+        current = []
+        for kind, value in self.parts:
+            if kind == 'literal':
+                current.append(value)
+            elif kind == 'named':
+                current.append(context.get(value, f'<{value}>'))
+            elif kind == 'env':
+                current.append(lookup_environment_variable(value, environ) if expand_env else f'%{value}%')
+            elif kind == 'dollar':
+                name, written = value
+                found = environment_value(name, environ) if expand_env else None
+                current.append(written if found is None else found)
+            else:
+                segments.append(''.join(current))
+                current = []
+        segments.append(''.join(current))
+        return tuple(segments)
+
+    def render(self, context=None, user_id='{}', expand_env=True, environ=None):
+        """
+        This function expands the template for one user id.
+
+        Parameters:
+        context (dict, optional): Values of the named placeholders.
+        user_id (str, optional): The user id. Defaults to '{}', which keeps the placeholder for a later stage.
+        expand_env (bool, optional): Expand %VARIABLE%, $VARIABLE and ${VARIABLE} placeholders from the environment. Defaults to True.
+        environ (dict, optional): The environment variables. Defaults to the environment.
+
+        Returns:
+        str: The expanded path.
+        """
+        return user_id.join(self.bind(context, expand_env, environ))
+
+
+def environment_value(name, environ=None):
+    """
+    This function looks up an environment variable, falling back to its upper case name like Windows,
+    where variable names ignore case.
+
+    Parameters:
+    name (str): The variable name.
+    environ (dict, optional): The environment variables. Defaults to the environment.
+
+    Returns:
+    str: The value, or None if the variable is not set.
+    """
+    environ = os.environ if environ is None else environ
+    value = environ.get(name)
+    if value is None:
+        value = environ.get(name.upper())
+    return value
+
+def lookup_environment_variable(name, environ=None):
+    """
+    This function looks up a Windows style environment variable, ignoring case like Windows does.
+
+    Parameters:
+    name (str): The variable name without the percent signs.
+    environ (dict, optional): The environment variables. Defaults to the environment.
+
+    Returns:
+    str: The value, or '%name%' if the variable is not set.
+    """
+    value = environment_value(name, environ)
+    return value if value is not None else f'%{name}%'
+
+@functools.lru_cache(maxsize=4096)
+def compile_template(raw):
+    """
+    This function parses a save path into a PathTemplate, once per distinct path.
+
+    Parameters:
+    raw (str): The save path.
+
+    Returns:
+    PathTemplate: The compiled template.
+    """
+    return PathTemplate(raw)
+
+def expand_all(paths, user_ids, context=None, environ=None):
+    """
+    This function expands many save paths for many user ids in one call.
+    Every distinct path is bound once, and paths without a user id placeholder expand once instead of once
+    per user.
+
+    Parameters:
+    paths (list): The save paths.
+    user_ids (list): The user ids.
+    context (dict, optional): Values of the named placeholders.
+    environ (dict, optional): The environment variables. Defaults to the environment.
+
+    Returns:
+    list: For every path, a dictionary mapping each user id to its expanded path.
+    """
+    bound = {}
+    expanded = []
+    for path in paths:
+        if path not in bound:
+            template = compile_template(path)
+            segments = template.bind(context, environ=environ)
+            if template.has_user:
+                bound[path] = {user_id: user_id.join(segments) for user_id in user_ids}
+            else:
+                single = segments[0]
+                bound[path] = {user_id: single for user_id in user_ids}
+        expanded.append(bound[path])
+    return expanded
@@ -0,0 +1,107 @@
+import codecs
+from html.parser import HTMLParser
+
+SECTION_ID = 'Save_game_data_location'
+ROW_CLASSES = {'template-infotable-body', 'table-gamedata-body-row'}
+SYSTEM_CLASS = 'table-gamedata-body-system'
+LOCATION_CLASS = 'table-gamedata-body-location'
+FEED_SIZE = 16 * 1024
+
+
+class SaveLocationParser(HTMLParser):
+    """
+    A streaming parser that only looks at the save game data table of a PCGamingWiki page.
+
+    Everything before the "Save_game_data_location" anchor is skipped without building any tree, and
+    everything after the first table following the anchor is ignored, even if more of the page is fed.
+    The (system, location) text of every game data row is collected in rows.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.found_section = False
+        self.done = False
+        self.rows = []
+        self._table_depth = 0
+        self._row = None
+        self._cell = None
+        self._cell_depth = 0
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if not self.found_section:
+            if dict(attrs).get('id') == SECTION_ID:
+                self.found_section = True
+            return
+        if tag == 'table':
+            self._table_depth += 1
+            return
+        if not self._table_depth:
+            return
+        if tag == 'tr' and not self._cell:
+            classes = set((dict(attrs).get('class') or '').split())
+            self._row = {} if ROW_CLASSES <= classes else None
+        elif self._row is not None and tag in ('th', 'td'):
+            if self._cell:
+                self._cell_depth += 1
+                return
+            classes = (dict(attrs).get('class') or '').split()
+            if tag == 'th' and SYSTEM_CLASS in classes:
+                self._cell = 'system'
+            elif tag == 'td' and LOCATION_CLASS in classes:
+                self._cell = 'location'
+            else:
+                return
+            self._cell_depth = 0
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if self.done or not self._table_depth:
+            return
+        if tag == 'table':
+            self._table_depth -= 1
+            if not self._table_depth:
+                self.done = True
+        elif tag in ('th', 'td') and self._cell:
+            if self._cell_depth:
+                self._cell_depth -= 1
+                return
+            self._row.setdefault(self._cell, ''.join(self._text).strip())
+            self._cell = None
+        elif tag == 'tr' and self._row is not None and not self._cell:
+            self.rows.append((self._row.get('system'), self._row.get('location')))
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell and not self.done:
+            self._text.append(data)
+
+
+def extract_save_rows(content):
+    """
+    This function reads the (system, location) rows of the save game data table from a PCGamingWiki page.
+    The page is decoded and fed to the parser in small pieces, and feeding stops once the table has ended,
+    so the rest of the page is never decoded or parsed.
+
+    Parameters:
+    content (bytes): The raw HTML of the page.
+
+    Returns:
+    list: The (system, location) text of every row, where either can be None if the row lacks the cell,
+    or None if the page has no save game data section.
+    """
+    parser = SaveLocationParser()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    view = memoryview(content)
+    for start in range(0, len(view), FEED_SIZE):
+        parser.feed(decoder.decode(view[start:start + FEED_SIZE]))
+        if parser.done:
+            break
+    else:
+        parser.feed(decoder.decode(b'', final=True))
+        parser.close()
+    if not parser.found_section:
+        return None
+    return parser.rows
@@ -0,0 +1,199 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+from backup_paths import backup_games
+from debug_print_scan_paths import debug_print
+from download_paths import collect_save_paths
+from dump_game_names import dump_to_txt, resolve_game_names
+from get_installed_games import get_installed_games, get_steam_library_folders
+from manifest_index import ManifestIndex
+from metrics import metrics, profile, profiled_stages
+from global_funcs import get_steam_path, get_ubisoft_path, map_host_path
+from records import FINAL_PATHS_NAME, SAVE_PATHS_NAME, read_save_paths, records_file, write_save_paths
+from scan_paths import get_user_ids, scan_save_paths
+from stream_pipeline import stream_games
+
+load_dotenv()
+
+STAGES = ['download_paths', 'scan_paths', 'backup_paths', 'dump_game_names']
+STREAM_STAGES = ['download_paths', 'scan_paths', 'backup_paths']
+STAGE_INPUTS = {'scan_paths': 'download_paths', 'backup_paths': 'scan_paths', 'dump_game_names': 'scan_paths'}
+
+
+def load_settings(environ=None):
+    """
+    This function collects the settings the stages need from the environment, or from the settings of
+    another host.
+
+    Parameters:
+    environ (dict, optional): The settings to read. Defaults to the environment.
+
+    Returns:
+    dict: The steam_path, ubisoft_path, path_to_game, user_ids, backup_dir and records_format settings,
+    and environ itself for the backup settings and the %VARIABLE% placeholders of the save paths.
+    """
+    environ = os.environ if environ is None else environ
+    return {
+        'steam_path': get_steam_path(environ),
+        'ubisoft_path': get_ubisoft_path(environ),
+        'path_to_game': environ.get("path_to_game"),
+        'user_ids': get_user_ids(environ),
+        'backup_dir': environ.get("backup_dir"),
+        'records_format': environ.get("records_format"),
+        'environ': environ,
+    }
+
+
+class PipelineRun:
+    """
+    Runs the pipeline stages in one process and hands their results to each other in memory.
+
+    The JSON files the stage scripts exchange are only written when persist_json is set, and only read
+    when a stage runs without the stage that produces its input, e.g. when running backup_paths alone.
+    Save paths already looked up elsewhere, e.g. once for a whole fleet, can be handed in as known_paths.
+    A path_map setting marks the settings of another host: the library folders listed by Steam and the
+    save paths are rewritten to where the host's drives are mounted, see localize_path.
+    With stream set, download_paths, scan_paths and backup_paths run together as one streaming step
+    whenever all three are selected, see stream_pipeline.
+    """
+
+    def __init__(self, settings=None, persist_json=False, debug=False, profile_stages=None, known_paths=None,
+                 stream=None):
+        self.settings = settings or load_settings()
+        self.persist_json = persist_json
+        self.debug = debug
+        environ = self.settings.get('environ', os.environ)
+        self.stream = environ.get("pipeline_stream") == "1" if stream is None else stream
+        self.save_paths_file = records_file(SAVE_PATHS_NAME, self.settings.get('records_format'))
+        self.final_paths_file = records_file(FINAL_PATHS_NAME, self.settings.get('records_format'))
+        self.profile_stages = profiled_stages() if profile_stages is None else set(profile_stages)
+        self.known_paths = known_paths
+        self.installed_games = None
+        self.manifest_changes = None
+        self.save_paths = None
+        self.final_paths = None
+        self.backup_summaries = {}
+        self.timings = {}
+
+    def get_installed_games(self):
+        if self.installed_games is None:
+            library_paths = get_steam_library_folders(self.settings['steam_path'])
+            path_map = self.settings.get('path_map')
+            if path_map:
+                library_paths = [map_host_path(path, path_map) for path in library_paths]
+            environ = self.settings.get('environ', os.environ)
+            index = ManifestIndex.from_env(environ) if environ.get("manifest_index", "1") != "0" else None
+            self.installed_games = get_installed_games(library_paths, index)
+            if index is not None:
+                self.manifest_changes = index.changes
+                logging.info(f"Manifest changes since the last run: {index.changes}")
+        return self.installed_games
+
+    def get_save_paths(self):
+        if self.save_paths is None:
+            self.save_paths = read_save_paths(self.save_paths_file)
+        return self.save_paths
+
+    def get_final_paths(self):
+        if self.final_paths is None:
+            self.final_paths = read_save_paths(self.final_paths_file)
+        return self.final_paths
+
+    def download_paths(self):
+        self.save_paths = asyncio.run(collect_save_paths(
+            self.get_installed_games(),
+            self.settings['steam_path'],
+            self.settings['ubisoft_path'],
+            self.settings['path_to_game'],
+            self.known_paths,
+        ))
+        if self.persist_json:
+            write_save_paths(self.save_paths, self.save_paths_file)
+
+    def scan_paths(self):
+        results, self.final_paths = scan_save_paths(self.settings['user_ids'], self.get_save_paths(),
+                                                    environ=self.settings.get('environ'),
+                                                    path_map=self.settings.get('path_map'))
+        if self.debug:
+            debug_print(results)
+        if self.persist_json:
+            write_save_paths(self.final_paths, self.final_paths_file, indent=4)
+
+    def backup_paths(self):
+        self.backup_summaries = backup_games(self.get_final_paths(), self.settings['backup_dir'],
+                                             environ=self.settings.get('environ'))
+
+    def stream_stages(self):
+        streamed = asyncio.run(stream_games(self.get_installed_games(), self.settings, self.known_paths,
+                                            debug=self.debug))
+        self.save_paths = streamed['save_paths']
+        self.final_paths = streamed['final_paths']
+        self.backup_summaries = streamed['backups']
+        if self.debug:
+            debug_print(streamed['results'])
+        if self.persist_json:
+            write_save_paths(self.save_paths, self.save_paths_file)
+            write_save_paths(self.final_paths, self.final_paths_file, indent=4)
+
+    def dump_game_names(self):
+        appids = self.get_final_paths().unique_appids()
+        names = asyncio.run(resolve_game_names(appids, self.get_installed_games()))
+        dump_to_txt(appids, names, backup_dir=self.settings['backup_dir'])
+
+    def run(self, stages=None):
+        """
+        This function runs the given stages in pipeline order and times each of them.
+        Stages listed in profile_stages, or all of them for "all", run under the cProfile/tracemalloc hook.
+        In stream mode the streamed stages share one step, timed as "stream", and one outcome.
+        A stage whose input stage ran and failed is skipped and counts as failed, instead of reading the
+        JSON file a previous run left behind.
+
+        Parameters:
+        stages (list, optional): The names of the stages to run. Defaults to all stages.
+
+        Returns:
+        dict: A dictionary mapping each stage name to True if it succeeded and False otherwise.
+        """
+        stages = STAGES if stages is None else stages
+        streamed = self.stream and all(stage in stages for stage in STREAM_STAGES)
+        steps = []
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            if streamed and stage in STREAM_STAGES:
+                if stage == STREAM_STAGES[0]:
+                    steps.append(('stream', self.stream_stages, STREAM_STAGES))
+            else:
+                steps.append((stage, getattr(self, stage), [stage]))
+
+        outcomes = {}
+        for name, step, covered in steps:
+            failed_inputs = {STAGE_INPUTS.get(stage) for stage in covered} - set(covered)
+            failed_inputs = sorted(stage for stage in failed_inputs if outcomes.get(stage) is False)
+            if failed_inputs:
+                logging.error(f"Skipping {name} because {', '.join(failed_inputs)} failed")
+                for stage in covered:
+                    outcomes[stage] = False
+                    metrics.set('stage_success', 0, stage=stage)
+                continue
+            profiled = 'all' in self.profile_stages or any(stage in self.profile_stages for stage in covered)
+            start = time.perf_counter()
+            try:
+                with profile(name) if profiled else contextlib.nullcontext():
+                    step()
+                outcome = True
+            except Exception:
+                logging.exception(f"Error executing {name}")
+                outcome = False
+            self.timings[name] = time.perf_counter() - start
+            metrics.set('stage_duration_seconds', self.timings[name], stage=name)
+            for stage in covered:
+                outcomes[stage] = outcome
+                metrics.set('stage_success', int(outcome), stage=stage)
+            logging.info(f"{name} finished in {self.timings[name]:.2f}s")
+        return outcomes
@@ -0,0 +1,168 @@
+import json
+import os
+import sys
+from typing import NamedTuple
+
+SAVE_PATHS_NAME = 'steam_paths'
+FINAL_PATHS_NAME = 'steam_paths_final'
+
+_loaded = {}
+
+
+class SavePath(NamedTuple):
+    """
+    A save location of a game, as passed between the pipeline stages.
+    The path may still contain the '{}' user id placeholder until scan_paths has resolved it.
+    """
+    appid: str
+    path: str
+
+
+class SavePathTable:
+    """
+    A compact collection of save path records, stored as an appid column and a path column.
+
+    Appids are interned, so a game with many save paths keeps one copy of its appid, and SavePath records
+    are only created while iterating. An index from appid to rows is built on first use. The table can be
+    used wherever a list of SavePath records is expected.
+    """
+
+    __slots__ = ('appids', 'paths', '_index')
+
+    def __init__(self, records=()):
+        self.appids = []
+        self.paths = []
+        self._index = None
+        self.extend(records)
+
+    def append(self, appid, path):
+        appid = sys.intern(str(appid))
+        if self._index is not None:
+            self._index.setdefault(appid, []).append(len(self.appids))
+        self.appids.append(appid)
+        self.paths.append(path)
+
+    def extend(self, records):
+        for appid, path in records:
+            self.append(appid, path)
+
+    def __len__(self):
+        return len(self.appids)
+
+    def __iter__(self):
+        return map(SavePath, self.appids, self.paths)
+
+    def __getitem__(self, row):
+        return SavePath(self.appids[row], self.paths[row])
+
+    def _rows(self):
+        if self._index is None:
+            self._index = {}
+            for row, appid in enumerate(self.appids):
+                self._index.setdefault(appid, []).append(row)
+        return self._index
+
+    def paths_of(self, appid):
+        """
+        This function returns the save paths of one game.
+
+        Parameters:
+        appid (str): The appid of the game.
+
+        Returns:
+        list: The save paths of the game, in table order.
+        """
+        return [self.paths[row] for row in self._rows().get(str(appid), [])]
+
+    def unique_appids(self):
+        """
+        This function returns every appid once, in the order the games first appear.
+
+        Returns:
+        list: The appids.
+        """
+        return list(self._rows())
+
+
+def records_file(name, records_format=None):
+    """
+    This function returns the file name the stages exchange records under. It ends in .jsonl when the
+    records format is jsonl, and in .json otherwise.
+
+    Parameters:
+    name (str): The name without extension, e.g. SAVE_PATHS_NAME.
+    records_format (str, optional): 'json' or 'jsonl'. Defaults to the records_format environment variable.
+
+    Returns:
+    str: The file name.
+    """
+    records_format = records_format or os.environ.get("records_format")
+    extension = 'jsonl' if records_format == "jsonl" else 'json'
+    return f'{name}.{extension}'
+
+
+def iter_save_paths(file_path):
+    """
+    This function yields the save path records of a file one at a time. JSON Lines files (.jsonl) are
+    streamed line by line, so only one record is in memory at once. JSON files are parsed as a whole.
+
+    Parameters:
+    file_path (str): The path to the .json or .jsonl file.
+
+    Yields:
+    SavePath: The records, in file order.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        if file_path.endswith('.jsonl'):
+            for line in file:
+                if line.strip():
+                    d = json.loads(line)
+                    yield SavePath(d['appid'], d['path'])
+        else:
+            for d in json.load(file):
+                yield SavePath(d['appid'], d['path'])
+
+
+def read_save_paths(file_path):
+    """
+    This function reads save path records from a file written by download_paths or scan_paths.
+    The loaded table is kept for as long as the file does not change, so every later read in the same
+    process returns it without parsing the file again. Treat the returned table as read-only.
+
+    Parameters:
+    file_path (str): The path to the .json or .jsonl file.
+
+    Returns:
+    SavePathTable: The records.
+    """
+    stat = os.stat(file_path)
+    key = os.path.abspath(file_path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    table = SavePathTable(iter_save_paths(file_path))
+    _loaded[key] = (signature, table)
+    return table
+
+
+def write_save_paths(records, file_path, indent=None):
+    """
+    This function writes save path records to a file in the format the stage scripts read: one JSON array
+    for .json files, or one record per line for .jsonl files.
+
+    Parameters:
+    records (list): A list of SavePath records, or a SavePathTable.
+    file_path (str): The path to the .json or .jsonl file.
+    indent (int, optional): The JSON indentation. Not used for .jsonl files.
+    """
+    _loaded.pop(os.path.abspath(file_path), None)
+    with open(file_path, 'w', encoding='utf-8') as file:
+        if file_path.endswith('.jsonl'):
+            for appid, path in records:
+                file.write(json.dumps({'appid': appid, 'path': path}))
+                file.write('\n')
+        else:
+            json.dump([{'appid': appid, 'path': path} for appid, path in records], file, indent=indent)
+            file.write('\n')
@@ -0,0 +1,297 @@
+import asyncio
+import collections
+import email.utils
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from metrics import metrics, write_atomic
+
+load_dotenv()
+
+DEFAULT_RETRY_QUEUE_FILE = 'retry_queue.json'
+
+_limiters = {}
+_limiters_loop = None
+
+
+class HostRateLimiter:
+    """
+    An adaptive token bucket limiting the requests per second sent to one host.
+
+    A host starts without a limit, so a server that never throttles is only bounded by the number of
+    requests in flight, unless http_rate sets a starting rate. The first throttled response sets the rate
+    to half of what was sent in the last second, every later one halves it again down to min_rate, and
+    each also empties the bucket and, when the server sent Retry-After, pauses the host until then.
+    Responses to requests sent before the last slowdown only count once, so a burst of 429s halves the
+    rate once instead of once per request. Every
+    second of successes raises the rate by about increase, up to max_rate (0 for no limit). So a run quickly settles just
+    below the rate the server accepts instead of failing on it.
+    """
+
+    def __init__(self, host, rate=0.0, min_rate=0.5, max_rate=0.0, increase=4.0):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.slowed_at = float('-inf')
+        self.sent = collections.deque()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, host):
+        """
+        This function builds a limiter from the http_rate, http_min_rate and http_max_rate environment variables.
+
+        Parameters:
+        host (str): The host the limiter is for.
+
+        Returns:
+        HostRateLimiter: The limiter.
+        """
+        return cls(
+            host,
+            rate=float(os.environ.get("http_rate") or 0),
+            min_rate=float(os.environ.get("http_min_rate") or 0.5),
+            max_rate=float(os.environ.get("http_max_rate") or 0),
+        )
+
+    async def acquire(self):
+        """
+        This function waits until a request may be sent to the host. Waiting requests are served in the
+        order they arrived, and always at the current rate, so a slowdown applies to requests already waiting.
+
+        Returns:
+        float: The time the request was let through, to pass on to throttled.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if self.paused_until > now:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                if not self.rate:
+                    break
+                self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+            self.sent.append(now)
+            while self.sent[0] < now - 1:
+                self.sent.popleft()
+            return now
+
+    def succeeded(self):
+        """
+        This function raises the rate after a successful response.
+        """
+        if not self.rate:
+            return
+        self.rate += self.increase / self.rate
+        if self.max_rate:
+            self.rate = min(self.max_rate, self.rate)
+        metrics.set('http_rate_limit', self.rate, host=self.host)
+
+    def throttled(self, retry_after=None, sent_at=None):
+        """
+        This function slows the host down after a throttled response.
+
+        Parameters:
+        retry_after (float, optional): The seconds the server asked to wait.
+        sent_at (float, optional): The time the request was let through, as returned by acquire.
+        """
+        now = time.monotonic()
+        if sent_at is None or sent_at >= self.slowed_at:
+            self.rate = max(self.min_rate, (self.rate or len(self.sent)) / 2)
+            self.slowed_at = now
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = now
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        metrics.set('http_rate_limit', self.rate, host=self.host)
+        metrics.increment('http_throttled_total', host=self.host)
+
+
+def get_limiter(host):
+    """
+    This function returns the rate limiter of a host for the running event loop, creating it on first use.
+
+    Parameters:
+    host (str): The host name.
+
+    Returns:
+    HostRateLimiter: The limiter shared by all requests to the host.
+    """
+    global _limiters, _limiters_loop
+    loop = asyncio.get_running_loop()
+    if _limiters_loop is not loop:
+        _limiters = {}
+        _limiters_loop = loop
+    if host not in _limiters:
+        _limiters[host] = HostRateLimiter.from_env(host)
+    return _limiters[host]
+
+
+def parse_retry_after(value, limit=None):
+    """
+    This function reads a Retry-After header, given either as seconds or as an HTTP date.
+
+    Parameters:
+    value (str): The header value, or None.
+    limit (float, optional): The longest wait accepted. Defaults to the http_max_retry_after environment variable or 120.
+
+    Returns:
+    float: The seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    limit = limit or float(os.environ.get("http_max_retry_after") or 120)
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), limit)
+
+
+class RetryQueue:
+    """
+    A persistent queue of appids whose lookups failed, kept per kind of lookup, e.g. 'pcgamingwiki'.
+
+    Queued appids are looked up first on the next run. An appid is dropped from the queue once a lookup
+    succeeds, or after max_attempts failed runs.
+    """
+
+    def __init__(self, file_path=DEFAULT_RETRY_QUEUE_FILE, max_attempts=10):
+        self.file_path = file_path
+        self.max_attempts = max_attempts
+        self.entries = {}
+        self._dirty = False
+
+    @classmethod
+    def from_env(cls):
+        """
+        This function builds a queue from the retry_queue_file and retry_max_attempts environment variables
+        and loads it from disk.
+
+        Returns:
+        RetryQueue: The loaded queue.
+        """
+        queue = cls(os.environ.get("retry_queue_file") or DEFAULT_RETRY_QUEUE_FILE,
+                    int(os.environ.get("retry_max_attempts") or 10))
+        queue.load()
+        return queue
+
+    def load(self):
+        """
+        This function reads the queue file if it exists. A missing or corrupt file leaves the queue empty.
+        """
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """
+        This function writes the queue back to disk atomically if anything changed.
+        """
+        if not self._dirty:
+            return
+        write_atomic(self.file_path, json.dumps(self.entries))
+        self._dirty = False
+
+    def failed(self, kind, appid):
+        """
+        This function queues an appid whose lookup failed, or drops it after max_attempts failures.
+
+        Parameters:
+        kind (str): The kind of lookup.
+        appid (str): The appid.
+        """
+        queue = self.entries.setdefault(kind, {})
+        entry = queue.setdefault(str(appid), {'attempts': 0})
+        entry['attempts'] += 1
+        entry['failed_at'] = time.time()
+        if entry['attempts'] >= self.max_attempts:
+            print(f"Giving up on {kind} lookup of {appid} after {entry['attempts']} failed runs")
+            del queue[str(appid)]
+        self._dirty = True
+        metrics.increment('lookup_failures_total', kind=kind)
+
+    def succeeded(self, kind, appid):
+        """
+        This function drops an appid from the queue after its lookup succeeded.
+
+        Parameters:
+        kind (str): The kind of lookup.
+        appid (str): The appid.
+        """
+        if self.entries.get(kind, {}).pop(str(appid), None) is not None:
+            self._dirty = True
+
+    def pending(self, kind):
+        """
+        This function returns the queued appids of a kind of lookup.
+
+        Parameters:
+        kind (str): The kind of lookup.
+
+        Returns:
+        list: The appids, the ones that failed most often first.
+        """
+        queue = self.entries.get(kind, {})
+        return sorted(queue, key=lambda appid: -queue[appid]['attempts'])
+
+
+def last_updated_of(installed_games):
+    """
+    This function collects the LastUpdated timestamps of the installed games, for prioritize.
+
+    Parameters:
+    installed_games (list): Installed games as returned by get_installed_games.
+
+    Returns:
+    dict: A dictionary mapping appids to their latest LastUpdated timestamp.
+    """
+    last_updated = {}
+    for game in installed_games:
+        try:
+            updated = int(game.get('LastUpdated') or 0)
+        except ValueError:
+            continue
+        appid = str(game['appid'])
+        last_updated[appid] = max(updated, last_updated.get(appid, 0))
+    return last_updated
+
+
+def prioritize(appids, last_updated=None, first=()):
+    """
+    This function orders lookups so the most useful ones are sent first: queued retries, then games by
+    their LastUpdated timestamp from the appmanifest, most recently updated first.
+
+    Parameters:
+    appids (list): The appids to order.
+    last_updated (dict, optional): A dictionary mapping appids to their LastUpdated timestamps, as returned by last_updated_of.
+    first (iterable, optional): Appids to put in front, e.g. RetryQueue.pending.
+
+    Returns:
+    list: The distinct appids, in the order to look them up.
+    """
+    last_updated = last_updated or {}
+    retries = {str(appid): position for position, appid in enumerate(first)}
+
+    def priority(appid):
+        return (retries.get(appid, len(retries)), -last_updated.get(appid, 0))
+
+    return sorted(dict.fromkeys(str(appid) for appid in appids), key=priority)
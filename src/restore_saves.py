@@ -0,0 +1,424 @@
+import argparse
+import hashlib
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from archive_backup import ARCHIVE_MANIFEST, COMPRESSIONS, archive_path, read_archive_manifest
+from backup_paths import MANIFEST_DIR, group_save_paths, load_manifest
+from global_funcs import hash_file, scan_save_files
+from metrics import metrics
+from records import SavePathTable
+from scan_paths import expand_candidates
+from snapshot_store import blob_path, list_snapshots, load_snapshot, store_path
+
+load_dotenv()
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class RestoreError(Exception):
+    """
+    Raised when a backed up file cannot be restored, e.g. because its backup does not match its recorded hash.
+    """
+
+
+def map_roots(roots, targets):
+    """
+    This function decides where every save folder recorded in a backup is restored to, with at most one
+    save folder per current save path, so files of two folders are never merged into one.
+    A root that is also a current save path of the game stays where it is. The other roots are paired
+    with the free current save path sharing the most trailing folder names with them, best matches first,
+    so a save folder under a new user profile or drive is still found. With a single root and a single
+    current path they are paired directly. Roots without any match are restored to where they were backed
+    up from, and roots whose matches are all taken by other roots are left out as conflicts.
+
+    Parameters:
+    roots (list): The save paths recorded in the backup.
+    targets (list): The current save paths of the game, e.g. from steam_paths_final.json.
+
+    Returns:
+    dict: A dictionary mapping each recorded root to its restore destination, or None for a conflict.
+    """
+    def parts(path):
+        return tuple(os.path.normcase(os.path.normpath(path.replace('\\', os.sep))).split(os.sep))
+
+    def score(root_parts, target_parts):
+        matched = 0
+        while matched < min(len(root_parts), len(target_parts)) and root_parts[-1 - matched] == target_parts[-1 - matched]:
+            matched += 1
+        return matched
+
+    normalized = {}
+    for target in targets:
+        normalized.setdefault(parts(target), target)
+    mapping = {}
+    taken = set()
+    for root in roots:
+        if parts(root) in normalized and parts(root) not in taken:
+            mapping[root] = normalized[parts(root)]
+            taken.add(parts(root))
+
+    pairs = []
+    for root_order, root in enumerate(roots):
+        if root in mapping:
+            continue
+        for target_order, target_parts in enumerate(normalized):
+            matched = score(parts(root), target_parts)
+            if matched:
+                pairs.append((-matched, root_order, target_order, root, target_parts))
+    conflicts = set()
+    for _, _, _, root, target_parts in sorted(pairs):
+        if root in mapping:
+            continue
+        if target_parts in taken:
+            conflicts.add(root)
+            continue
+        mapping[root] = normalized[target_parts]
+        taken.add(target_parts)
+
+    for root in roots:
+        if root in mapping:
+            continue
+        if root in conflicts:
+            mapping[root] = None
+        elif len(roots) == 1 and len(normalized) == 1:
+            mapping[root] = targets[0]
+        else:
+            mapping[root] = root
+    return mapping
+
+def destination(key, entry, root_map, roots=None):
+    """
+    This function returns where a backed up file is restored to.
+    A file whose root is a single save file goes to the destination of the root itself, any other into it.
+    Backups made before the kind of every root was recorded only have the file name to go by, so there a
+    root whose last name is the file name counts as a single file unless its destination is a folder.
+
+    Parameters:
+    key (str): The key of the file in the backup.
+    entry (dict): The backup entry of the file, with its root and, for games with several roots, its path inside the root.
+    root_map (dict): The restore destination of every root, as returned by map_roots.
+    roots (dict, optional): The kind of every root recorded in the backup, as returned by root_kinds.
+
+    Returns:
+    str: The path to restore the file to.
+
+    Raises:
+    RestoreError: If the root of the file conflicts with another root restored to the same save path.
+    """
+    root = entry['root']
+    rel_path = entry.get('rel', key)
+    target = root_map.get(root, root)
+    if target is None:
+        raise RestoreError(f"{root} would be restored over another save folder of the game, restore it by hand")
+    kind = (roots or {}).get(root)
+    if kind is None:
+        single = os.path.basename(root.replace('\\', '/').rstrip('/')) == rel_path and not os.path.isdir(target)
+        kind = 'file' if single else 'dir'
+    if kind == 'file':
+        return target
+    return os.path.join(target, *rel_path.split('/'))
+
+def restore_stream(blocks, dst, size, mtime_ns, expected_hash=None, dry_run=False):
+    """
+    This function restores one file from a stream of its backed up content.
+    While the stream is read it is compared with the file already at dst, and a temporary file is only
+    started at the first difference, so files that are already correct are never written. The content is
+    hashed on the way, checked against expected_hash, and the written file is read back and hashed again
+    before it replaces dst with its original modification time.
+
+    Parameters:
+    blocks (iterable): The content of the backed up file, in blocks of bytes.
+    dst (str): The path to restore the file to.
+    size (int): The size of the backed up file.
+    mtime_ns (int): The modification time to restore.
+    expected_hash (str, optional): The SHA-256 hex digest the content must have.
+    dry_run (bool, optional): Only find out whether the file would be written. Defaults to False.
+
+    Returns:
+    tuple: 'restored' or 'unchanged', and the number of bytes written.
+    """
+    tmp_path = f'{dst}.restore.tmp'
+    digest = hashlib.sha256()
+    existing = open(dst, 'rb') if os.path.isfile(dst) and os.path.getsize(dst) == size else None
+    output = None
+    matched = 0
+    total = 0
+    try:
+        for block in blocks:
+            digest.update(block)
+            total += len(block)
+            if existing is not None:
+                if existing.read(len(block)) == block:
+                    matched += len(block)
+                    continue
+                existing.close()
+                existing = None
+            if output is None and not dry_run:
+                os.makedirs(os.path.dirname(dst) or os.curdir, exist_ok=True)
+                output = open(tmp_path, 'wb')
+                if matched:
+                    with open(dst, 'rb') as prefix:
+                        remaining = matched
+                        while remaining:
+                            data = prefix.read(min(remaining, BLOCK_SIZE))
+                            output.write(data)
+                            remaining -= len(data)
+            if output is not None:
+                output.write(block)
+        unchanged = existing is not None
+    finally:
+        if existing is not None:
+            existing.close()
+        if output is not None:
+            output.close()
+
+    try:
+        if total != size:
+            raise RestoreError(f"backup of {dst} has {total} bytes instead of {size}")
+        if expected_hash and digest.hexdigest() != expected_hash:
+            raise RestoreError(f"backup of {dst} does not match its recorded hash")
+        if unchanged:
+            return 'unchanged', 0
+        if dry_run:
+            return 'restored', 0
+        if output is None:
+            os.makedirs(os.path.dirname(dst) or os.curdir, exist_ok=True)
+            open(tmp_path, 'wb').close()
+        if hash_file(tmp_path) != digest.hexdigest():
+            raise RestoreError(f"restored copy of {dst} does not match its backup")
+        os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp_path, dst)
+        return 'restored', size
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def read_file_blocks(path):
+    """
+    This function yields the content of a file in blocks of BLOCK_SIZE bytes.
+    """
+    with open(path, 'rb') as file:
+        while block := file.read(BLOCK_SIZE):
+            yield block
+
+def read_blob_blocks(store_dir, chunks):
+    """
+    This function yields the content of a snapshot file from its blobs, checking that every blob still
+    hashes to its name.
+
+    Parameters:
+    store_dir (str): The snapshot store directory.
+    chunks (list): The chunk digests of the file.
+    """
+    for chunk in chunks:
+        with open(blob_path(store_dir, chunk), 'rb') as file:
+            data = file.read()
+        if hashlib.sha256(data).hexdigest() != chunk:
+            raise RestoreError(f"blob {chunk} is corrupt")
+        yield data
+
+def read_member_blocks(member_file):
+    """
+    This function yields the content of an archive member in blocks of BLOCK_SIZE bytes.
+    """
+    while block := member_file.read(BLOCK_SIZE):
+        yield block
+
+def restore_game(game_id, targets, backup_dir, mode='copy', snapshot=None, dry_run=False):
+    """
+    This function restores the save files of one game from its backup. It runs on a pool process, so
+    hashing and decompressing happen in parallel for many games. A file that cannot be restored is
+    reported and does not stop the others.
+
+    Copy backups are read from the backup folder of the game with its manifest, or, for backups without a
+    manifest, restored into the only current save path of the game. Snapshot backups are restored from the
+    latest snapshot, or the given one, and archive backups from the archive of the game.
+
+    Parameters:
+    game_id (str): The identification number for the game.
+    targets (list): The current save paths of the game.
+    backup_dir (str): The directory where backups are stored.
+    mode (str, optional): The backup mode, 'copy', 'snapshot' or 'archive'. Defaults to 'copy'.
+    snapshot (str, optional): The name of the snapshot to restore, e.g. 20240101T120000000000Z. Defaults to the latest.
+    dry_run (bool, optional): Only report what would be restored. Defaults to False.
+
+    Returns:
+    dict: The number of files restored, unchanged and failed, the number of bytes written and the errors.
+    """
+    summary = {'restored': 0, 'unchanged': 0, 'failed': 0, 'bytes': 0, 'errors': []}
+
+    def restore(key, entry, blocks, expected_hash=None):
+        try:
+            result, written = restore_stream(blocks, destination(key, entry, root_map, roots), entry['size'],
+                                             entry['mtime_ns'], expected_hash, dry_run)
+            summary[result] += 1
+            summary['bytes'] += written
+        except (OSError, RestoreError, tarfile.TarError) as e:
+            summary['failed'] += 1
+            summary['errors'].append(f"{key}: {e}")
+
+    if mode == 'copy':
+        game_dir = os.path.join(backup_dir, f'{game_id}')
+        manifest = load_manifest(backup_dir, game_id)
+        files, roots = manifest['files'], manifest.get('roots')
+        if not files:
+            if len(targets) != 1:
+                raise RestoreError(f"{game_id} has no backup manifest and {len(targets)} save paths to restore to")
+            files = {key: {'root': targets[0], 'size': size, 'mtime_ns': mtime_ns}
+                     for key, (size, mtime_ns, _) in scan_save_files(game_dir).items()}
+        root_map = map_roots(list(dict.fromkeys(entry['root'] for entry in files.values())), targets)
+        for key, entry in files.items():
+            restore(key, entry, read_file_blocks(os.path.join(game_dir, *key.split('/'))), entry.get('hash'))
+
+    elif mode == 'snapshot':
+        store_dir = store_path(backup_dir)
+        snapshots = list_snapshots(store_dir, game_id)
+        if snapshot:
+            snapshots = [path for path in snapshots if os.path.basename(path) == f'{snapshot}.json']
+        if not snapshots:
+            raise RestoreError(f"{game_id} has no snapshot {snapshot or ''}".rstrip())
+        latest = load_snapshot(snapshots[-1])
+        files, roots = latest['files'], latest.get('roots')
+        root_map = map_roots(list(dict.fromkeys(entry['root'] for entry in files.values())), targets)
+        for key, entry in files.items():
+            restore(key, entry, read_blob_blocks(store_dir, entry['chunks']))
+
+    elif mode == 'archive':
+        path = next((archive_path(backup_dir, game_id, compression) for compression in COMPRESSIONS
+                     if os.path.exists(archive_path(backup_dir, game_id, compression))), None)
+        manifest = read_archive_manifest(path) if path else None
+        if manifest is None:
+            raise RestoreError(f"{game_id} has no readable archive")
+        files, roots = manifest['files'], manifest.get('roots')
+        root_map = map_roots(list(dict.fromkeys(entry['root'] for entry in files.values())), targets)
+        seen = set()
+        with tarfile.open(path, 'r|*') as tar:
+            for member in tar:
+                if member.name == ARCHIVE_MANIFEST or member.name not in files or not member.isfile():
+                    continue
+                seen.add(member.name)
+                restore(member.name, files[member.name], read_member_blocks(tar.extractfile(member)))
+        for key in files.keys() - seen:
+            summary['failed'] += 1
+            summary['errors'].append(f"{key}: missing from {path}")
+
+    else:
+        raise ValueError(f"Unknown backup mode: {mode}")
+    return summary
+
+def list_backed_up_games(backup_dir, mode='copy'):
+    """
+    This function lists the appids that have a backup in the backup directory.
+
+    Parameters:
+    backup_dir (str): The directory where backups are stored.
+    mode (str, optional): The backup mode, 'copy', 'snapshot' or 'archive'. Defaults to 'copy'.
+
+    Returns:
+    list: The appids, sorted.
+    """
+    try:
+        if mode == 'snapshot':
+            return sorted(os.listdir(os.path.join(store_path(backup_dir), 'snapshots')))
+        if mode == 'archive':
+            return sorted({name.split('.tar.')[0] for name in os.listdir(backup_dir)
+                           if name.split('.tar.')[-1] in COMPRESSIONS})
+        appids = {name[:-len('.json')] for name in os.listdir(os.path.join(backup_dir, MANIFEST_DIR))
+                  if name.endswith('.json')} if os.path.isdir(os.path.join(backup_dir, MANIFEST_DIR)) else set()
+        appids.update(entry.name for entry in os.scandir(backup_dir) if entry.is_dir() and not entry.name.startswith('.'))
+        return sorted(appids)
+    except FileNotFoundError:
+        return []
+
+def restore_games(records, backup_dir, appids=None, mode=None, snapshot=None, workers=None, dry_run=False):
+    """
+    This function restores the save files of many games in parallel on a process pool.
+    Every appid is restored to its save paths in records, usually from current_save_paths, and games that
+    are not in it are restored to where they were backed up from. A game whose backup cannot be read, e.g.
+    a corrupt snapshot, is reported as failed and does not stop the others.
+
+    Parameters:
+    records (list): SavePath records with the current save paths of the games.
+    backup_dir (str): The directory where backups are stored.
+    appids (list, optional): The games to restore. Defaults to every game with a backup.
+    mode (str, optional): 'copy', 'snapshot' or 'archive'. Defaults to the backup_mode environment variable, or 'copy'.
+    snapshot (str, optional): The name of the snapshot to restore in snapshot mode. Defaults to the latest.
+    workers (int, optional): The number of processes. Defaults to the restore_workers environment variable or the number of CPUs.
+    dry_run (bool, optional): Only report what would be restored. Defaults to False.
+
+    Returns:
+    dict: A dictionary mapping each appid to its restore summary.
+    """
+    mode = mode or os.environ.get("backup_mode") or "copy"
+    workers = workers or int(os.environ.get("restore_workers") or 0) or None
+    targets = group_save_paths(records)
+    appids = [str(appid) for appid in appids] if appids else list_backed_up_games(backup_dir, mode)
+
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(restore_game, appid, targets.get(appid, []), backup_dir, mode, snapshot, dry_run): appid
+                   for appid in appids}
+        for future in as_completed(futures):
+            appid = futures[future]
+            try:
+                summary = future.result()
+            except (OSError, RestoreError, tarfile.TarError, ValueError, KeyError) as e:
+                summary = {'restored': 0, 'unchanged': 0, 'failed': 1, 'bytes': 0, 'errors': [str(e)]}
+            summaries[appid] = summary
+            for result in ('restored', 'unchanged', 'failed'):
+                metrics.increment('restore_files_total', summary[result], mode=mode, result=result)
+            metrics.increment('restore_bytes_total', summary['bytes'], mode=mode)
+            verb = "would restore" if dry_run else "restored"
+            print(f"{appid}: {verb} {summary['restored']} files ({summary['bytes']} bytes), "
+                  f"{summary['unchanged']} unchanged, {summary['failed']} failed")
+            for error in summary['errors']:
+                print(f"  {error}")
+    return summaries
+
+def current_save_paths():
+    """
+    This function returns the current save paths of the installed games to restore to. The save paths are
+    read from steam_paths.json when a run wrote it with --persist-json, or else looked up by running
+    download_paths in process, and expanded for every user like scan_paths does, but without checking that
+    they exist, so games whose save folders are not created yet, e.g. on a fresh install, are restored too.
+
+    Returns:
+    SavePathTable: SavePath records, empty if the save paths cannot be found.
+    """
+    from pipeline import PipelineRun
+    run = PipelineRun()
+    if not os.path.exists(run.save_paths_file) and not all(run.run(['download_paths']).values()):
+        return SavePathTable()
+    records = list(run.get_save_paths())
+    per_user, _ = expand_candidates(run.settings['user_ids'], records, run.settings.get('environ'),
+                                    run.settings.get('path_map'))
+    targets = SavePathTable()
+    seen = set()
+    for paths in per_user.values():
+        for record, path in zip(records, paths):
+            if (record.appid, path) not in seen:
+                seen.add((record.appid, path))
+                targets.append(record.appid, path)
+    return targets
+
+def main():
+    parser = argparse.ArgumentParser(description="Restore backed up save files to their save paths.")
+    parser.add_argument('appids', nargs='*', help="The games to restore. Defaults to every game with a backup.")
+    parser.add_argument('--backup-dir', default=os.environ.get("backup_dir"))
+    parser.add_argument('--mode', choices=['copy', 'snapshot', 'archive'], help="Defaults to backup_mode.")
+    parser.add_argument('--snapshot', help="The snapshot to restore in snapshot mode. Defaults to the latest.")
+    parser.add_argument('--dry-run', action='store_true', help="Only show what would be restored.")
+    args = parser.parse_args()
+
+    summaries = restore_games(current_save_paths(), args.backup_dir, args.appids, args.mode, args.snapshot, dry_run=args.dry_run)
+    failed = sum(summary['failed'] for summary in summaries.values())
+    print(f"{len(summaries)} games, {sum(summary['restored'] for summary in summaries.values())} files restored, {failed} failed")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_DB_FILE = 'save_locations.db'
+DEFAULT_PLATFORMS = ('steam', 'windows')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS save_locations (
+    appid TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS save_locations_appid_platform ON save_locations (appid, platform);
+CREATE TABLE IF NOT EXISTS lookups (
+    appid TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    has_section INTEGER NOT NULL
+);
+"""
+
+
+class SaveLocationDB:
+    """
+    A local SQLite database of save locations, indexed by appid and platform.
+
+    Every appid that was looked up has a row in lookups recording when, and whether its page had a save game
+    data section at all, so appids without save data are answered offline too. Once built, the database
+    answers a whole library with one indexed query and needs no network.
+    """
+
+    def __init__(self, file_path=DEFAULT_DB_FILE):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path)
+        self.connection.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        """
+        This function opens the database named by the save_db environment variable.
+
+        Returns:
+        SaveLocationDB: The database, or None if save_db is not set.
+        """
+        file_path = os.environ.get("save_db")
+        return cls(file_path) if file_path else None
+
+    def close(self):
+        self.connection.close()
+
+    def store_many(self, entries, fetched_at=None):
+        """
+        This function replaces the save locations of many appids in one transaction.
+
+        Parameters:
+        entries (dict): A dictionary mapping each appid to a list of (platform, path) rows, or None if its page has no save game data.
+        fetched_at (float, optional): When the entries were fetched. Defaults to now.
+        """
+        fetched_at = fetched_at or time.time()
+        with self.connection:
+            self.connection.executemany("DELETE FROM save_locations WHERE appid = ?", [(str(appid),) for appid in entries])
+            self.connection.executemany(
+                "INSERT INTO save_locations (appid, platform, path) VALUES (?, ?, ?)",
+                [(str(appid), platform.lower(), path) for appid, rows in entries.items() for platform, path in rows or []],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO lookups (appid, fetched_at, has_section) VALUES (?, ?, ?)",
+                [(str(appid), fetched_at, 1 if rows else 0) for appid, rows in entries.items()],
+            )
+
+    def _with_appids(self, appids):
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (appid TEXT PRIMARY KEY)")
+        self.connection.execute("DELETE FROM wanted")
+        self.connection.executemany("INSERT OR IGNORE INTO wanted (appid) VALUES (?)", [(str(appid),) for appid in appids])
+
+    def lookup_many(self, appids, platforms=DEFAULT_PLATFORMS):
+        """
+        This function looks up the save locations of many appids with one query.
+
+        Parameters:
+        appids (list): The appids to look up.
+        platforms (tuple, optional): The platforms to return paths for. Defaults to Steam and Windows.
+
+        Returns:
+        dict: A dictionary mapping every appid the database knows to its list of paths, or None if it has no
+        paths for the platforms. Appids that were never looked up are missing.
+        """
+        self._with_appids(appids)
+        results = {appid: None for (appid,) in self.connection.execute(
+            "SELECT lookups.appid FROM lookups JOIN wanted ON wanted.appid = lookups.appid")}
+        placeholders = ', '.join('?' for _ in platforms)
+        rows = self.connection.execute(
+            "SELECT save_locations.appid, save_locations.path FROM save_locations "
+            "JOIN wanted ON wanted.appid = save_locations.appid "
+            f"WHERE save_locations.platform IN ({placeholders}) ORDER BY save_locations.rowid",
+            [platform.lower() for platform in platforms],
+        )
+        for appid, path in rows:
+            if results.get(appid) is None:
+                results[appid] = []
+            results[appid].append(path)
+        return results
+
+    def stale_appids(self, appids, max_age):
+        """
+        This function lists the appids that were never looked up or whose lookup is older than max_age.
+
+        Parameters:
+        appids (list): The appids to check.
+        max_age (float): The maximum age of a lookup in seconds.
+
+        Returns:
+        list: The stale appids, in the order given.
+        """
+        self._with_appids(appids)
+        fresh = {appid for (appid,) in self.connection.execute(
+            "SELECT lookups.appid FROM lookups JOIN wanted ON wanted.appid = lookups.appid WHERE fetched_at >= ?",
+            (time.time() - max_age,))}
+        return [appid for appid in dict.fromkeys(str(appid) for appid in appids) if appid not in fresh]
+
+
+def read_dump(file_path):
+    """
+    This function reads a save location dump or export.
+    JSON Lines and JSON files hold objects with appid, platform and path, CSV files hold the same columns.
+    An object with a null path records an appid without save game data. A pcgamingwiki_cache.json written by
+    download_paths is understood as well, with its paths assigned to the Windows platform.
+
+    Parameters:
+    file_path (str): The dump file.
+
+    Returns:
+    dict: A dictionary mapping each appid to its list of (platform, path) rows, or None.
+    """
+    if file_path.endswith('.csv'):
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            records = list(csv.DictReader(file))
+    elif file_path.endswith('.jsonl'):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            records = [json.loads(line) for line in file if line.strip()]
+    else:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            records = json.load(file)
+        if isinstance(records, dict):
+            records = [
+                {'appid': appid, 'platform': 'windows', 'path': path}
+                for appid, entry in records.items() for path in (entry['paths'] or [None])
+            ]
+
+    entries = {}
+    for record in records:
+        rows = entries.setdefault(str(record['appid']), [])
+        if record.get('path'):
+            rows.append((record.get('platform') or 'windows', record['path']))
+    return {appid: rows or None for appid, rows in entries.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and refresh the offline save location database.")
+    parser.add_argument('--db', default=os.environ.get("save_db") or DEFAULT_DB_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="Bulk import a .jsonl, .json or .csv dump.")
+    import_parser.add_argument('dump')
+    commands.add_parser('refresh', help="Look up the stale entries of the installed games on PCGamingWiki.")
+    args = parser.parse_args()
+
+    db = SaveLocationDB(args.db)
+    if args.command == 'import':
+        entries = read_dump(args.dump)
+        db.store_many(entries)
+        print(f"imported {len(entries)} appids into {args.db}")
+    else:
+        import asyncio
+        from download_paths import refresh_save_db
+        from get_installed_games import get_installed_games, get_steam_library_folders
+        from global_funcs import get_steam_path
+
+        appids = [game['appid'] for game in get_installed_games(get_steam_library_folders(get_steam_path()))]
+        refreshed = asyncio.run(refresh_save_db(db, appids))
+        print(f"refreshed {refreshed} appids in {args.db}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
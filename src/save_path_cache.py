@@ -0,0 +1,136 @@
+import json
+import os
+import time
+
+
+DEFAULT_CACHE_FILE = 'pcgamingwiki_cache.json'
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_NEGATIVE_TTL = 24 * 60 * 60
+
+
+class SavePathCache:
+    """
+    A persistent cache of PCGamingWiki save path lookups keyed by appid.
+
+    Every entry stores the parsed, cleaned list of save paths (or None when the page has no
+    "Save_game_data_location" section) together with the ETag/Last-Modified headers of the
+    response it came from, so stale entries can be revalidated with a conditional request
+    instead of downloading and parsing the whole page again.
+    """
+
+    def __init__(self, file_path=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.file_path = file_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'revalidated': 0}
+        self._dirty = False
+
+    @classmethod
+    def from_env(cls):
+        """
+        This function builds a cache from the pcgw_cache_* environment variables and loads it from disk.
+
+        Returns:
+        SavePathCache: The loaded cache.
+        """
+        cache = cls(
+            file_path=os.environ.get('pcgw_cache_file') or DEFAULT_CACHE_FILE,
+            ttl=float(os.environ.get('pcgw_cache_ttl') or DEFAULT_TTL),
+            negative_ttl=float(os.environ.get('pcgw_cache_negative_ttl') or DEFAULT_NEGATIVE_TTL),
+        )
+        cache.load()
+        return cache
+
+    def load(self):
+        """
+        This function reads the cache file if it exists. A missing or corrupt file leaves the cache empty.
+        """
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """
+        This function writes the cache back to disk if anything changed. The file is replaced atomically
+        so an interrupted run never leaves a truncated cache behind.
+        """
+        if not self._dirty:
+            return
+        tmp_path = f'{self.file_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_path, self.file_path)
+        self._dirty = False
+
+    def lookup(self, appid):
+        """
+        This function looks up an appid and classifies the result.
+
+        Parameters:
+        appid (str): The appid to look up.
+
+        Returns:
+        tuple: A (status, entry) pair where status is 'hit', 'stale' or 'miss' and entry is the cached entry or None.
+        """
+        entry = self.entries.get(str(appid))
+        if entry is None:
+            self.stats['misses'] += 1
+            return 'miss', None
+
+        ttl = self.ttl if entry['paths'] is not None else self.negative_ttl
+        if time.time() - entry['fetched_at'] < ttl:
+            self.stats['hits'] += 1
+            return 'hit', entry
+
+        self.stats['stale'] += 1
+        return 'stale', entry
+
+    def conditional_headers(self, entry):
+        """
+        This function builds the headers for revalidating a stale entry.
+
+        Parameters:
+        entry (dict): The cached entry.
+
+        Returns:
+        dict: The If-None-Match/If-Modified-Since headers, empty if the entry has no validators.
+        """
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, appid, paths, response_headers=None):
+        """
+        This function stores the parsed save paths of an appid. Passing None for paths records a negative entry.
+
+        Parameters:
+        appid (str): The appid the paths belong to.
+        paths (list): The cleaned save paths, or None when the page has no save game section.
+        response_headers (Mapping, optional): The response headers to take the ETag and Last-Modified from.
+        """
+        response_headers = response_headers or {}
+        self.entries[str(appid)] = {
+            'paths': paths,
+            'etag': response_headers.get('etag'),
+            'last_modified': response_headers.get('last-modified'),
+            'fetched_at': time.time(),
+        }
+        self._dirty = True
+
+    def revalidate(self, appid):
+        """
+        This function marks a stale entry as fresh again after the server answered 304 Not Modified.
+
+        Parameters:
+        appid (str): The appid that was revalidated.
+        """
+        entry = self.entries[str(appid)]
+        entry['fetched_at'] = time.time()
+        self.stats['revalidated'] += 1
+        self._dirty = True
@@ -1,80 +1,199 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import json
 from debug_print_scan_paths import debug_print
 
-from global_funcs import read_appids_paths_from_file, read_paths_from_file, expand_environment_variables
+from global_funcs import localize_path
+from path_templates import expand_all
+from records import FINAL_PATHS_NAME, SAVE_PATHS_NAME, SavePathTable, read_save_paths, records_file, write_save_paths
 load_dotenv()
 
+def expand_candidates(user_ids, records, environ=None, path_map=None):
+    """
+    This function expands every save path record for every user id once with the path template engine,
+    which fills in %VARIABLE% environment variables and the {} user id placeholder.
+    Paths without a user id placeholder expand to the same candidate for every user and are only kept once.
+    With a path_map, the paths are of another host and are turned into local paths with localize_path.
+
+    Parameters:
+    user_ids (list): A list of user ids to fill into the paths.
+    records (list): A list of SavePath records from download_paths.
+    environ (dict, optional): The environment variables of the host. Defaults to the environment.
+    path_map (dict, optional): A dictionary mapping path prefixes of the host to local folders.
+
+    Returns:
+    tuple: A dictionary mapping each user id to its list of candidate paths, and a dictionary mapping each
+    distinct candidate path to the appid it was first seen for, in scan order.
+    """
+    expanded = expand_all([record.path for record in records], user_ids, environ=environ)
+    if path_map is not None:
+        local = {}
+        expanded = [{user_id: local.setdefault(path, localize_path(path, path_map)) for user_id, path in paths.items()}
+                    for paths in expanded]
+    per_user = {}
+    candidates = {}
+    for user_id in user_ids:
+        user_paths = []
+        for record, paths in zip(records, expanded):
+            formatted_path = paths[user_id]
+            user_paths.append(formatted_path)
+            candidates.setdefault(formatted_path, record.appid)
+        per_user[user_id] = user_paths
+    return per_user, candidates
+
+def list_directory(directory):
+    """
+    This function lists the names in a directory with one os.scandir call.
+    Broken symbolic links are left out, as os.path.exists does not count them either.
+
+    Parameters:
+    directory (str): The directory to list.
+
+    Returns:
+    set: The normalized names in the directory, empty if it does not exist, or None if it cannot be listed.
+    """
+    try:
+        with os.scandir(directory or os.curdir) as entries:
+            return {os.path.normcase(entry.name) for entry in entries
+                    if not entry.is_symlink() or os.path.exists(entry.path)}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+    except OSError:
+        return None
+
+def resolve_existence(paths, workers=8):
+    """
+    This function checks which paths exist by grouping them by parent directory and listing every parent
+    once, instead of calling os.path.exists per path. The listings run on a small thread pool so slow or
+    network drives are queried in parallel, unless there is only one worker or one parent to list.
+
+    The result is the same as os.path.exists gives. A name that is only listed with a different case, which
+    a case-insensitive file system such as a mounted Windows drive accepts, and every path in a directory
+    that cannot be listed are checked with os.path.exists.
+
+    Parameters:
+    paths (iterable): The paths to check.
+    workers (int, optional): The number of threads listing directories. Defaults to 8.
+
+    Returns:
+    dict: A dictionary mapping each path to True if it exists and False otherwise.
+    """
+    by_parent = {}
+    fallback = []
+    for path in paths:
+        parent, name = os.path.split(os.path.normpath(path))
+        if name in ('', os.curdir, os.pardir):
+            fallback.append(path)
+        else:
+            by_parent.setdefault(parent, []).append((path, os.path.normcase(name)))
+
+    if workers > 1 and len(by_parent) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            listings = dict(zip(by_parent, pool.map(list_directory, by_parent)))
+    else:
+        listings = {parent: list_directory(parent) for parent in by_parent}
+
+    existence = {path: os.path.exists(path) for path in fallback}
+    for parent, children in by_parent.items():
+        names = listings[parent]
+        if names is None:
+            existence.update((path, os.path.exists(path)) for path, _ in children)
+            continue
+        folded = None
+        for path, name in children:
+            if name in names:
+                existence[path] = True
+                continue
+            if folded is None:
+                folded = {listed.casefold() for listed in names}
+            existence[path] = name.casefold() in folded and os.path.exists(path)
+    return existence
+
+def scan_save_paths(user_ids, records, workers=None, environ=None, path_map=None):
+    """
+    This function resolves the save path records for every user id and checks which of them exist, in one pass.
+    Both the per-user debug view and the list of existing save paths are built from the same result, so every
+    candidate path is expanded and checked exactly once.
+
+    Parameters:
+    user_ids (list): A list of user ids to resolve the paths with.
+    records (list): A list of SavePath records from download_paths.
+    workers (int, optional): The number of threads listing directories. Defaults to the scan_workers environment variable or 8.
+    environ (dict, optional): The environment variables of the host. Defaults to the environment.
+    path_map (dict, optional): A dictionary mapping path prefixes of another host to local folders, see expand_candidates.
+
+    Returns:
+    tuple: A dictionary where the keys are user ids and the values are dictionaries of paths and their existence,
+    and a SavePathTable of the resolved paths that exist, without duplicates.
+    """
+    workers = workers or int(os.environ.get("scan_workers") or 8)
+    per_user, candidates = expand_candidates(user_ids, records, environ, path_map)
+    existence = resolve_existence(candidates, workers)
+
+    results = {user_id: {path: existence[path] for path in paths} for user_id, paths in per_user.items()}
+    final = SavePathTable()
+    seen_paths = set()
+    for path, appid in candidates.items():
+        normalized = os.path.normcase(os.path.normpath(path))
+        if existence[path] and normalized not in seen_paths:
+            seen_paths.add(normalized)
+            final.append(appid, path)
+    return results, final
+
 def check_paths(user_ids, paths_file):
     """
     This function checks the existence of paths for a given list of user ids.
-    
+
     It first reads the paths from a file, then expands any environment variables in the paths.
     For each user id, it checks the existence of each path and stores the results in a dictionary.
-    
+
     Parameters:
     user_ids (list): A list of user ids to check paths for.
     paths_file (str): The file containing the paths to check.
-    
+
     Returns:
     dict: A dictionary where the keys are user ids and the values are dictionaries of paths and their existence.
     """
-    paths = read_paths_from_file(paths_file)
-
-    # Expand environment variables in paths
-    paths = [os.path.expandvars(path) for path in paths]
-
-    results = {}
-    for user_id in user_ids:
-        user_results = {}
-        for path in paths:
-            formatted_path = path.format(user_id)
-            user_results[formatted_path] = os.path.exists(formatted_path)
-        results[user_id] = user_results
-
+    results, _ = scan_save_paths(user_ids, read_save_paths(paths_file))
     return results
 
 
-def dump_results_to_file(results, output_file):
+def dump_results_to_file(final_paths, output_file):
     """
-    This function takes the results of the path checks and writes them to a file in JSON format.
-    
-    It first initializes an empty list to hold the data and a set to keep track of unique paths. Then, it reads the paths associated with appids from a file. For each user id in the results, it iterates over the appid paths, expands the environment variables in the paths, and checks if the path exists. If the path exists and hasn't been seen before, it adds the path and its corresponding appid to the data list. Finally, it writes the data to the specified output file in JSON format with indentation for readability.
-    
+    This function writes the existing save paths found by scan_save_paths to a file in JSON format,
+    with indentation for readability.
+
     Parameters:
-    results (dict): A dictionary containing the results of the path checks.
+    final_paths (list): A list of SavePath records with resolved paths that exist.
     output_file (str): The file where the results will be written.
     """
-    data = []
-    seen_paths = set()  # To keep track of unique paths
+    write_save_paths(final_paths, output_file, indent=4)
 
-    # Read appid paths from file once
-    appid_paths = read_appids_paths_from_file('steam_paths.json')
+def get_user_ids(environ=None):
+    """
+    This function returns the Steam and Ubisoft user ids configured in the environment.
 
-    for user_id in results.keys():
-        for path, appid in appid_paths.items():
-            expanded_path = expand_environment_variables(path).format(user_id)
-            if expanded_path not in seen_paths and os.path.exists(expanded_path):
-                seen_paths.add(expanded_path)
-                data.append({'appid': appid, 'path': expanded_path})
+    Parameters:
+    environ (dict, optional): The settings to read. Defaults to the environment.
 
-    # Write data to the output file
-    with open(output_file, 'w') as file:
-        json.dump(data, file, indent=4)  # Optional: indent for readability
+    Returns:
+    list: The user ids to fill into the save paths.
+    """
+    environ = os.environ if environ is None else environ
+    return [f'{environ.get("steam_user_id")}', f'{environ.get("steam_acc_id")}',
+            f'{environ.get("ubisoft_user_id")}']
 
 def main():
     # Example usage
-    user_ids = [f'{os.environ.get("steam_user_id")}', f'{os.environ.get("steam_acc_id")}',
-                f'{os.environ.get("ubisoft_user_id")}']
-    paths_file = 'steam_paths.json'
-    output_file = 'steam_paths_final.json'
-    results = check_paths(user_ids, paths_file)
+    user_ids = get_user_ids()
+    paths_file = records_file(SAVE_PATHS_NAME)
+    output_file = records_file(FINAL_PATHS_NAME)
+    results, final_paths = scan_save_paths(user_ids, read_save_paths(paths_file))
     #uncomment this only for debugging
     debug_print(results)
 
-    dump_results_to_file(results, output_file)
+    dump_results_to_file(final_paths, output_file)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,310 @@
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+from global_funcs import root_kinds, scan_game_files
+
+STORE_DIR = '.store'
+TMP_DIR = 'tmp'
+BLOCK_SIZE = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+TMP_MAX_AGE = 24 * 60 * 60
+
+
+def store_path(backup_dir):
+    """
+    This function returns the directory of the snapshot store inside a backup directory.
+
+    Parameters:
+    backup_dir (str): The directory where backups are stored.
+
+    Returns:
+    str: The path of the snapshot store.
+    """
+    return os.path.join(backup_dir, STORE_DIR)
+
+def blob_path(store_dir, digest):
+    """
+    This function returns where a blob is kept. Blobs are spread over subfolders named after the first two
+    characters of their hash so no single folder grows too large.
+
+    Parameters:
+    store_dir (str): The snapshot store directory.
+    digest (str): The SHA-256 hex digest of the blob.
+
+    Returns:
+    str: The path of the blob file.
+    """
+    return os.path.join(store_dir, 'blobs', digest[:2], digest)
+
+def snapshot_dir(store_dir, game_id):
+    """
+    This function returns the folder holding the snapshot manifests of a game.
+
+    Parameters:
+    store_dir (str): The snapshot store directory.
+    game_id (str): The identification number for the game.
+
+    Returns:
+    str: The path of the snapshot folder.
+    """
+    return os.path.join(store_dir, 'snapshots', f'{game_id}')
+
+def list_snapshots(store_dir, game_id):
+    """
+    This function lists the snapshot manifests of a game, oldest first.
+    Snapshot file names are UTC timestamps, so sorting them by name sorts them by age.
+
+    Parameters:
+    store_dir (str): The snapshot store directory.
+    game_id (str): The identification number for the game.
+
+    Returns:
+    list: The paths of the snapshot manifests.
+    """
+    directory = snapshot_dir(store_dir, game_id)
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+def load_snapshot(path):
+    """
+    This function reads a snapshot manifest.
+
+    Parameters:
+    path (str): The path of the snapshot manifest.
+
+    Returns:
+    dict: The snapshot with its 'files' mapping relative paths to their root, size, mtime and chunk hashes,
+    and its 'roots' telling which roots are single files, see root_kinds.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def write_blob(store_dir, file, limit=0, empty=True):
+    """
+    This function stores the next piece of an open file under its hash. The content is read in BLOCK_SIZE
+    blocks, hashed and written to a temp file in the store's tmp folder at the same time, so a file of any
+    size is stored in one pass with little memory. The temp file then becomes the blob, or is removed when
+    the store already has the content.
+
+    Parameters:
+    store_dir (str): The snapshot store directory.
+    file (file): The file to read from, opened in binary mode.
+    limit (int, optional): The most bytes to read, or 0 to read to the end of the file.
+    empty (bool, optional): Store the content even when nothing was left to read. Defaults to True.
+
+    Returns:
+    tuple: The hex digest of the content, or None if nothing was read and empty is False, the number of
+    bytes actually written to the store and the number of bytes read.
+    """
+    tmp_dir = os.path.join(store_dir, TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, f'{os.getpid()}.{threading.get_ident()}.tmp')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            while not limit or size < limit:
+                data = file.read(min(BLOCK_SIZE, limit - size) if limit else BLOCK_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+                out.write(data)
+                size += len(data)
+        if not size and not empty:
+            os.remove(tmp_path)
+            return None, 0, 0
+        path = blob_path(store_dir, digest.hexdigest())
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return digest.hexdigest(), 0, size
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    return digest.hexdigest(), size, size
+
+def store_file(store_dir, path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    This function adds a file to the blob store, either whole or split into fixed-size chunks.
+
+    Parameters:
+    store_dir (str): The snapshot store directory.
+    path (str): The file to store.
+    chunk_size (int, optional): The chunk size in bytes, or 0 to store the file as one blob. Defaults to DEFAULT_CHUNK_SIZE.
+
+    Returns:
+    tuple: The list of chunk digests and the number of bytes actually written.
+    """
+    chunks = []
+    written = 0
+    with open(path, 'rb') as file:
+        while True:
+            digest, count, size = write_blob(store_dir, file, chunk_size, empty=not chunks)
+            if digest is None:
+                break
+            chunks.append(digest)
+            written += count
+            if not chunk_size or size < chunk_size:
+                break
+    return chunks, written
+
+def snapshot_save_files(game_id, save_paths, backup_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    This function takes a snapshot of the save files of a game.
+    File contents go into the content-addressed blob store and the snapshot itself is a small manifest
+    pointing at the blobs. Files whose size and mtime match the latest snapshot reuse its blobs without being
+    read, and no snapshot is written when nothing changed at all.
+
+    Parameters:
+    game_id (str): The identification number for the game.
+    save_paths (list): A collection of save paths.
+    backup_dir (str): The directory where backups are stored.
+    chunk_size (int, optional): Split files into chunks of this many bytes, or 0 for one blob per file. Defaults to DEFAULT_CHUNK_SIZE.
+
+    Returns:
+    dict: The number of files stored, unchanged and deleted, and the number of bytes written to the store.
+    """
+    store_dir = store_path(backup_dir)
+    summary = {'copied': 0, 'bytes': 0, 'unchanged': 0, 'deleted': 0}
+
+    snapshots = list_snapshots(store_dir, game_id)
+    latest = load_snapshot(snapshots[-1]) if snapshots else {'files': {}}
+    old_files = latest['files']
+    new_files = {}
+    files = scan_game_files(save_paths)
+    roots = root_kinds(files)
+
+    for rel_path, (save_path, root_rel_path, size, mtime_ns, full_path) in files.items():
+        old = old_files.get(rel_path)
+        if old and old['size'] == size and old['mtime_ns'] == mtime_ns:
+            chunks = old['chunks']
+            summary['unchanged'] += 1
+        else:
+            chunks, written = store_file(store_dir, full_path, chunk_size)
+            summary['copied'] += 1
+            summary['bytes'] += written
+        new_files[rel_path] = {'root': save_path, 'rel': root_rel_path, 'size': size, 'mtime_ns': mtime_ns, 'chunks': chunks}
+
+    summary['deleted'] = len(old_files.keys() - new_files.keys())
+    if snapshots and not summary['copied'] and not summary['deleted'] and latest.get('roots') == roots:
+        print(f"{game_id} unchanged, no new snapshot")
+        return summary
+
+    now = time.time()
+    name = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    directory = snapshot_dir(store_dir, game_id)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}.json')
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+        json.dump({'appid': game_id, 'created_at': now, 'files': new_files, 'roots': roots}, file)
+    os.replace(f'{path}.tmp', path)
+    print(f"snapshot {name} of {game_id}: {summary['copied']} files stored ({summary['bytes']} new bytes)")
+    return summary
+
+def select_snapshots_to_keep(snapshots, keep_last=0, keep_daily=0, keep_weekly=0):
+    """
+    This function applies a retention policy to a list of snapshots.
+    A snapshot is kept if it is one of the keep_last newest, or the newest of one of the keep_daily most
+    recent days or of the keep_weekly most recent ISO weeks that have snapshots.
+
+    Parameters:
+    snapshots (list): The paths of the snapshot manifests, oldest first.
+    keep_last (int, optional): The number of newest snapshots to keep.
+    keep_daily (int, optional): The number of days to keep one snapshot for.
+    keep_weekly (int, optional): The number of weeks to keep one snapshot for.
+
+    Returns:
+    set: The paths of the snapshots to keep.
+    """
+    newest_first = list(reversed(snapshots))
+    keep = set(newest_first[:keep_last])
+    days, weeks = {}, {}
+    for path in newest_first:
+        created = datetime.datetime.strptime(os.path.basename(path)[:8], '%Y%m%d').date()
+        days.setdefault(created, path)
+        weeks.setdefault(created.isocalendar()[:2], path)
+    keep.update(list(days.values())[:keep_daily])
+    keep.update(list(weeks.values())[:keep_weekly])
+    return keep
+
+def apply_retention(backup_dir, keep_last=0, keep_daily=0, keep_weekly=0):
+    """
+    This function deletes the snapshots that fall outside the retention policy and then garbage-collects
+    the blobs no remaining snapshot refers to. The newest snapshot of every game is always kept.
+
+    Parameters:
+    backup_dir (str): The directory where backups are stored.
+    keep_last (int, optional): The number of newest snapshots to keep per game.
+    keep_daily (int, optional): The number of days to keep one snapshot for.
+    keep_weekly (int, optional): The number of weeks to keep one snapshot for.
+
+    Returns:
+    tuple: The number of snapshots and blobs removed.
+    """
+    store_dir = store_path(backup_dir)
+    snapshots_root = os.path.join(store_dir, 'snapshots')
+    if not os.path.isdir(snapshots_root):
+        return 0, 0
+
+    removed_snapshots = 0
+    for game_id in os.listdir(snapshots_root):
+        snapshots = list_snapshots(store_dir, game_id)
+        keep = select_snapshots_to_keep(snapshots, max(keep_last, 1), keep_daily, keep_weekly)
+        for path in snapshots:
+            if path not in keep:
+                os.remove(path)
+                removed_snapshots += 1
+
+    return removed_snapshots, collect_garbage(backup_dir)
+
+def collect_garbage(backup_dir):
+    """
+    This function removes every blob that is not referenced by any snapshot.
+    Temp files are left alone, as another backup may still be writing them, unless they are older than
+    TMP_MAX_AGE and were left behind by an interrupted run.
+
+    Parameters:
+    backup_dir (str): The directory where backups are stored.
+
+    Returns:
+    int: The number of blobs removed.
+    """
+    store_dir = store_path(backup_dir)
+    referenced = set()
+    snapshots_root = os.path.join(store_dir, 'snapshots')
+    if os.path.isdir(snapshots_root):
+        for game_id in os.listdir(snapshots_root):
+            for path in list_snapshots(store_dir, game_id):
+                for entry in load_snapshot(path)['files'].values():
+                    referenced.update(entry['chunks'])
+
+    removed = 0
+    tmp_dir = os.path.join(store_dir, TMP_DIR)
+    if os.path.isdir(tmp_dir):
+        expired = time.time() - TMP_MAX_AGE
+        with os.scandir(tmp_dir) as entries:
+            for entry in entries:
+                with contextlib.suppress(FileNotFoundError):
+                    if entry.stat().st_mtime < expired:
+                        os.remove(entry.path)
+
+    blobs_root = os.path.join(store_dir, 'blobs')
+    if not os.path.isdir(blobs_root):
+        return removed
+    for prefix in os.listdir(blobs_root):
+        with os.scandir(os.path.join(blobs_root, prefix)) as entries:
+            for entry in entries:
+                if entry.name not in referenced and not entry.name.endswith('.tmp'):
+                    os.remove(entry.path)
+                    removed += 1
+    return removed
@@ -0,0 +1,168 @@
+import asyncio
+import contextlib
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from backup_paths import BackupRunner
+from download_paths import render_save_paths, stream_save_paths
+from metrics import metrics
+from records import SavePathTable
+from request_scheduler import last_updated_of
+from scan_paths import expand_candidates, scan_save_paths
+
+load_dotenv()
+
+
+def claim_known_paths(installed_games, known_paths, settings):
+    """
+    This function settles which game owns every save path that can be derived from the save paths known
+    before the run, e.g. those looked up once for a whole fleet. The paths are expanded for every user
+    like scan_save_paths does, without checking that they exist, and each belongs to the first installed
+    game that has it, so the owners do not depend on the order the checks finish in.
+
+    Parameters:
+    installed_games (list): Installed games as returned by get_installed_games.
+    known_paths (dict): A dictionary mapping appids to their raw save paths.
+    settings (dict): The pipeline settings, as returned by load_settings.
+
+    Returns:
+    dict: A dictionary mapping each normalized save path to the appid that owns it.
+    """
+    owners = {}
+    if not known_paths:
+        return owners
+    records = render_save_paths(installed_games, known_paths, settings['steam_path'], settings['ubisoft_path'],
+                                settings['path_to_game'])
+    _, candidates = expand_candidates(settings['user_ids'], records, settings.get('environ'), settings.get('path_map'))
+    for path, appid in candidates.items():
+        owners.setdefault(os.path.normcase(os.path.normpath(path)), appid)
+    return owners
+
+
+async def stream_games(installed_games, settings, known_paths=None, queue_size=None, debug=False):
+    """
+    This function runs download_paths, scan_paths and backup_paths as one streaming pipeline: every game
+    is expanded, checked and queued for backup as soon as its save paths are looked up, so the network
+    lookups of some games overlap with the disk work of others and the run takes about as long as the
+    slower of the two instead of their sum.
+
+    The stages are connected by queues of queue_size games. Lookups wait when the checks fall behind and
+    the checks wait when backup_game_workers games are already being backed up, so the work in flight
+    stays the same however large the library is. Only the save path records are kept, for
+    dump_game_names and the JSON files. A game whose backup fails does not stop the others, the first
+    error is raised once all games are done.
+
+    A save path found for several games is backed up once. Owners of the paths of known_paths games are
+    settled before anything runs, by the order of installed_games as in scan_save_paths. Any other path
+    goes to the first game whose check finds it, without holding back the backups of other games.
+
+    Parameters:
+    installed_games (list): Installed games as returned by get_installed_games.
+    settings (dict): The pipeline settings, as returned by load_settings.
+    known_paths (dict, optional): Save paths that were already looked up, e.g. once for a whole fleet. Games missing from it are looked up.
+    queue_size (int, optional): The number of games buffered between two stages. Defaults to the stream_queue_size environment variable or 64.
+    debug (bool, optional): Also collect the existence of every scanned path, for debug_print.
+
+    Returns:
+    dict: The save paths ('save_paths'), the existing save paths ('final_paths'), the backup summary of
+    every game ('backups') and, with debug, the scan results ('results').
+    """
+    queue_size = queue_size or int(os.environ.get("stream_queue_size") or 64)
+    check_workers = int(os.environ.get("scan_workers") or 8)
+    known_paths = known_paths or {}
+
+    games = {}
+    for game in installed_games:
+        games.setdefault(str(game['appid']), []).append(game)
+    resolved = asyncio.Queue(maxsize=queue_size)
+    ready = asyncio.Queue(maxsize=queue_size)
+
+    save_paths = SavePathTable()
+    final_paths = SavePathTable()
+    seen_paths = set()
+    results = {}
+    backups = {}
+    owners = claim_known_paths(installed_games, known_paths, settings)
+    owners_lock = asyncio.Lock()
+
+    async def look_up():
+        missing = [appid for appid in games if appid not in known_paths]
+        for appid in games:
+            if appid in known_paths:
+                await resolved.put((appid, known_paths[appid]))
+        lookups = stream_save_paths(missing, last_updated_of(installed_games), queue_size)
+        async with contextlib.aclosing(lookups):
+            async for item in lookups:
+                await resolved.put(item)
+        for _ in range(check_workers):
+            await resolved.put(None)
+
+    async def check():
+        while (item := await resolved.get()) is not None:
+            appid, raw_paths = item
+            metrics.increment('stream_games_total', stage='lookup')
+            if not raw_paths:
+                continue
+            records = render_save_paths(games[appid], {appid: raw_paths}, settings['steam_path'],
+                                        settings['ubisoft_path'], settings['path_to_game'])
+            save_paths.extend(records)
+            scanned, found = await asyncio.to_thread(scan_save_paths, settings['user_ids'], records, 1,
+                                                     settings.get('environ'), settings.get('path_map'))
+            if debug:
+                for user_id, paths in scanned.items():
+                    results.setdefault(user_id, {}).update(paths)
+            game_paths = []
+            async with owners_lock:
+                for _, path in found:
+                    normalized = os.path.normcase(os.path.normpath(path))
+                    if owners.setdefault(normalized, appid) == appid and normalized not in seen_paths:
+                        seen_paths.add(normalized)
+                        final_paths.append(appid, path)
+                        game_paths.append(path)
+            metrics.increment('stream_games_total', stage='check')
+            if game_paths:
+                await ready.put((appid, game_paths))
+
+    async def check_all():
+        await asyncio.gather(*(check() for _ in range(check_workers)))
+        await ready.put(None)
+
+    async def back_up(runner):
+        slots = asyncio.Semaphore(runner.workers)
+        running = set()
+        failures = {}
+
+        async def back_up_game(appid, paths):
+            try:
+                future = runner.submit(appid, paths)
+                await asyncio.wrap_future(future)
+                backups[appid] = runner.result(appid, future)
+                metrics.increment('stream_games_total', stage='backup')
+            except Exception as e:
+                failures[appid] = e
+            finally:
+                slots.release()
+
+        while (item := await ready.get()) is not None:
+            await slots.acquire()
+            task = asyncio.create_task(back_up_game(*item))
+            running.add(task)
+            task.add_done_callback(running.discard)
+        await asyncio.gather(*running)
+        for appid, error in failures.items():
+            logging.error(f"Backup of {appid} failed: {error!r}")
+        if failures:
+            raise next(iter(failures.values()))
+
+    with BackupRunner(settings['backup_dir'], environ=settings.get('environ')) as runner:
+        tasks = [asyncio.create_task(look_up()), asyncio.create_task(check_all()), asyncio.create_task(back_up(runner))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {'save_paths': save_paths, 'final_paths': final_paths, 'backups': backups, 'results': results}
@@ -0,0 +1,118 @@
+import re
+
+TOKEN_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}])|//[^\n]*|\[[^\]\n]*\]|([^\s{}"]+)')
+ESCAPES = {'n': '\n', 't': '\t', '\\': '\\', '"': '"'}
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+
+class VDFError(ValueError):
+    """
+    Raised when a VDF/ACF file is not valid KeyValues text.
+    """
+
+
+def unescape(value):
+    """
+    This function resolves the backslash escapes of a quoted KeyValues string.
+
+    Parameters:
+    value (str): The raw string between the quotes.
+
+    Returns:
+    str: The unescaped string.
+    """
+    if '\\' not in value:
+        return value
+    return ESCAPE_PATTERN.sub(lambda match: ESCAPES.get(match.group(1), match.group(0)), value)
+
+def tokenize(text):
+    """
+    This function splits KeyValues text into tokens in a single lazy pass.
+    Comments and platform conditionals such as [$WIN32] are skipped.
+
+    Parameters:
+    text (str): The VDF/ACF text.
+
+    Yields:
+    The string '{' or '}' for braces, and a one-item tuple for every key or value, so that a quoted "{"
+    is never mistaken for a brace.
+    """
+    for match in TOKEN_PATTERN.finditer(text):
+        quoted, brace, bare = match.groups()
+        if brace:
+            yield brace
+        elif quoted is not None:
+            yield (unescape(quoted),)
+        elif bare is not None:
+            yield (bare,)
+
+def parse(text):
+    """
+    This function parses KeyValues text, as used by Steam's .vdf and .acf files, into nested dictionaries.
+    Keys that appear more than once keep their last value.
+
+    Parameters:
+    text (str): The VDF/ACF text.
+
+    Returns:
+    dict: The parsed data, with dictionaries for blocks and strings for values.
+    """
+    root = {}
+    stack = [root]
+    key = None
+    for token in tokenize(text):
+        if token == '{':
+            if key is None:
+                raise VDFError("Block without a key")
+            block = {}
+            stack[-1][key] = block
+            stack.append(block)
+            key = None
+        elif token == '}':
+            if key is not None or len(stack) == 1:
+                raise VDFError("Unexpected closing brace")
+            stack.pop()
+        elif key is None:
+            key = token[0]
+        else:
+            stack[-1][key] = token[0]
+            key = None
+    if len(stack) != 1 or key is not None:
+        raise VDFError("Unexpected end of file")
+    return root
+
+def extract_keys(text, keys, depth=1):
+    """
+    This function reads only the given keys at one nesting depth and stops as soon as all of them are found,
+    without building the rest of the tree. Depth 1 is the inside of the top-level block, where appmanifest
+    files keep appid, name and installdir.
+
+    Parameters:
+    text (str): The VDF/ACF text.
+    keys (iterable): The keys to extract.
+    depth (int, optional): The nesting depth of the keys. Defaults to 1.
+
+    Returns:
+    dict: The found keys and their string values.
+    """
+    wanted = set(keys)
+    found = {}
+    level = 0
+    key = None
+    for token in tokenize(text):
+        if token == '{':
+            level += 1
+            key = None
+        elif token == '}':
+            level -= 1
+            if level < depth and found:
+                break
+        elif key is None:
+            key = token[0]
+        else:
+            if level == depth and key in wanted:
+                found[key] = token[0]
+                if len(found) == len(wanted):
+                    break
+            key = None
+    return found
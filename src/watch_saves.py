@@ -0,0 +1,218 @@
+import logging
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from backup_paths import BackupRunner, group_save_paths
+from global_funcs import scan_save_files
+from metrics import write_reports
+from records import FINAL_PATHS_NAME, read_save_paths, records_file
+
+load_dotenv()
+
+MAX_RETRY_DELAY = 600
+
+
+def save_signature(save_paths):
+    """
+    This function summarizes the state of a game's save files as the set of their paths, sizes and mtimes.
+
+    Parameters:
+    save_paths (list): A collection of save paths.
+
+    Returns:
+    frozenset: The (root, relative path, size, mtime_ns) of every file.
+    """
+    signature = set()
+    for save_path in save_paths:
+        try:
+            files = scan_save_files(save_path)
+        except OSError:
+            continue
+        signature.update((save_path, rel_path, size, mtime_ns) for rel_path, (size, mtime_ns, _) in files.items())
+    return frozenset(signature)
+
+
+class PollingBackend:
+    """
+    Detects changed games by comparing save signatures, with an adaptive interval per game.
+
+    A game that just changed is checked again after min_interval. Every check without a change makes its
+    interval 1.5 times longer, up to max_interval, so games that are not being played cost almost nothing.
+    """
+
+    def __init__(self, games, min_interval=2.0, max_interval=60.0):
+        self.games = games
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        now = time.monotonic()
+        self.signatures = {game_id: save_signature(paths) for game_id, paths in games.items()}
+        self.intervals = {game_id: min_interval for game_id in games}
+        self.next_check = {game_id: now for game_id in games}
+
+    def wait(self, timeout):
+        """
+        This function waits up to timeout seconds and returns the games whose files changed.
+
+        Parameters:
+        timeout (float): The longest time to wait.
+
+        Returns:
+        set: The ids of the changed games.
+        """
+        now = time.monotonic()
+        delay = min([timeout] + [max(0, moment - now) for moment in self.next_check.values()])
+        time.sleep(delay)
+
+        changed = set()
+        now = time.monotonic()
+        for game_id, moment in self.next_check.items():
+            if moment > now:
+                continue
+            signature = save_signature(self.games[game_id])
+            if signature != self.signatures[game_id]:
+                self.signatures[game_id] = signature
+                self.intervals[game_id] = self.min_interval
+                changed.add(game_id)
+            else:
+                self.intervals[game_id] = min(self.intervals[game_id] * 1.5, self.max_interval)
+            self.next_check[game_id] = now + self.intervals[game_id]
+        return changed
+
+
+class InotifyBackend:
+    """
+    Detects changed games from inotify events, using the optional inotify_simple package on Linux.
+    New folders inside a save folder are watched as soon as they appear.
+    """
+
+    def __init__(self, games):
+        from inotify_simple import INotify, flags
+
+        self.flags = flags
+        self.mask = (flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.DELETE | flags.MOVED_TO
+                     | flags.MOVED_FROM | flags.ATTRIB)
+        self.inotify = INotify()
+        self.watches = {}
+        for game_id, paths in games.items():
+            for save_path in paths:
+                self._watch_tree(game_id, save_path)
+
+    def _watch_tree(self, game_id, path):
+        if os.path.isfile(path):
+            path = os.path.dirname(path)
+        for directory, _, _ in os.walk(path):
+            try:
+                self.watches[self.inotify.add_watch(directory, self.mask)] = (game_id, directory)
+            except OSError:
+                continue
+
+    def wait(self, timeout):
+        changed = set()
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            game_id, directory = self.watches.get(event.wd, (None, None))
+            if game_id is None:
+                continue
+            changed.add(game_id)
+            if event.mask & self.flags.ISDIR and event.mask & (self.flags.CREATE | self.flags.MOVED_TO):
+                self._watch_tree(game_id, os.path.join(directory, event.name))
+        return changed
+
+
+def create_backend(games, min_interval, max_interval):
+    """
+    This function picks inotify where it is available and falls back to polling everywhere else.
+
+    Returns:
+    PollingBackend or InotifyBackend: The change detection backend.
+    """
+    if sys.platform.startswith('linux') and os.environ.get("watch_backend", "auto") != "polling":
+        try:
+            return InotifyBackend(games)
+        except (ImportError, OSError):
+            pass
+    return PollingBackend(games, min_interval, max_interval)
+
+def retry_delay(failures, debounce):
+    """
+    This function returns how long to wait before backing up a game again after its backup failed:
+    debounce seconds after the first failure, doubling with every further failure up to MAX_RETRY_DELAY.
+
+    Parameters:
+    failures (int): The number of backups of the game that failed in a row.
+    debounce (float): Seconds of quiet before a backup.
+
+    Returns:
+    float: The delay in seconds.
+    """
+    return min(debounce * 2 ** (failures - 1), MAX_RETRY_DELAY)
+
+def watch(records, backup_dir, debounce=None, min_interval=None, max_interval=None, retention_interval=None,
+          backend=None):
+    """
+    This function watches the resolved save folders and backs up a game once its files stop changing.
+    A game is backed up when debounce seconds passed since its last change, so a burst of writes while the
+    game is saving results in one backup. Games whose files did not change are never backed up.
+    All backups go through one BackupRunner. A game whose backup fails is logged and tried again later,
+    waiting longer after every failure, without stopping the watch. In 'snapshot' mode the retention
+    policy is applied at most every retention_interval seconds, and once more when the watch stops.
+    The run report and Prometheus textfile are rewritten after every round of backups. Runs until interrupted.
+
+    Parameters:
+    records (list): A list of SavePath records with resolved paths.
+    backup_dir (str): The directory where backups are stored.
+    debounce (float, optional): Seconds of quiet before a backup. Defaults to watch_debounce or 10.
+    min_interval (float, optional): Shortest polling interval. Defaults to watch_min_interval or 2.
+    max_interval (float, optional): Longest polling interval. Defaults to watch_max_interval or 60.
+    retention_interval (float, optional): Seconds between two retention runs. Defaults to watch_retention_interval or 3600.
+    backend (PollingBackend or InotifyBackend, optional): The change detection backend. Defaults to create_backend.
+    """
+    debounce = debounce or float(os.environ.get("watch_debounce") or 10)
+    min_interval = min_interval or float(os.environ.get("watch_min_interval") or 2)
+    max_interval = max_interval or float(os.environ.get("watch_max_interval") or 60)
+    retention_interval = retention_interval or float(os.environ.get("watch_retention_interval") or 3600)
+
+    games = group_save_paths(records)
+    backend = backend or create_backend(games, min_interval, max_interval)
+    print(f"watching {len(games)} games with {type(backend).__name__}")
+
+    due = {}
+    failures = {}
+    retained_at = time.monotonic()
+    with BackupRunner(backup_dir) as runner:
+        try:
+            while True:
+                now = time.monotonic()
+                timeout = min([max_interval] + [max(0, moment - now) for moment in due.values()])
+                changed = backend.wait(timeout)
+                now = time.monotonic()
+                for game_id in changed:
+                    due[game_id] = max(due.get(game_id, 0), now + debounce)
+
+                ready = [game_id for game_id, moment in due.items() if moment <= now]
+                for game_id in ready:
+                    del due[game_id]
+                    try:
+                        runner.result(game_id, runner.submit(game_id, games[game_id]))
+                        failures.pop(game_id, None)
+                    except Exception as e:
+                        failures[game_id] = failures.get(game_id, 0) + 1
+                        delay = retry_delay(failures[game_id], debounce)
+                        logging.error(f"Backup of {game_id} failed ({failures[game_id]} in a row), retrying in {delay:.0f}s: {e!r}")
+                        due[game_id] = now + delay
+                if ready:
+                    if now - retained_at >= retention_interval:
+                        runner.apply_retention()
+                        retained_at = now
+                    write_reports()
+        except KeyboardInterrupt:
+            print("stopped watching")
+
+def main():
+    watch(read_save_paths(records_file(FINAL_PATHS_NAME)), os.environ.get("backup_dir"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+@pytest.fixture
+def serve():
+    """
+    Runs a coroutine with the shared http client answering every request with handler, an
+    httpx.MockTransport handler, instead of the network.
+    """
+    import httpx
+
+    import global_funcs
+
+    def run(handler, coroutine):
+        async def main():
+            global_funcs._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            global_funcs._client_loop = asyncio.get_running_loop()
+            global_funcs._semaphore = asyncio.Semaphore(4)
+            try:
+                return await coroutine
+            finally:
+                await global_funcs.close_client()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,37 @@
+import os
+import tarfile
+
+from archive_backup import archive_path, archive_save_files, read_archive_manifest
+
+
+def write(path, content, mtime_ns):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def archived(path, name):
+    with tarfile.open(path) as tar:
+        return tar.extractfile(name).read().decode('utf-8')
+
+
+def test_archive_is_kept_when_nothing_changed_and_replaced_otherwise(tmp_path):
+    saves = tmp_path / 'saves'
+    backup_dir = str(tmp_path / 'backups')
+    write(str(saves / 'slot1.sav'), 'one', 1_000_000_000)
+    write(str(saves / 'slot2.sav'), 'two', 1_000_000_000)
+    path = archive_path(backup_dir, '10', 'gz')
+
+    assert archive_save_files('10', [str(saves)], backup_dir)['copied'] == 2
+    written_at = os.stat(path).st_mtime_ns
+    assert archive_save_files('10', [str(saves)], backup_dir)['unchanged'] == 2
+    assert os.stat(path).st_mtime_ns == written_at
+
+    write(str(saves / 'slot1.sav'), 'one, later', 2_000_000_000)
+    os.remove(saves / 'slot2.sav')
+    summary = archive_save_files('10', [str(saves)], backup_dir)
+    assert (summary['copied'], summary['deleted']) == (1, 1)
+    assert set(read_archive_manifest(path)['files']) == {'slot1.sav'}
+    assert archived(path, 'slot1.sav') == 'one, later'
+    assert not os.path.exists(f'{path}.tmp')
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from archive_backup import archive_path, read_archive_manifest
+from backup_paths import backup_games, backup_save_files, load_manifest
+from global_funcs import root_label
+from records import SavePath
+from snapshot_store import list_snapshots, load_snapshot, store_path
+
+
+def write(path, content, mtime_ns=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_incremental_backup_copies_only_changes(tmp_path):
+    saves = tmp_path / 'saves'
+    backup_dir = str(tmp_path / 'backups')
+    write(str(saves / 'slot1.sav'), 'one', 1_000_000_000)
+    write(str(saves / 'profile' / 'options.ini'), 'opts', 1_000_000_000)
+
+    first = backup_save_files('10', [str(saves)], backup_dir)
+    assert (first['copied'], first['unchanged'], first['deleted']) == (2, 0, 0)
+    assert backup_save_files('10', [str(saves)], backup_dir)['copied'] == 0
+
+    write(str(saves / 'slot1.sav'), 'one, later', 2_000_000_000)
+    os.remove(saves / 'profile' / 'options.ini')
+    third = backup_save_files('10', [str(saves)], backup_dir)
+    assert (third['copied'], third['unchanged'], third['deleted']) == (1, 0, 1)
+
+    manifest = load_manifest(backup_dir, '10')
+    assert set(manifest['files']) == {'slot1.sav'}
+    assert set(manifest['deleted']) == {'profile/options.ini'}
+    with open(os.path.join(backup_dir, '10', 'slot1.sav'), encoding='utf-8') as file:
+        assert file.read() == 'one, later'
+
+
+def test_hash_skips_files_whose_contents_did_not_change(tmp_path):
+    saves = tmp_path / 'saves'
+    backup_dir = str(tmp_path / 'backups')
+    write(str(saves / 'slot1.sav'), 'one', 1_000_000_000)
+    backup_save_files('10', [str(saves)], backup_dir, use_hash=True)
+
+    os.utime(saves / 'slot1.sav', ns=(2_000_000_000, 2_000_000_000))
+    summary = backup_save_files('10', [str(saves)], backup_dir, use_hash=True)
+    assert (summary['copied'], summary['unchanged']) == (0, 1)
+    assert load_manifest(backup_dir, '10')['files']['slot1.sav']['mtime_ns'] == 2_000_000_000
+
+
+def backed_up_files(backup_dir, game_id, mode):
+    if mode == 'snapshot':
+        return load_snapshot(list_snapshots(store_path(backup_dir), game_id)[-1])['files']
+    if mode == 'archive':
+        return read_archive_manifest(archive_path(backup_dir, game_id, 'gz'))['files']
+    return load_manifest(backup_dir, game_id)['files']
+
+
+@pytest.mark.parametrize('mode', ['copy', 'snapshot', 'archive'])
+def test_unreadable_save_folder_keeps_the_previous_backup(tmp_path, mode):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    backup_dir = str(tmp_path / 'backups')
+    write(str(first / 'a.sav'), 'a')
+    write(str(second / 'b.sav'), 'b')
+    write(str(tmp_path / 'other' / 'c.sav'), 'c')
+    records = [SavePath('10', str(first)), SavePath('10', str(second)), SavePath('20', str(tmp_path / 'other'))]
+    backup_games(records, backup_dir, mode=mode)
+    before = backed_up_files(backup_dir, '10', mode)
+
+    os.rename(second, tmp_path / 'unmounted')
+    write(str(tmp_path / 'other' / 'c.sav'), 'c, later', 5_000_000_000)
+    with pytest.raises(FileNotFoundError):
+        backup_games(records, backup_dir, mode=mode)
+
+    assert backed_up_files(backup_dir, '10', mode) == before
+    assert backed_up_files(backup_dir, '20', mode)['c.sav']['mtime_ns'] == 5_000_000_000
+    if mode == 'copy':
+        assert load_manifest(backup_dir, '10')['deleted'] == {}
+
+
+def test_root_labels_of_different_paths_differ():
+    assert root_label('C:\\a_b') != root_label('C:\\a\\b')
+    assert root_label('C:\\a\\b') == root_label('C:\\a\\b')
+    assert root_label('C:\\Users\\me\\Saved Games\\Game').startswith('C_Users_me_Saved Games_Game_')
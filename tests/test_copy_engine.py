@@ -0,0 +1,96 @@
+import os
+import sys
+import types
+
+import pytest
+
+import copy_engine
+from copy_engine import FAST_COPY_THRESHOLD, CopyEngine, Throttle, copy_file
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith('linux'), reason="kernel copies are only used on Linux")
+
+
+def make_file(path, size):
+    content = os.urandom(size)
+    with open(path, 'wb') as file:
+        file.write(content)
+    os.utime(path, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+    return content
+
+
+def read_bytes(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('size', [0, 1024, FAST_COPY_THRESHOLD - 1, FAST_COPY_THRESHOLD + 1024 * 1024 + 1])
+def test_copy_is_byte_identical(tmp_path, size):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    content = make_file(src, size)
+
+    assert copy_file(src, dst) == size
+    assert read_bytes(dst) == content
+    assert os.stat(dst).st_mtime_ns == os.stat(src).st_mtime_ns
+
+
+@linux_only
+def test_buffered_copy_takes_over_when_the_kernel_copy_fails(tmp_path, monkeypatch):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    content = make_file(src, FAST_COPY_THRESHOLD + 1024 * 1024)
+    calls = []
+    real_copy_file_range = getattr(os, 'copy_file_range', None)
+
+    def failing_copy_file_range(src_fd, dst_fd, count):
+        calls.append(count)
+        if len(calls) > 1 or real_copy_file_range is None:
+            raise OSError(18, 'Invalid cross-device link')
+        return real_copy_file_range(src_fd, dst_fd, count)
+
+    monkeypatch.setattr(os, 'copy_file_range', failing_copy_file_range, raising=False)
+
+    assert copy_file(src, dst) == len(content)
+    assert read_bytes(dst) == content
+    assert len(calls) == 2
+
+
+@linux_only
+def test_sendfile_is_used_without_copy_file_range(tmp_path, monkeypatch):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    content = make_file(src, FAST_COPY_THRESHOLD + 1)
+    monkeypatch.delattr(os, 'copy_file_range', raising=False)
+
+    assert copy_file(src, dst) == len(content)
+    assert read_bytes(dst) == content
+
+
+def test_throttle_waits_for_the_missing_bytes(monkeypatch):
+    now = [100.0]
+    sleeps = []
+    monkeypatch.setattr(copy_engine, 'time', types.SimpleNamespace(monotonic=lambda: now[0], sleep=sleeps.append))
+    throttle = Throttle(1000)
+
+    throttle.consume(1000)
+    assert sleeps == []
+    throttle.consume(500)
+    assert sleeps == [0.5]
+
+    now[0] += 2
+    throttle.consume(400)
+    assert sleeps == [0.5]
+    assert throttle.tokens == 600
+
+
+def test_engine_copies_into_new_folders_and_counts_per_worker(tmp_path):
+    pairs = []
+    contents = {}
+    for i in range(6):
+        src = str(tmp_path / f'src{i}')
+        contents[src] = make_file(src, 1000 * i)
+        pairs.append((src, str(tmp_path / 'out' / f'dir{i % 2}' / f'file{i}')))
+
+    with CopyEngine(workers=3, bytes_per_second=10 ** 9) as engine:
+        assert engine.copy_files(pairs) == sum(len(content) for content in contents.values())
+        assert engine.stats.totals() == {'files': 6, 'bytes': 15000}
+
+    for src, dst in pairs:
+        assert read_bytes(dst) == contents[src]
@@ -0,0 +1,28 @@
+import httpx
+import pytest
+
+from dump_game_names import fetch_game_name
+from request_scheduler import RetryQueue
+
+
+@pytest.mark.parametrize('body, name', [
+    ({'10': {'success': True, 'data': {'name': 'Game'}}}, 'Game'),
+    ({'10': {'success': False}}, None),
+    ({'10': {'success': True, 'data': None}}, None),
+    ({'20': {'success': True, 'data': {'name': 'Other'}}}, None),
+    (None, None),
+    ([], None),
+])
+def test_only_extracted_names_count_as_success(tmp_path, serve, body, name):
+    queue = RetryQueue(str(tmp_path / 'retry_queue.json'))
+    queue.failed('game_names', '10')
+
+    assert serve(lambda request: httpx.Response(200, json=body), fetch_game_name('10', queue)) == name
+    assert ('10' in queue.pending('game_names')) == (name is None)
+
+
+def test_undecodable_response_is_retried(tmp_path, serve):
+    queue = RetryQueue(str(tmp_path / 'retry_queue.json'))
+
+    assert serve(lambda request: httpx.Response(200, text='<html>'), fetch_game_name('10', queue)) is None
+    assert queue.pending('game_names') == ['10']
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from fleet import host_settings, host_workdir
+from manifest_index import ManifestIndex
+from pipeline import PipelineRun
+from records import SavePath
+
+pytestmark = pytest.mark.skipif(os.sep == '\\', reason="maps Windows hosts onto a POSIX coordinator")
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('save')
+
+
+@pytest.fixture
+def profile(tmp_path, monkeypatch):
+    monkeypatch.delenv('USERPROFILE', raising=False)
+    monkeypatch.delenv('records_format', raising=False)
+    mount = tmp_path / 'mnt' / 'pc01'
+    return {
+        'name': 'pc01',
+        'custom_steam_path': str(mount / 'c' / 'Program Files (x86)' / 'Steam'),
+        'steam_user_id': '12345678',
+        'path_to_game': '\\steamapps\\common',
+        'USERPROFILE': str(mount / 'c' / 'Users' / 'player'),
+        'backup_dir': str(tmp_path / 'backups'),
+        'path_map': {'D:\\': str(mount / 'd')},
+    }
+
+
+def test_host_save_paths_are_mapped_to_the_mount_points(profile):
+    steam = profile['custom_steam_path']
+    profile_dir = profile['USERPROFILE']
+    d_drive = profile['path_map']['D:\\']
+    touch(os.path.join(profile_dir, 'Documents', 'My Games', 'Game', 'save.dat'))
+    touch(os.path.join(steam, 'userdata', '12345678', '20', 'remote', 'save.dat'))
+    touch(os.path.join(d_drive, 'Saves', 'Other', 'save.dat'))
+
+    run = PipelineRun(host_settings(profile), profile_stages=(), stream=False, known_paths={
+        '10': ['%USERPROFILE%\\Documents\\My Games\\Game'],
+        '20': ['<Steam-folder>\\userdata\\<user-id>\\20\\remote'],
+        '30': ['D:\\Saves\\Other'],
+    })
+    run.installed_games = [{'appid': appid, 'name': appid, 'installdir': appid} for appid in ('10', '20', '30')]
+    assert run.run(['download_paths', 'scan_paths']) == {'download_paths': True, 'scan_paths': True}
+
+    assert sorted(run.final_paths) == [
+        SavePath('10', os.path.join(profile_dir, 'Documents', 'My Games', 'Game')),
+        SavePath('20', os.path.join(steam, 'userdata', '12345678', '20', 'remote')),
+        SavePath('30', os.path.join(d_drive, 'Saves', 'Other')),
+    ]
+
+
+def test_host_settings_leave_the_environment_alone(profile):
+    profile['records_format'] = 'jsonl'
+    run = PipelineRun(host_settings(profile), profile_stages=())
+    assert 'USERPROFILE' not in os.environ
+    assert 'records_format' not in os.environ
+    assert run.settings['user_ids'][0] == '12345678'
+    assert run.save_paths_file == 'steam_paths.jsonl'
+    assert PipelineRun(host_settings({'name': 'pc02'}), profile_stages=()).save_paths_file == 'steam_paths.json'
+
+
+def test_every_host_keeps_its_own_manifest_index(tmp_path, monkeypatch):
+    monkeypatch.setenv('manifest_index_file', str(tmp_path / 'shared' / 'manifest_index.json'))
+    fleet_dir = str(tmp_path / 'fleet')
+    paths = {}
+    for name in ('pc01', 'pc02'):
+        with host_workdir({'name': name}, fleet_dir):
+            index = ManifestIndex.from_env(host_settings({'name': name})['environ'])
+            index._dirty = True
+            index.save()
+        paths[name] = os.path.join(fleet_dir, name, 'manifest_index.json')
+    assert all(os.path.exists(path) for path in paths.values())
+    assert not (tmp_path / 'shared').exists()
+
+    own = str(tmp_path / 'pc03.json')
+    assert host_settings({'name': 'pc03', 'manifest_index_file': own})['environ']['manifest_index_file'] == own
@@ -0,0 +1,71 @@
+import httpx
+import pytest
+
+from global_funcs import get_request
+
+URL = 'https://example.com/api'
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setenv('http_backoff', '0')
+    monkeypatch.setenv('http_rate', '1000')
+    monkeypatch.setenv('http_retries', '2')
+    monkeypatch.setenv('http_throttle_retries', '2')
+
+
+def replay(*responses):
+    """
+    Returns a MockTransport handler answering with the given responses in turn, and the list of requests it saw.
+    A response can also be an exception to raise.
+    """
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        response = responses[min(len(requests), len(responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    return handler, requests
+
+
+@pytest.mark.parametrize('throttled', [
+    httpx.Response(429, headers={'Retry-After': '0'}),
+    httpx.Response(503, headers={'Retry-After': '0'}),
+    httpx.Response(503),
+])
+def test_throttled_request_is_retried(serve, throttled):
+    handler, requests = replay(throttled, httpx.Response(200, text='ok'))
+
+    response = serve(handler, get_request(URL))
+
+    assert response.status_code == 200
+    assert response.text == 'ok'
+    assert len(requests) == 2
+
+
+def test_connection_errors_are_retried(serve):
+    handler, requests = replay(httpx.ConnectError('refused'), httpx.Response(200))
+    assert serve(handler, get_request(URL)).status_code == 200
+    assert len(requests) == 2
+
+
+@pytest.mark.parametrize('failure', [httpx.Response(500), httpx.Response(429), httpx.ConnectError('refused')])
+def test_request_gives_up_when_the_retries_run_out(serve, failure):
+    handler, requests = replay(failure)
+    assert serve(handler, get_request(URL)) is None
+    assert len(requests) == 3
+
+
+def test_not_found_is_not_retried(serve):
+    handler, requests = replay(httpx.Response(404))
+    assert serve(handler, get_request(URL)) is None
+    assert len(requests) == 1
+
+
+def test_not_modified_is_returned(serve):
+    handler, requests = replay(httpx.Response(304))
+    assert serve(handler, get_request(URL, {'If-None-Match': '"v1"'})).status_code == 304
+    assert requests[0].headers['If-None-Match'] == '"v1"'
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from manifest_index import ManifestIndex
+
+
+def write_manifest(library, appid, content=None):
+    path = os.path.join(library, 'steamapps', f'appmanifest_{appid}.acf')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content or f'"AppState" {{ "appid" "{appid}" }}')
+    return path
+
+
+@pytest.fixture
+def library(tmp_path):
+    library = str(tmp_path / 'library')
+    for appid in ('10', '20'):
+        write_manifest(library, appid)
+    return library
+
+
+def reader(parsed):
+    def read_manifest(path):
+        parsed.append(path)
+        appid = os.path.basename(path)[len('appmanifest_'):-len('.acf')]
+        with open(path, encoding='utf-8') as file:
+            return {'appid': appid, 'size': len(file.read())}
+    return read_manifest
+
+
+def refresh(index, library):
+    parsed = []
+    games = index.refresh([library], reader(parsed))
+    return sorted(game['appid'] for game in games), parsed
+
+
+def test_unchanged_manifests_are_not_read_again(tmp_path, library):
+    index = ManifestIndex(str(tmp_path / 'manifest_index.json'))
+    assert refresh(index, library)[0] == ['10', '20']
+    assert sorted(index.changes['added']) == ['10', '20']
+    index.save()
+
+    reloaded = ManifestIndex(index.file_path)
+    reloaded.load()
+    games, parsed = refresh(reloaded, library)
+    assert games == ['10', '20']
+    assert parsed == []
+    assert reloaded.changes == {'added': [], 'updated': [], 'removed': []}
+
+
+def test_size_and_mtime_changes_invalidate_an_entry(tmp_path, library):
+    index = ManifestIndex(str(tmp_path / 'manifest_index.json'))
+    refresh(index, library)
+
+    resized = write_manifest(library, '10', '"AppState" { "appid" "10" "LastUpdated" "1" }')
+    touched = os.path.join(library, 'steamapps', 'appmanifest_20.acf')
+    stat = os.stat(touched)
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    games, parsed = refresh(index, library)
+    assert games == ['10', '20']
+    assert sorted(parsed) == sorted([resized, touched])
+    assert sorted(index.changes['updated']) == ['10', '20']
+    assert index.entries[resized]['game']['size'] == os.path.getsize(resized)
+
+
+def test_added_and_removed_games_are_tracked(tmp_path, library):
+    index = ManifestIndex(str(tmp_path / 'manifest_index.json'))
+    refresh(index, library)
+
+    os.remove(os.path.join(library, 'steamapps', 'appmanifest_10.acf'))
+    added = write_manifest(library, '30')
+
+    games, parsed = refresh(index, library)
+    assert games == ['20', '30']
+    assert parsed == [added]
+    assert index.changes == {'added': ['30'], 'updated': [], 'removed': ['10']}
+
+
+def test_index_of_another_version_is_ignored(tmp_path, library):
+    path = tmp_path / 'manifest_index.json'
+    path.write_text('{"version": 1, "entries": {"x": {"signature": [0, 0], "game": {}}}}')
+    index = ManifestIndex.from_env({'manifest_index_file': str(path)})
+    assert index.file_path == str(path)
+    assert index.entries == {}
@@ -0,0 +1,65 @@
+import json
+
+import metrics as metrics_module
+from metrics import Metrics, write_reports
+
+
+def test_histogram_buckets_are_cumulative():
+    run = Metrics(buckets=(0.1, 1.0, 10.0))
+    for value in (0.05, 0.1, 0.5, 20.0):
+        run.observe('http_request_duration_seconds', value, host='example.com')
+
+    histogram = run.report()['histograms'][0]
+    assert histogram['buckets'] == {'0.1': 2, '1.0': 3, '10.0': 3}
+    assert histogram['count'] == 4
+    assert histogram['sum'] == 20.65
+
+
+def test_prometheus_exposition_format():
+    run = Metrics(buckets=(0.1, 1.0))
+    run.increment('http_responses_total', host='example.com', status=200)
+    run.increment('http_responses_total', 2, host='example.com', status=429)
+    run.set('http_rate_limit', 2.5, host='a"b\\c\nd')
+    run.set('run_games', 3)
+    run.observe('http_request_duration_seconds', 0.5, host='example.com')
+
+    assert run.to_prometheus().splitlines() == [
+        '# TYPE steamgames_http_responses_total counter',
+        'steamgames_http_responses_total{host="example.com",status="200"} 1',
+        'steamgames_http_responses_total{host="example.com",status="429"} 2',
+        '# TYPE steamgames_http_rate_limit gauge',
+        'steamgames_http_rate_limit{host="a\\"b\\\\c\\nd"} 2.5',
+        '# TYPE steamgames_run_games gauge',
+        'steamgames_run_games 3',
+        '# TYPE steamgames_http_request_duration_seconds histogram',
+        'steamgames_http_request_duration_seconds_bucket{host="example.com",le="0.1"} 0',
+        'steamgames_http_request_duration_seconds_bucket{host="example.com",le="1.0"} 1',
+        'steamgames_http_request_duration_seconds_bucket{host="example.com",le="+Inf"} 1',
+        'steamgames_http_request_duration_seconds_sum{host="example.com"} 0.5',
+        'steamgames_http_request_duration_seconds_count{host="example.com"} 1',
+    ]
+    assert run.to_prometheus(prefix='').startswith('# TYPE http_responses_total counter\n')
+
+
+def test_write_reports(tmp_path, monkeypatch):
+    run = Metrics()
+    run.increment('backup_files_total', 4, mode='copy', result='copied')
+    run.record_cache('manifest_index', 3, 1)
+    monkeypatch.setattr(metrics_module, 'metrics', run)
+    report_file, textfile = tmp_path / 'run_report.json', tmp_path / 'textfile' / 'steamgames.prom'
+
+    write_reports(str(report_file), str(textfile))
+
+    report = json.loads(report_file.read_text(encoding='utf-8'))
+    assert {'name': 'backup_files_total', 'labels': {'mode': 'copy', 'result': 'copied'}, 'value': 4} in report['counters']
+    assert {'name': 'cache_hit_ratio', 'labels': {'cache': 'manifest_index'}, 'value': 0.75} in report['gauges']
+    assert textfile.read_text(encoding='utf-8') == run.to_prometheus()
+    assert not list(tmp_path.glob('**/*.tmp'))
+
+
+def test_empty_report_settings_skip_the_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('metrics_report', '')
+    monkeypatch.delenv('metrics_textfile', raising=False)
+    write_reports()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,37 @@
+from path_templates import compile_template, expand_all
+
+ENVIRON = {'USERPROFILE': 'C:\\Users\\me', 'APPDATA': 'C:\\Users\\me\\AppData\\Roaming', 'HOME': '/home/me'}
+
+
+def test_named_placeholders_and_user_ids():
+    template = compile_template('<Steam-folder>\\userdata\\<user-id>\\10\\remote')
+    assert template.has_user
+    assert template.render({'Steam-folder': 'C:\\Steam'}, '123') == 'C:\\Steam\\userdata\\123\\10\\remote'
+    assert template.render({'Steam-folder': 'C:\\Steam'}) == 'C:\\Steam\\userdata\\{}\\10\\remote'
+    assert compile_template('<unknown>\\x').render({}) == '<unknown>\\x'
+
+
+def test_windows_variables_ignore_case():
+    template = compile_template('%userprofile%\\Saved Games\\%MISSING%')
+    assert template.render(environ=ENVIRON) == 'C:\\Users\\me\\Saved Games\\%MISSING%'
+    assert template.render(expand_env=False, environ=ENVIRON) == '%userprofile%\\Saved Games\\%MISSING%'
+
+
+def test_dollar_variables_expand_like_expandvars():
+    assert compile_template('$HOME/.local/share/Game').render(environ=ENVIRON) == '/home/me/.local/share/Game'
+    assert compile_template('${APPDATA}\\Game').render(environ=ENVIRON) == 'C:\\Users\\me\\AppData\\Roaming\\Game'
+    assert compile_template('$MISSING/${ALSO_MISSING}/$').render(environ=ENVIRON) == '$MISSING/${ALSO_MISSING}/$'
+    assert compile_template('$HOME/x').render(expand_env=False, environ=ENVIRON) == '$HOME/x'
+
+
+def test_braces_are_literal_except_the_user_placeholder():
+    template = compile_template('%APPDATA%\\{A1B2-C3}\\{}\\save')
+    assert template.render(user_id='42', environ=ENVIRON) == 'C:\\Users\\me\\AppData\\Roaming\\{A1B2-C3}\\42\\save'
+
+
+def test_expand_all_binds_every_path_once_per_user():
+    paths = ['%USERPROFILE%\\{}\\a', '$HOME/b', '%USERPROFILE%\\{}\\a']
+    expanded = expand_all(paths, ['1', '2'], environ=ENVIRON)
+    assert expanded[0] == {'1': 'C:\\Users\\me\\1\\a', '2': 'C:\\Users\\me\\2\\a'}
+    assert expanded[1] == {'1': '/home/me/b', '2': '/home/me/b'}
+    assert expanded[2] is expanded[0]
@@ -0,0 +1,38 @@
+import pytest
+
+from download_paths import parse_save_paths_soup
+from pcgw_extract import FEED_SIZE, extract_save_rows
+
+
+def row(system, location):
+    return ('<tr class="template-infotable-body table-gamedata-body-row">'
+            f'<th scope="row" class="table-gamedata-body-system">{system}</th>'
+            f'<td class="table-gamedata-body-location">{location}</td></tr>')
+
+
+def table(*rows):
+    return f'<table class="template-infotable table-gamedata"><tbody>{"".join(rows)}</tbody></table>'
+
+
+def page(body, section='Save_game_data_location'):
+    heading = f'<h3><span class="mw-headline" id="{section}">Save game data location</span></h3>'
+    return f'<html><body><p>Intro</p>{heading}{body}</body></html>'.encode('utf-8')
+
+
+PAGES = {
+    'one table': page(table(row('Windows', '%APPDATA%\\Game'), row('Steam', '<abbr>&lt;Steam-folder&gt;</abbr>\\userdata'))),
+    'second gamedata table': page(table(row('Windows', 'A')) + '<h3>Cloud</h3>' + table(row('Windows', 'B'))),
+    'nested table in a cell': page(table(row('Windows', 'A<table><tr><td>note</td></tr></table>'), row('Linux', 'B'))),
+    'missing cells': page(table('<tr class="template-infotable-body table-gamedata-body-row"><td>x</td></tr>', row('Windows', 'A'))),
+    'no section': page(table(row('Windows', 'A')), section='Save_game_cloud_syncing'),
+    'long page': page(table(row('Windows', 'A')) + table(row('Windows', 'B')) * (FEED_SIZE // 100)),
+}
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_streaming_extractor_matches_beautifulsoup(name):
+    assert extract_save_rows(PAGES[name]) == parse_save_paths_soup(PAGES[name])
+
+
+def test_rows_after_the_save_table_are_ignored():
+    assert extract_save_rows(PAGES['second gamedata table']) == [('Windows', 'A')]
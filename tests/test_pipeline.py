@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from pipeline import PipelineRun
+from records import SavePath, write_save_paths
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return {'steam_path': str(tmp_path / 'Steam'), 'ubisoft_path': None, 'path_to_game': '\\steamapps\\common',
+            'user_ids': ['1'], 'backup_dir': str(tmp_path / 'backups'), 'records_format': None, 'environ': {}}
+
+
+def pipeline(settings, stream=False, failing=()):
+    """
+    Returns a PipelineRun whose stages only record that they ran, or raise if they are in failing.
+    """
+    run = PipelineRun(settings, profile_stages=(), stream=stream)
+    run.calls = []
+
+    def stage(name):
+        def step():
+            run.calls.append(name)
+            if name in failing:
+                raise RuntimeError(f"{name} failed")
+        return step
+
+    for name in ('download_paths', 'scan_paths', 'backup_paths', 'dump_game_names', 'stream_stages'):
+        setattr(run, name, stage(name))
+    return run
+
+
+def test_stages_run_in_pipeline_order(settings):
+    run = pipeline(settings)
+    assert run.run(['dump_game_names', 'scan_paths', 'download_paths']) == {
+        'download_paths': True, 'scan_paths': True, 'dump_game_names': True}
+    assert run.calls == ['download_paths', 'scan_paths', 'dump_game_names']
+    assert set(run.timings) == {'download_paths', 'scan_paths', 'dump_game_names'}
+
+
+def test_stages_after_a_failed_input_are_skipped(settings):
+    run = pipeline(settings, failing={'download_paths'})
+    assert run.run() == {'download_paths': False, 'scan_paths': False, 'backup_paths': False, 'dump_game_names': False}
+    assert run.calls == ['download_paths']
+
+
+def test_a_failed_backup_does_not_skip_the_game_names(settings):
+    run = pipeline(settings, failing={'backup_paths'})
+    assert run.run() == {'download_paths': True, 'scan_paths': True, 'backup_paths': False, 'dump_game_names': True}
+    assert run.calls == ['download_paths', 'scan_paths', 'backup_paths', 'dump_game_names']
+
+
+def test_a_failed_stream_skips_the_game_names(settings):
+    run = pipeline(settings, stream=True, failing={'stream_stages'})
+    assert run.run() == {'download_paths': False, 'scan_paths': False, 'backup_paths': False, 'dump_game_names': False}
+    assert run.calls == ['stream_stages']
+
+
+def test_stale_save_paths_are_not_scanned_after_a_failed_download(settings, tmp_path):
+    stale = tmp_path / 'old'
+    stale.mkdir()
+    write_save_paths([SavePath('10', str(stale))], 'steam_paths.json')
+    run = PipelineRun(settings, profile_stages=(), stream=False)
+
+    def fail():
+        raise RuntimeError("offline")
+
+    run.download_paths = fail
+    assert run.run(['download_paths', 'scan_paths']) == {'download_paths': False, 'scan_paths': False}
+    assert run.final_paths is None
+
+
+def test_a_stage_run_alone_reads_the_file_of_its_input(settings, tmp_path):
+    saves = tmp_path / 'saves'
+    saves.mkdir()
+    write_save_paths([SavePath('10', str(saves)), SavePath('20', str(tmp_path / 'missing'))], 'steam_paths.json')
+    run = PipelineRun(settings, profile_stages=(), stream=False)
+
+    assert run.run(['scan_paths']) == {'scan_paths': True}
+    assert list(run.final_paths) == [SavePath('10', str(saves))]
+    assert not os.path.exists('steam_paths_final.json')
@@ -0,0 +1,29 @@
+import pytest
+
+from records import SavePath, SavePathTable, iter_save_paths, read_save_paths, records_file, write_save_paths
+
+
+@pytest.mark.parametrize('records_format', ['json', 'jsonl'])
+def test_records_round_trip(tmp_path, records_format):
+    path = str(tmp_path / records_file('steam_paths', records_format))
+    records = [SavePath('10', 'C:\\Saves\\{}'), SavePath('20', 'D:\\Other'), SavePath('10', 'E:\\More')]
+    write_save_paths(records, path)
+
+    assert list(iter_save_paths(path)) == records
+    table = read_save_paths(path)
+    assert list(table) == records
+    assert table.paths_of('10') == ['C:\\Saves\\{}', 'E:\\More']
+    assert table.unique_appids() == ['10', '20']
+    assert read_save_paths(path) is table
+
+
+def test_jsonl_records_are_read_one_line_at_a_time(tmp_path):
+    path = str(tmp_path / 'steam_paths_final.jsonl')
+    write_save_paths(SavePathTable([('10', 'C:\\Saves')]), path)
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('not json\n')
+
+    records = iter_save_paths(path)
+    assert next(records) == SavePath('10', 'C:\\Saves')
+    with pytest.raises(ValueError):
+        next(records)
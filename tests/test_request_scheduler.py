@@ -0,0 +1,116 @@
+import email.utils
+import time
+import types
+
+import pytest
+
+import request_scheduler
+from request_scheduler import HostRateLimiter, RetryQueue, last_updated_of, parse_retry_after, prioritize
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(request_scheduler, 'time', types.SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    return now
+
+
+def test_first_throttle_halves_what_was_sent_in_the_last_second(clock):
+    limiter = HostRateLimiter('example.com')
+    limiter.sent.extend([clock[0] - 0.5] * 8)
+
+    limiter.throttled()
+
+    assert limiter.rate == 4
+    assert limiter.tokens == 0
+
+
+def test_a_burst_of_throttles_halves_the_rate_once(clock):
+    limiter = HostRateLimiter('example.com', rate=8.0)
+    sent_at = clock[0]
+    clock[0] += 0.1
+    limiter.throttled(sent_at=sent_at)
+    limiter.throttled(sent_at=sent_at)
+    assert limiter.rate == 4
+
+    clock[0] += 0.1
+    limiter.throttled(sent_at=clock[0])
+    assert limiter.rate == 2
+
+
+def test_throttles_stop_at_the_minimum_rate(clock):
+    limiter = HostRateLimiter('example.com', rate=1.0, min_rate=0.5)
+    for _ in range(3):
+        clock[0] += 1
+        limiter.throttled(sent_at=clock[0])
+    assert limiter.rate == 0.5
+
+
+def test_retry_after_pauses_the_host(clock):
+    limiter = HostRateLimiter('example.com', rate=4.0)
+    limiter.throttled(retry_after=30)
+    assert limiter.paused_until == clock[0] + 30
+
+
+def test_successes_raise_the_rate_additively_up_to_the_maximum():
+    limiter = HostRateLimiter('example.com', rate=2.0, max_rate=5.0, increase=4.0)
+    limiter.succeeded()
+    assert limiter.rate == 4
+    limiter.succeeded()
+    assert limiter.rate == 5
+
+    unlimited = HostRateLimiter('example.com')
+    unlimited.succeeded()
+    assert unlimited.rate == 0
+
+
+def test_parse_retry_after_in_seconds():
+    assert parse_retry_after('5') == 5
+    assert parse_retry_after('-3') == 0
+    assert parse_retry_after('600', limit=120) == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+
+
+def test_parse_retry_after_as_a_date():
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 28 <= parse_retry_after(later) <= 30
+    assert parse_retry_after(email.utils.formatdate(time.time() - 30, usegmt=True)) == 0
+
+
+def test_retry_queue_gives_up_after_max_attempts(tmp_path):
+    queue = RetryQueue(str(tmp_path / 'retry_queue.json'), max_attempts=2)
+    queue.failed('pcgamingwiki', 10)
+    assert queue.pending('pcgamingwiki') == ['10']
+    queue.failed('pcgamingwiki', 10)
+    assert queue.pending('pcgamingwiki') == []
+
+
+def test_retry_queue_persists_across_runs(tmp_path):
+    path = str(tmp_path / 'retry_queue.json')
+    queue = RetryQueue(path)
+    queue.failed('pcgamingwiki', '10')
+    queue.failed('pcgamingwiki', '20')
+    queue.failed('pcgamingwiki', '20')
+    queue.failed('steam', '30')
+    queue.save()
+
+    next_run = RetryQueue(path)
+    next_run.load()
+    assert next_run.pending('pcgamingwiki') == ['20', '10']
+    assert next_run.pending('steam') == ['30']
+
+    next_run.succeeded('pcgamingwiki', '20')
+    next_run.save()
+    last_run = RetryQueue(path)
+    last_run.load()
+    assert last_run.pending('pcgamingwiki') == ['10']
+
+
+def test_prioritize_puts_retries_first_then_recent_updates():
+    games = [{'appid': 10, 'LastUpdated': '100'}, {'appid': 20, 'LastUpdated': '300'},
+             {'appid': 30, 'LastUpdated': 'bad'}, {'appid': 40}, {'appid': 20, 'LastUpdated': '50'}]
+    last_updated = last_updated_of(games)
+    assert last_updated == {'10': 100, '20': 300, '40': 0}
+    assert prioritize([10, 20, 30, 40, 20], last_updated, first=['40', '30']) == ['40', '30', '20', '10']
+    assert prioritize(['10', '20']) == ['10', '20']
@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+from backup_paths import backup_games
+from records import SavePath, write_save_paths
+from restore_saves import current_save_paths, map_roots, restore_game, restore_games
+from snapshot_store import list_snapshots, store_path
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def read(path):
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+def test_map_roots_keeps_exact_matches():
+    roots = ['C:\\Users\\a\\Saves', 'D:\\Games\\Saves']
+    assert map_roots(roots, roots) == {root: root for root in roots}
+
+
+def test_map_roots_moves_a_single_root_to_a_new_profile():
+    assert map_roots(['C:\\Users\\old\\Game\\Saves'], ['E:\\Users\\new\\Game\\Saves']) == {
+        'C:\\Users\\old\\Game\\Saves': 'E:\\Users\\new\\Game\\Saves'}
+
+
+def test_map_roots_pairs_each_target_with_one_root():
+    roots = ['/steam/userdata/111/app/remote', '/steam/userdata/222/app/remote']
+    mapping = map_roots(roots, ['/steam/userdata/333/app/remote'])
+    assert mapping == {roots[0]: '/steam/userdata/333/app/remote', roots[1]: None}
+
+
+def test_map_roots_prefers_the_best_match():
+    roots = ['/old/Documents/Game/Saves', '/old/AppData/Game/Config']
+    targets = ['/new/AppData/Game/Config', '/new/Documents/Game/Saves']
+    assert map_roots(roots, targets) == {roots[0]: targets[1], roots[1]: targets[0]}
+
+
+def test_map_roots_keeps_unmatched_roots_in_place():
+    roots = ['/old/Saves', '/old/Config']
+    assert map_roots(roots, ['/new/Other']) == {'/old/Saves': '/old/Saves', '/old/Config': '/old/Config'}
+
+
+@pytest.mark.parametrize('mode', ['copy', 'snapshot', 'archive'])
+def test_restore_does_not_merge_roots_into_one_target(tmp_path, mode):
+    first = str(tmp_path / 'userdata' / '111' / 'app' / 'remote')
+    second = str(tmp_path / 'userdata' / '222' / 'app' / 'remote')
+    write(os.path.join(first, 'save.dat'), 'first')
+    write(os.path.join(second, 'save.dat'), 'second')
+    backup_dir = str(tmp_path / 'backup')
+    backup_games([SavePath('10', first), SavePath('10', second)], backup_dir, mode=mode)
+
+    target = str(tmp_path / 'userdata' / '333' / 'app' / 'remote')
+    summary = restore_game('10', [target], backup_dir, mode)
+
+    assert summary['restored'] == 1
+    assert summary['failed'] == 1
+    assert read(os.path.join(target, 'save.dat')) == 'first'
+
+
+@pytest.mark.parametrize('mode', ['copy', 'snapshot', 'archive'])
+def test_restore_a_folder_holding_a_file_of_the_same_name(tmp_path, mode):
+    folder = str(tmp_path / 'saves' / 'profile')
+    write(os.path.join(folder, 'profile'), 'progress')
+    backup_dir = str(tmp_path / 'backup')
+    backup_games([SavePath('10', folder)], backup_dir, mode=mode)
+    os.remove(os.path.join(folder, 'profile'))
+
+    summary = restore_game('10', [folder], backup_dir, mode)
+
+    assert summary['errors'] == []
+    assert read(os.path.join(folder, 'profile')) == 'progress'
+
+
+@pytest.mark.parametrize('mode', ['copy', 'snapshot', 'archive'])
+def test_restore_a_single_save_file(tmp_path, mode):
+    save_file = str(tmp_path / 'saves' / 'game.sav')
+    write(save_file, 'progress')
+    backup_dir = str(tmp_path / 'backup')
+    backup_games([SavePath('10', save_file)], backup_dir, mode=mode)
+    os.remove(save_file)
+
+    summary = restore_game('10', [save_file], backup_dir, mode)
+
+    assert summary['restored'] == 1
+    assert read(save_file) == 'progress'
+
+
+def test_a_corrupt_snapshot_does_not_stop_the_other_games(tmp_path):
+    for appid in ('10', '20'):
+        write(str(tmp_path / appid / 'save.dat'), appid)
+    backup_dir = str(tmp_path / 'backup')
+    backup_games([SavePath('10', str(tmp_path / '10')), SavePath('20', str(tmp_path / '20'))], backup_dir, mode='snapshot')
+    with open(list_snapshots(store_path(backup_dir), '10')[-1], 'w', encoding='utf-8') as file:
+        file.write('{"files": ')
+    os.remove(str(tmp_path / '20' / 'save.dat'))
+
+    summaries = restore_games([], backup_dir, mode='snapshot', workers=1)
+
+    assert summaries['10']['failed'] == 1
+    assert summaries['20']['restored'] == 1
+    assert read(str(tmp_path / '20' / 'save.dat')) == '20'
+
+
+def test_an_unknown_mode_is_reported(tmp_path):
+    summaries = restore_games([], str(tmp_path), appids=['10'], mode='zip', workers=1)
+    assert summaries['10']['failed'] == 1
+    assert 'zip' in summaries['10']['errors'][0]
+
+
+def test_current_save_paths_include_folders_that_do_not_exist_yet(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('custom_steam_path', str(tmp_path / 'Steam'))
+    monkeypatch.setenv('steam_user_id', '111')
+    monkeypatch.setenv('SAVEDIR', str(tmp_path / 'Saved Games'))
+    monkeypatch.delenv('records_format', raising=False)
+    write_save_paths([SavePath('10', '%SAVEDIR%/Game'), SavePath('20', '%SAVEDIR%/{}/Other')], 'steam_paths.json')
+
+    targets = current_save_paths()
+
+    assert not (tmp_path / 'Saved Games').exists()
+    assert SavePath('10', str(tmp_path / 'Saved Games') + '/Game') in list(targets)
+    assert SavePath('20', str(tmp_path / 'Saved Games') + '/111/Other') in list(targets)
@@ -0,0 +1,73 @@
+import json
+import time
+
+import pytest
+
+from save_db import SaveLocationDB, read_dump
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SaveLocationDB(str(tmp_path / 'save_locations.db'))
+    yield db
+    db.close()
+
+
+def test_stored_locations_are_looked_up_by_platform(db):
+    db.store_many({
+        10: [('Windows', '%APPDATA%\\Game'), ('Steam', '<Steam-folder>\\userdata\\<user-id>\\10'), ('Linux', '~/.game')],
+        20: None,
+        30: [('Linux', '~/.other')],
+    })
+
+    assert db.lookup_many(['10', 20, '30', '40']) == {
+        '10': ['%APPDATA%\\Game', '<Steam-folder>\\userdata\\<user-id>\\10'],
+        '20': None,
+        '30': None,
+    }
+    assert db.lookup_many(['30'], platforms=('linux',)) == {'30': ['~/.other']}
+
+
+def test_storing_again_replaces_the_locations(tmp_path, db):
+    db.store_many({'10': [('Windows', 'old')]})
+    db.store_many({'10': [('Windows', 'new')]})
+    db.close()
+
+    reopened = SaveLocationDB(db.file_path)
+    try:
+        assert reopened.lookup_many(['10']) == {'10': ['new']}
+    finally:
+        reopened.close()
+
+
+def test_stale_appids_are_the_old_and_unknown_ones(db):
+    now = time.time()
+    db.store_many({'10': None}, fetched_at=now - 10)
+    db.store_many({'20': [('Windows', 'path')]}, fetched_at=now - 1000)
+
+    assert db.stale_appids(['30', '20', '10', 20], max_age=100) == ['30', '20']
+    assert db.stale_appids(['10', '20'], max_age=2000) == []
+
+
+@pytest.mark.parametrize('name, content', [
+    ('dump.jsonl', '{"appid": 10, "platform": "Windows", "path": "%APPDATA%\\\\Game"}\n'
+                   '{"appid": 10, "platform": "Steam", "path": "remote"}\n\n{"appid": 20, "path": null}\n'),
+    ('dump.json', json.dumps([{'appid': '10', 'platform': 'Windows', 'path': '%APPDATA%\\Game'},
+                              {'appid': '10', 'platform': 'Steam', 'path': 'remote'}, {'appid': '20', 'path': None}])),
+    ('dump.csv', 'appid,platform,path\n10,Windows,%APPDATA%\\Game\n10,Steam,remote\n20,,\n'),
+])
+def test_imported_dump_round_trips(tmp_path, db, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding='utf-8')
+
+    entries = read_dump(str(path))
+    assert entries == {'10': [('Windows', '%APPDATA%\\Game'), ('Steam', 'remote')], '20': None}
+
+    db.store_many(entries)
+    assert db.lookup_many(['10', '20']) == {'10': ['%APPDATA%\\Game', 'remote'], '20': None}
+
+
+def test_pcgamingwiki_cache_is_imported_as_windows_paths(tmp_path):
+    path = tmp_path / 'pcgamingwiki_cache.json'
+    path.write_text(json.dumps({'10': {'paths': ['a', 'b'], 'fetched_at': 0}, '20': {'paths': None, 'fetched_at': 0}}))
+    assert read_dump(str(path)) == {'10': [('windows', 'a'), ('windows', 'b')], '20': None}
@@ -0,0 +1,48 @@
+import time
+
+import httpx
+
+from download_paths import get_pcgamingwiki_save_path
+from save_path_cache import SavePathCache
+
+
+def test_not_modified_refreshes_a_stale_entry(tmp_path, serve):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(304, headers={'etag': '"v1"'})
+
+    cache = SavePathCache(str(tmp_path / 'cache.json'))
+    cache.store('10', ['%USERPROFILE%\\Saves'], {'etag': '"v1"', 'last-modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+    cache.entries['10']['fetched_at'] = time.time() - 2 * cache.ttl
+
+    paths = serve(handler, get_pcgamingwiki_save_path('10', cache))
+
+    assert paths == ['%USERPROFILE%\\Saves']
+    assert requests[0].headers['If-None-Match'] == '"v1"'
+    assert requests[0].headers['If-Modified-Since'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+    assert cache.stats['revalidated'] == 1
+    assert cache.lookup('10') == ('hit', cache.entries['10'])
+
+
+def test_stale_entry_is_kept_when_the_request_fails(tmp_path, serve):
+    cache = SavePathCache(str(tmp_path / 'cache.json'))
+    cache.store('10', ['old'], {'etag': '"v1"'})
+    cache.entries['10']['fetched_at'] = 0
+
+    paths = serve(lambda request: httpx.Response(404), get_pcgamingwiki_save_path('10', cache))
+
+    assert paths == ['old']
+    assert cache.stats['revalidated'] == 0
+    assert cache.lookup('10')[0] == 'stale'
+
+
+def test_cache_survives_a_reload(tmp_path):
+    cache = SavePathCache(str(tmp_path / 'cache.json'))
+    cache.store('10', None)
+    cache.save()
+
+    reloaded = SavePathCache(str(tmp_path / 'cache.json'))
+    reloaded.load()
+    assert reloaded.lookup('10') == ('hit', cache.entries['10'])
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import scan_paths
+from scan_paths import resolve_existence
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / 'Saves').mkdir()
+    (tmp_path / 'Saves' / 'slot1.sav').write_text('save')
+    (tmp_path / 'config.ini').write_text('config')
+    os.symlink(tmp_path / 'Saves', tmp_path / 'linked')
+    os.symlink(tmp_path / 'gone', tmp_path / 'broken')
+    return tmp_path
+
+
+def candidates(root):
+    return [
+        str(root / 'Saves'), str(root / 'Saves' / 'slot1.sav'), str(root / 'config.ini'), str(root / 'linked'),
+        str(root / 'linked' / 'slot1.sav'), str(root / 'broken'), str(root / 'missing'),
+        str(root / 'missing' / 'slot1.sav'), str(root / 'config.ini' / 'child'), str(root / 'saves'),
+        str(root / 'Saves' / '..'), str(root / 'Saves') + os.sep,
+    ]
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_resolve_existence_matches_os_path_exists(tree, workers):
+    paths = candidates(tree)
+    assert resolve_existence(paths, workers) == {path: os.path.exists(path) for path in paths}
+
+
+def test_names_differing_in_case_are_checked_on_disk(tree, monkeypatch):
+    real_exists = os.path.exists
+    checked = []
+
+    def case_insensitive_exists(path):
+        checked.append(path)
+        return real_exists(os.path.join(os.path.dirname(path), 'Saves')) if os.path.basename(path) == 'SAVES' else real_exists(path)
+
+    monkeypatch.setattr(os.path, 'exists', case_insensitive_exists)
+
+    existence = resolve_existence([str(tree / 'SAVES'), str(tree / 'missing')], 1)
+
+    assert existence == {str(tree / 'SAVES'): True, str(tree / 'missing'): False}
+    assert str(tree / 'SAVES') in checked
+    assert str(tree / 'missing') not in checked
+
+
+def test_paths_in_unlistable_directories_are_checked_on_disk(tree, monkeypatch):
+    real_scandir = os.scandir
+
+    def scandir(directory):
+        if os.path.basename(directory) == 'Saves':
+            raise PermissionError(13, 'Permission denied', directory)
+        return real_scandir(directory)
+
+    monkeypatch.setattr(scan_paths.os, 'scandir', scandir)
+
+    path = str(tree / 'Saves' / 'slot1.sav')
+    assert resolve_existence([path, str(tree / 'Saves' / 'other.sav')], 1) == {
+        path: True, str(tree / 'Saves' / 'other.sav'): False}
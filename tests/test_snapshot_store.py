@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+import snapshot_store
+from snapshot_store import (TMP_DIR, apply_retention, blob_path, collect_garbage, list_snapshots, load_snapshot,
+                            snapshot_save_files, store_file, store_path)
+
+
+def write(path, data, mtime_ns=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(data)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def read_blobs(store_dir, chunks):
+    data = b''
+    for digest in chunks:
+        with open(blob_path(store_dir, digest), 'rb') as file:
+            data += file.read()
+    return data
+
+
+def test_store_file_streams_whole_files_and_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_store, 'BLOCK_SIZE', 3)
+    store_dir = str(tmp_path / 'store')
+    data = bytes(range(20))
+    write(str(tmp_path / 'save.dat'), data)
+
+    chunks, written = store_file(store_dir, str(tmp_path / 'save.dat'), 0)
+    assert chunks == [hashlib.sha256(data).hexdigest()] and written == 20
+
+    chunks, written = store_file(store_dir, str(tmp_path / 'save.dat'), 8)
+    assert [len(read_blobs(store_dir, [digest])) for digest in chunks] == [8, 8, 4]
+    assert read_blobs(store_dir, chunks) == data and written == 20
+
+    assert store_file(store_dir, str(tmp_path / 'save.dat'), 8) == (chunks, 0)
+    assert os.listdir(os.path.join(store_dir, TMP_DIR)) == []
+
+
+def test_store_file_chunk_boundaries(tmp_path):
+    store_dir = str(tmp_path / 'store')
+    write(str(tmp_path / 'empty.dat'), b'')
+    write(str(tmp_path / 'even.dat'), b'x' * 16)
+
+    assert store_file(store_dir, str(tmp_path / 'empty.dat'), 8)[0] == [hashlib.sha256(b'').hexdigest()]
+    assert len(store_file(store_dir, str(tmp_path / 'even.dat'), 8)[0]) == 2
+
+
+def test_retention_and_garbage_collection(tmp_path, monkeypatch):
+    saves = tmp_path / 'saves'
+    backup_dir = str(tmp_path / 'backups')
+    store_dir = store_path(backup_dir)
+    for version in range(3):
+        monkeypatch.setattr(snapshot_store.time, 'time', lambda version=version: 1_700_000_000 + version)
+        write(str(saves / 'slot.sav'), f'version {version}'.encode(), (version + 1) * 1_000_000_000)
+        snapshot_save_files('10', [str(saves)], backup_dir)
+    monkeypatch.undo()
+    assert len(list_snapshots(store_dir, '10')) == 3
+
+    in_progress = os.path.join(store_dir, TMP_DIR, 'other-run.tmp')
+    abandoned = os.path.join(store_dir, TMP_DIR, 'crashed-run.tmp')
+    write(in_progress, b'partial')
+    write(abandoned, b'partial', 1_000_000_000)
+
+    assert apply_retention(backup_dir, keep_last=1) == (2, 2)
+    [kept] = list_snapshots(store_dir, '10')
+    assert read_blobs(store_dir, load_snapshot(kept)['files']['slot.sav']['chunks']) == b'version 2'
+    assert os.path.exists(in_progress) and not os.path.exists(abandoned)
+    assert collect_garbage(backup_dir) == 0
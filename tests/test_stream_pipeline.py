@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+
+import backup_paths
+import stream_pipeline
+from download_paths import render_save_paths
+from records import SavePath
+from scan_paths import scan_save_paths
+
+INSTALLED = [{'appid': '10', 'name': 'Game', 'installdir': 'Game'},
+             {'appid': '20', 'name': 'Game: Remastered', 'installdir': 'Remastered'},
+             {'appid': '30', 'name': 'Tool', 'installdir': 'Tool'}]
+
+
+def touch(path):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, 'save.dat'), 'w', encoding='utf-8') as file:
+        file.write(path)
+
+
+def settings_for(tmp_path):
+    return {'steam_path': 'C:\\Steam', 'ubisoft_path': None, 'path_to_game': '\\steamapps\\common',
+            'user_ids': ['1'], 'backup_dir': str(tmp_path / 'backups'), 'environ': {}}
+
+
+def slow_scan(slow_appid, finished):
+    def scan(user_ids, records, *args):
+        if records[0].appid == slow_appid:
+            time.sleep(0.3)
+        result = scan_save_paths(user_ids, records, *args)
+        finished[records[0].appid] = time.monotonic()
+        return result
+    return scan
+
+
+def test_shared_save_paths_belong_to_the_first_installed_game(tmp_path, monkeypatch):
+    shared, own = str(tmp_path / 'shared'), str(tmp_path / 'own')
+    touch(shared)
+    touch(own)
+    known_paths = {'10': [shared], '20': [shared, own], '30': None}
+    monkeypatch.setattr(stream_pipeline, 'scan_save_paths', slow_scan('10', {}))
+
+    streamed = asyncio.run(stream_pipeline.stream_games(INSTALLED, settings_for(tmp_path), known_paths))
+
+    _, staged = scan_save_paths(['1'], render_save_paths(INSTALLED, known_paths, 'C:\\Steam', None, '\\steamapps\\common'))
+    assert sorted(streamed['final_paths']) == sorted(staged) == [SavePath('10', shared), SavePath('20', own)]
+    assert sorted(streamed['save_paths']) == [SavePath('10', shared), SavePath('20', own), SavePath('20', shared)]
+    assert sorted(streamed['backups']) == ['10', '20']
+    assert streamed['backups']['20']['copied'] == 1
+
+
+def test_a_slow_game_does_not_hold_back_the_others(tmp_path, monkeypatch):
+    paths = {appid: str(tmp_path / appid) for appid in ('10', '20', '30')}
+    for path in paths.values():
+        touch(path)
+    finished = {}
+    submitted = {}
+    submit = backup_paths.BackupRunner.submit
+
+    def record_submit(runner, game_id, save_paths):
+        submitted[game_id] = time.monotonic()
+        return submit(runner, game_id, save_paths)
+
+    monkeypatch.setattr(stream_pipeline, 'scan_save_paths', slow_scan('10', finished))
+    monkeypatch.setattr(backup_paths.BackupRunner, 'submit', record_submit)
+
+    known_paths = {appid: [path] for appid, path in paths.items()}
+    streamed = asyncio.run(stream_pipeline.stream_games(INSTALLED, settings_for(tmp_path), known_paths))
+
+    assert sorted(streamed['backups']) == ['10', '20', '30']
+    assert submitted['20'] < finished['10'] and submitted['30'] < finished['10']
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from get_installed_games import get_steam_library_folders
+from vdf import VDFError, extract_keys, parse
+
+APPMANIFEST = r'''
+"AppState"
+{
+	"appid"		"10"
+	"name"		"Counter-Strike \"Classic\""
+	"UserConfig"
+	{
+		"name"		"not this one"
+		"language"		"english"
+	}
+	"installdir"		"Half-Life"
+	"LastUpdated"		"1700000000"
+}
+'''
+
+
+def test_parse_nested_blocks_escapes_and_comments():
+    data = parse('// comment\n"root" { "path" "C:\\\\Steam" "brace" "{" [$WIN32] "nested" { bare value } }')
+    assert data == {'root': {'path': 'C:\\Steam', 'brace': '{', 'nested': {'bare': 'value'}}}
+
+
+def test_parse_keeps_the_last_value_of_repeated_keys():
+    assert parse('"a" { "k" "1" "k" "2" }') == {'a': {'k': '2'}}
+
+
+@pytest.mark.parametrize('text', ['"a" { "k" "v"', '"a" } ', '{ "k" "v" }', '"a" { "k" }'])
+def test_parse_rejects_malformed_text(text):
+    with pytest.raises(VDFError):
+        parse(text)
+
+
+def test_extract_keys_reads_only_the_top_level_block():
+    assert extract_keys(APPMANIFEST, ('appid', 'name', 'installdir', 'LastUpdated')) == {
+        'appid': '10', 'name': 'Counter-Strike "Classic"', 'installdir': 'Half-Life', 'LastUpdated': '1700000000'}
+    assert extract_keys(APPMANIFEST, ('language',), depth=2) == {'language': 'english'}
+
+
+@pytest.mark.parametrize('content', [
+    '"libraryfolders" { "0" { "path" "C:\\\\Steam" "apps" { "10" "123" } } "1" { "path" "D:\\\\Library" } }',
+    '"LibraryFolders" { "TimeNextStatsReport" "1" "ContentStatsID" "2" "1" "C:\\\\Steam" "2" "D:\\\\Library" }',
+])
+def test_library_folders_in_both_formats(tmp_path, content):
+    os.makedirs(tmp_path / 'steamapps')
+    (tmp_path / 'steamapps' / 'libraryfolders.vdf').write_text(content, encoding='utf-8')
+    assert get_steam_library_folders(str(tmp_path)) == ['C:\\Steam', 'D:\\Library']
@@ -0,0 +1,66 @@
+import time
+
+import watch_saves
+from records import SavePath
+
+
+class ScriptedBackend:
+    def __init__(self, changes, rounds=200):
+        self.changes = list(changes)
+        self.rounds = rounds
+
+    def wait(self, timeout):
+        self.rounds -= 1
+        if not self.rounds:
+            raise KeyboardInterrupt
+        time.sleep(min(timeout, 0.005))
+        return self.changes.pop(0) if self.changes else set()
+
+
+class FlakyRunner:
+    instances = []
+
+    def __init__(self, backup_dir):
+        self.backups = []
+        self.failures = {'10': 2}
+        self.retention_runs = 0
+        FlakyRunner.instances.append(self)
+
+    def submit(self, game_id, save_paths):
+        if self.failures.get(game_id):
+            self.failures[game_id] -= 1
+            raise OSError(f"{save_paths[0]} is locked")
+        self.backups.append(game_id)
+        return game_id
+
+    def result(self, game_id, future):
+        return {}
+
+    def apply_retention(self):
+        self.retention_runs += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def test_failed_backups_are_retried_with_one_runner(monkeypatch):
+    monkeypatch.setattr(watch_saves, 'BackupRunner', FlakyRunner)
+    monkeypatch.setattr(watch_saves, 'write_reports', lambda: None)
+    monkeypatch.setattr(watch_saves, 'MAX_RETRY_DELAY', 0.02)
+    FlakyRunner.instances = []
+    records = [SavePath('10', '/saves/10'), SavePath('20', '/saves/20')]
+
+    watch_saves.watch(records, 'backups', debounce=0.01, max_interval=0.01, retention_interval=3600,
+                      backend=ScriptedBackend([{'10', '20'}]))
+
+    [runner] = FlakyRunner.instances
+    assert sorted(runner.backups) == ['10', '20']
+    assert runner.retention_runs == 0
+
+
+def test_retry_delay_grows_up_to_the_limit():
+    assert [watch_saves.retry_delay(failures, 10) for failures in (1, 2, 3)] == [10, 20, 40]
+    assert watch_saves.retry_delay(20, 10) == watch_saves.MAX_RETRY_DELAY